@@ -43,6 +43,7 @@ def build_executable():
         '--name=photo_frame',
         f'--distpath={deployment_path}',
         '--clean',
+        '--collect-data=googleapiclient',  # Bundled Drive discovery document for offline startup
     ])
     
     # Create README
@@ -40,6 +40,7 @@ def build_executable():
         '--name=photo_frame',
         f'--distpath={deployment_path}',
         '--clean',
+        '--collect-data=googleapiclient',  # Bundled Drive discovery document for offline startup
         '--noupx',  # UPX can cause issues on ARM
         '--hidden-import=PIL._tkinter',  # Required for Pillow
         '--hidden-import=google.auth.transport.requests',  # Required for Google Auth
@@ -89,10 +89,11 @@ def get_combined_image_cv2(image_name):
     return img
 
 
-def display_combined_image_cv2(image_name, delay_seconds):
+def display_combined_image_cv2(image_name, delay_seconds, monitor_index=0):
     # window_name = 'test'
-    screen_width = get_monitors()[0].width
-    screen_height = get_monitors()[0].height
+    monitor = get_monitors()[monitor_index]
+    screen_width = monitor.width
+    screen_height = monitor.height
     img = get_combined_image_cv2(image_name)
     image_height = img.shape[0]  #1200
     image_width = img.shape[1] #1800
@@ -101,6 +102,8 @@ def display_combined_image_cv2(image_name, delay_seconds):
     
     img = cv2.copyMakeBorder(src = img, top = 0, bottom = 0, left = lr_padding, right = lr_padding, borderType = cv2.BORDER_CONSTANT)
     cv2.namedWindow("test", cv2.WND_PROP_FULLSCREEN)          
+    # The window goes fullscreen on the monitor it is on
+    cv2.moveWindow("test", monitor.x, monitor.y)
     cv2.setWindowProperty("test", cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
     cv2.imshow("test",img)
     # Waits until a key is pressed, and stores that key value for us to use
@@ -200,7 +203,7 @@ def reconstruct_image_list_with_list_of_images(image_list, image_list_to_add):
     return image_list
 
 # Run the photo viewer
-def run_photo_viewer_cv2(delay_seconds, search_term):
+def run_photo_viewer_cv2(delay_seconds, search_term, monitor_index=0):
     # get list of all images in folder, and shuffle them
     image_list = return_all_photos_in_folder(folder_file_path)
     # print(image_list)
@@ -234,7 +237,7 @@ def run_photo_viewer_cv2(delay_seconds, search_term):
         image = image_list[i]
         print(i, get_caption(image))
         #display the image
-        retval = display_combined_image_cv2(image, delay_seconds)
+        retval = display_combined_image_cv2(image, delay_seconds, monitor_index)
         
         # print (retval)
         # print(i)
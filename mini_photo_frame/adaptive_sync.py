@@ -0,0 +1,54 @@
+# adaptive_sync.py
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_INTERVAL = 60       # Seconds between syncs right after a change
+DEFAULT_MAX_INTERVAL = 60 * 60  # Longest time between syncs of a folder that isn't changing
+BACKOFF_FACTOR = 2.0            # Growth of the interval after each sync that found nothing
+
+class AdaptiveSyncInterval:
+    """Picks the time until the next sync from the history of sync results.
+
+    After a sync finds changes the interval drops to the minimum, so the rest
+    of a burst of uploads shows up quickly. The first sync that finds nothing
+    goes back to the base interval (the sync_interval setting), and every
+    further one in a row doubles it, up to the maximum, so a folder that
+    rarely changes is listed far less often than every sync_interval.
+    """
+
+    def __init__(self, min_interval, base_interval, max_interval=DEFAULT_MAX_INTERVAL):
+        """base_interval is a number or a function returning one, so settings changes apply"""
+        self.min_interval = min_interval
+        self._base_interval = base_interval
+        self._max_interval = max_interval
+        self.idle_syncs = 0  # Syncs in a row that found nothing
+        self.syncs = 0
+        self.changed_syncs = 0
+
+    def base_interval(self):
+        value = self._base_interval() if callable(self._base_interval) else self._base_interval
+        return max(value, 1)
+
+    def max_interval(self):
+        # A sync_interval setting above the maximum raises it
+        return max(self._max_interval, self.base_interval())
+
+    def record(self, changed):
+        """Record the result of a sync"""
+        self.syncs += 1
+        if changed:
+            self.changed_syncs += 1
+            self.idle_syncs = 0
+        else:
+            self.idle_syncs += 1
+        logger.debug(f"Sync {'found changes' if changed else 'found nothing new'}, "
+                     f"next sync in {self.interval():.0f} seconds")
+
+    def interval(self):
+        """Seconds until the next sync"""
+        base = self.base_interval()
+        if not self.idle_syncs:
+            return min(self.min_interval, base)
+        # Cap the exponent so a long idle streak can't overflow
+        return min(base * BACKOFF_FACTOR ** min(self.idle_syncs - 1, 32), self.max_interval())
@@ -1,16 +1,30 @@
 # display_manager.py
 import cv2
-from screeninfo import get_monitors
+try:
+    from screeninfo import get_monitors
+except ImportError:  # Not needed by the framebuffer backend on headless systems
+    get_monitors = None
 from iptcinfo3 import IPTCInfo
 import logging
 import os
 import platform
 import numpy as np
+import memory_budget
+import profiler
+import transitions
+from scheduler import IdleScheduler
+from ingest import get_display_source, get_focus
+from smart_crop import fill, rotate_focus
 
 # Suppress IPTCInfo warnings
 iptcinfo_logger = logging.getLogger('iptcinfo')
 iptcinfo_logger.setLevel(logging.ERROR)
 
+WINDOW_NAME = "Photo Frame"
+
+# The window stays open between photos, so each one can transition from the last
+_blender = transitions.FrameBlender()
+
 # Force OpenCV to use X11 on Linux
 if platform.system() == 'Linux':
     os.environ['QT_QPA_PLATFORM'] = 'xcb'
@@ -30,30 +44,35 @@ def rotate_image(img, rotation):
     else:  # 270
         return cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
 
+def read_iptc(image_path):
+    """Read the IPTC caption and creation date (yyyymmdd) as strings, None where missing"""
+    info = IPTCInfo(image_path)
+    caption = info['caption/abstract']
+    date = info['date created']
+    return (caption.decode('UTF-8') if caption is not None else None,
+            date.decode('utf-8') if date else None)
+
+def format_caption(image_path, caption, date):
+    """Build the displayed caption, falling back to the file name"""
+    if date:
+        # Split date yyyymmdd into yyyy/mm/dd
+        date = date[:4] + '/' + date[4:6] + '/' + date[6:]
+    
+    if caption is None:
+        # Use filename as caption if no IPTC caption
+        caption = os.path.basename(image_path)
+        if len(caption) > 15 and caption.endswith('.jpg'):
+            caption = caption[:-4]  # Remove .jpg extension
+        
+    if date:
+        caption = f"{caption} - {date}"
+        
+    return caption
+
 def get_caption(image_path):
     """Get caption and date from image IPTC info"""
     try:
-        info = IPTCInfo(image_path)
-        caption = info['caption/abstract']
-        date = info['date created']
-        
-        if date:
-            date = date.decode('utf-8')
-            # Split date yyyymmdd into yyyy/mm/dd
-            date = date[:4] + '/' + date[4:6] + '/' + date[6:]
-        
-        if caption is None:
-            # Use filename as caption if no IPTC caption
-            caption = os.path.basename(image_path)
-            if len(caption) > 15 and caption.endswith('.jpg'):
-                caption = caption[:-4]  # Remove .jpg extension
-        else:
-            caption = caption.decode('UTF-8')
-            
-        if date:
-            caption = f"{caption} - {date}"
-            
-        return caption
+        return format_caption(image_path, *read_iptc(image_path))
     except Exception as e:
         print(f"Error reading caption: {e}")
         return os.path.basename(image_path)
@@ -63,8 +82,9 @@ def get_display_image(image_path, rotation=0):
     target_width = 1800   # Fixed width for landscape
     target_height = 1200  # Fixed height
     
-    # Read and process image
-    img = cv2.imread(image_path)
+    # Read and process image, from its pre-scaled rendition if it was ingested
+    source_path, caption = get_display_source(image_path)
+    img = memory_budget.read_image(source_path, (target_width, target_height))
     if img is None:
         print(f"Error loading image: {image_path}")
         return None
@@ -79,14 +99,13 @@ def get_display_image(image_path, rotation=0):
     if img_height > img_width:  # Portrait
         new_height = target_height
         new_width = int(target_height * img_aspect_ratio)
-    else:  # Landscape
-        new_width = target_width
-        new_height = target_height
-        
-    img = cv2.resize(img, (new_width, new_height))
+        img = cv2.resize(img, (new_width, new_height))
+    else:  # Landscape, cropped to 3:2 around its subject rather than stretched
+        img = fill(img, target_width, target_height, rotate_focus(get_focus(image_path) or (0, 0, 1, 1), rotation))
     
     # Add caption
-    caption = get_caption(image_path)
+    if caption is None:
+        caption = get_caption(image_path)
     
     # Caption settings
     font = cv2.FONT_HERSHEY_SIMPLEX
@@ -110,16 +129,44 @@ def get_display_image(image_path, rotation=0):
     
     return img
 
-def show_photo(image_path, display_interval, rotation=0):
-    """Display photo with proper scaling and return key press"""
+def get_monitor_geometries():
+    """(x, y, width, height) of every attached monitor, the primary one first"""
+    monitors = sorted(get_monitors(), key=lambda m: not m.is_primary)
+    return [(m.x, m.y, m.width, m.height) for m in monitors]
+
+def get_screen_size():
+    """Get the size of the primary monitor"""
+    _, _, width, height = get_monitor_geometries()[0]
+    return width, height
+
+def open_fullscreen(window_name, x=0, y=0):
+    """Open a fullscreen window on the monitor whose top left corner is at x, y"""
+    cv2.namedWindow(window_name, cv2.WND_PROP_FULLSCREEN)
+    if x or y:
+        # Windows go fullscreen on the monitor they are on
+        cv2.moveWindow(window_name, x, y)
+    cv2.setWindowProperty(window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+
+def key_to_action(key):
+    """Map an OpenCV key code (-1 for timeout) to a frame action"""
+    if key == -1:  # No key pressed
+        return "next"
+    elif key == 27:  # ESC
+        return "exit"
+    elif key == ord('r'):  # Reshuffle
+        return "reshuffle"
+    elif key == ord('n'):  # New images
+        return "new"
+    elif key == ord('b'):  # Back
+        return "back"
+    else:
+        return "next"
+
+def compose_photo(image_path, screen_width, screen_height, rotation=0):
+    """Prepare the captioned frame for 'original' mode, padded to fill the screen width"""
     img = get_display_image(image_path, rotation)
     if img is None:
         return None
-        
-    # Get screen info
-    screen = get_monitors()[0]
-    screen_width = screen.width
-    screen_height = screen.height
     
     # Calculate padding with proper scaling for screen height
     image_height = img.shape[0]  # Should be 1200
@@ -128,7 +175,7 @@ def show_photo(image_path, display_interval, rotation=0):
     lr_padding = int((screen_width - image_width * image_ratio)/2) # + 17
     
     # Add padding
-    img = cv2.copyMakeBorder(
+    return cv2.copyMakeBorder(
         src=img,
         top=0,
         bottom=0,
@@ -137,46 +184,34 @@ def show_photo(image_path, display_interval, rotation=0):
         borderType=cv2.BORDER_CONSTANT,
         value=[0, 0, 0]  # Black borders
     )
-    
-    # Display in fullscreen
-    window_name = "Photo Frame"
-    cv2.namedWindow(window_name, cv2.WND_PROP_FULLSCREEN)
-    cv2.setWindowProperty(window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
-    cv2.imshow(window_name, img)
-    
-    # Wait for key press or interval
-    key = cv2.waitKey(display_interval * 1000)
-    cv2.destroyAllWindows()
-    
-    if key == -1:  # No key pressed
-        return "next"
-    elif key == 27:  # ESC
-        return "exit"
-    elif key == ord('r'):  # Reshuffle
-        return "reshuffle"
-    elif key == ord('n'):  # New images
-        return "new"
-    elif key == ord('b'):  # Back
-        return "back"
-    else:
-        return "next"
 
-def show_photo_simple(image_path, display_interval, rotation=0):
-    """Display photo centered on screen with full black borders, no captions"""
-    # Read image
-    img = cv2.imread(image_path)
+def compose_photo_simple(image_path, screen_width, screen_height, rotation=0):
+    """Prepare a screen-sized frame with the photo centered on black borders"""
+    # Read image, from its pre-scaled rendition if it was ingested
+    img = memory_budget.read_image(get_display_source(image_path)[0], (screen_width, screen_height))
     if img is None:
         print(f"Error loading image: {image_path}")
         return None
         
     # Apply rotation if specified
-    img = rotate_image(img, rotation)
-        
-    # Get screen dimensions
-    screen = get_monitors()[0]
-    screen_width = screen.width
-    screen_height = screen.height
-    
+    with memory_budget.track('compose'):
+        img = rotate_image(img, rotation)
+        return fit_to_screen(img, screen_width, screen_height)
+
+def compose_photo_fill(image_path, screen_width, screen_height, rotation=0):
+    """Prepare a screen-sized frame filled with the photo, cropped around its subject"""
+    img = memory_budget.read_image(get_display_source(image_path)[0], (screen_width, screen_height))
+    if img is None:
+        print(f"Error loading image: {image_path}")
+        return None
+    with memory_budget.track('compose'):
+        img = rotate_image(img, rotation)
+        # The region to keep was found at ingest, centered crop if the photo isn't ingested yet
+        focus = get_focus(image_path)
+        return fill(img, screen_width, screen_height, rotate_focus(focus, rotation) if focus else None)
+
+def fit_to_screen(img, screen_width, screen_height):
+    """Scale an image to fit the screen and center it on a black canvas"""
     # Calculate scaling to fit within screen while maintaining aspect ratio
     img_height, img_width = img.shape[:2]
     width_ratio = screen_width / img_width
@@ -197,26 +232,66 @@ def show_photo_simple(image_path, display_interval, rotation=0):
     
     # Place image on canvas
     canvas[y_offset:y_offset+new_height, x_offset:x_offset+new_width] = img
+    return canvas
+
+def wait_for_key(timeout):
+    """Wait up to timeout seconds for a key press. Returns its action, or None on timeout."""
+    key = cv2.waitKey(max(1, int(timeout * 1000)))  # waitKey(0) would wait forever
+    return None if key == -1 else key_to_action(key)
+
+def present(img, display_interval, scheduler=None, animation=None):
+    """Show a prepared frame fullscreen and return the action for the key pressed.
+
+    animation, a KenBurns, keeps rendering frames while waiting.
+    """
+    open_fullscreen(WINDOW_NAME)
     
-    # Display fullscreen
-    window_name = "Photo Frame"
-    cv2.namedWindow(window_name, cv2.WND_PROP_FULLSCREEN)
-    cv2.setWindowProperty(window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
-    cv2.imshow(window_name, canvas)
-    
-    # Wait for key press or interval
-    key = cv2.waitKey(display_interval * 1000)
-    cv2.destroyAllWindows()
+    action = None
+    engine = transitions.get_engine()
+    with profiler.span('present'):
+        if engine:
+            action = _blender.transition(engine, img, lambda frame: cv2.imshow(WINDOW_NAME, frame), wait_for_key)
+            _blender.remember(img)
+        cv2.imshow(WINDOW_NAME, img)
+    if action:
+        # A key pressed during the transition
+        return action
     
-    if key == -1:  # No key pressed
-        return "next"
-    elif key == 27:  # ESC
-        return "exit"
-    elif key == ord('r'):  # Reshuffle
-        return "reshuffle"
-    elif key == ord('n'):  # New images
-        return "new"
-    elif key == ord('b'):  # Back
-        return "back"
-    else:
-        return "next"
+    # Wait for key press or interval, running any scheduled work in between
+    if animation is None:
+        return (scheduler or IdleScheduler()).wait(display_interval, wait_for_key)
+    wait = animation.animate(wait_for_key, lambda frame: cv2.imshow(WINDOW_NAME, frame))
+    action = (scheduler or IdleScheduler()).wait(display_interval, wait)
+    if engine:
+        _blender.remember(animation.frame)
+    return action
+
+def show_photo(image_path, display_interval, rotation=0, scheduler=None):
+    """Display photo with proper scaling and return key press"""
+    screen_width, screen_height = get_screen_size()
+    img = compose_photo(image_path, screen_width, screen_height, rotation)
+    if img is None:
+        return None
+    return present(img, display_interval, scheduler)
+
+def show_photo_simple(image_path, display_interval, rotation=0, scheduler=None):
+    """Display photo centered on screen with full black borders, no captions"""
+    screen_width, screen_height = get_screen_size()
+    canvas = compose_photo_simple(image_path, screen_width, screen_height, rotation)
+    if canvas is None:
+        return None
+    return present(canvas, display_interval, scheduler)
+
+def show_photo_fill(image_path, display_interval, rotation=0, scheduler=None):
+    """Display photo filling the screen, cropped around its subject, no captions"""
+    screen_width, screen_height = get_screen_size()
+    frame = compose_photo_fill(image_path, screen_width, screen_height, rotation)
+    if frame is None:
+        return None
+    return present(frame, display_interval, scheduler)
+
+def show_blank(duration, scheduler=None):
+    """Show a black screen for quiet hours and return the action for any key pressed"""
+    screen_width, screen_height = get_screen_size()
+    canvas = np.zeros((screen_height, screen_width, 3), dtype=np.uint8)
+    return present(canvas, duration, scheduler)
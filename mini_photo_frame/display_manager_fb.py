@@ -0,0 +1,222 @@
+# display_manager_fb.py
+# Display backend that draws straight into the Linux framebuffer, so the frame
+# can run on Raspberry Pi OS Lite without an X server.
+import logging
+import mmap
+import os
+import select
+import time
+import cv2
+import numpy as np
+import profiler
+import transitions
+from display_manager import compose_photo, compose_photo_simple, compose_photo_fill
+from scheduler import IdleScheduler
+
+try:
+    import evdev
+    from evdev import ecodes
+except ImportError:  # No keyboard input, photos just advance on the timer
+    evdev = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEVICE = '/dev/fb0'
+
+# Framebuffer settings from config.txt, applied when the framebuffer is first opened
+_config = {'device': DEFAULT_DEVICE, 'size': None, 'bpp': None}
+_framebuffer = None
+_input = None
+_blender = transitions.FrameBlender()
+
+def configure(device=DEFAULT_DEVICE, size=None, bpp=None):
+    """Set the framebuffer device and, for devices without sysfs info, its geometry.
+
+    size is (width, height). Passing a regular file as device with a size and
+    bpp lets the backend run without real display hardware.
+    """
+    global _framebuffer
+    _config.update(device=device, size=size, bpp=bpp)
+    if _framebuffer:
+        _framebuffer.close()
+        _framebuffer = None
+
+def read_sysfs_value(fb_name, attribute):
+    with open(f'/sys/class/graphics/{fb_name}/{attribute}', 'r') as f:
+        return f.read().strip()
+
+def bgr_to_rgb565(img):
+    """Pack a BGR uint8 image into RGB565 pixels"""
+    b = img[..., 0].astype(np.uint16)
+    g = img[..., 1].astype(np.uint16)
+    r = img[..., 2].astype(np.uint16)
+    return ((r >> 3) << 11) | ((g >> 2) << 5) | (b >> 3)
+
+class Framebuffer:
+    """Memory mapped framebuffer device (or a regular file standing in for one)"""
+
+    def __init__(self, device=DEFAULT_DEVICE, size=None, bpp=None):
+        self.device = device
+        fb_name = os.path.basename(device)
+        if size is None:
+            width, height = read_sysfs_value(fb_name, 'virtual_size').split(',')
+            size = (int(width), int(height))
+        if bpp is None:
+            bpp = int(read_sysfs_value(fb_name, 'bits_per_pixel'))
+        if bpp not in (16, 32):
+            raise ValueError(f"Unsupported framebuffer pixel format: {bpp} bits per pixel")
+        self.width, self.height = size
+        self.bpp = bpp
+        try:
+            self.stride = int(read_sysfs_value(fb_name, 'stride'))
+        except OSError:
+            self.stride = self.width * bpp // 8
+
+        length = self.stride * self.height
+        # A missing device with an explicit size is created as a regular stand-in file
+        self._file = open(device, 'r+b' if os.path.exists(device) else 'w+b')
+        if os.path.isfile(device) and os.path.getsize(device) < length:
+            # A regular file standing in for the device: grow it to a full frame
+            self._file.truncate(length)
+        self._map = mmap.mmap(self._file.fileno(), length, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+
+        # View the mapping as rows of pixels, ignoring any padding at the end of each row
+        rows = np.frombuffer(self._map, dtype=np.uint8).reshape(self.height, self.stride)
+        if bpp == 16:
+            self.pixels = rows.view(np.uint16)[:, :self.width]
+        else:
+            # XRGB8888 is stored little endian as B, G, R, X bytes, the same order as OpenCV's BGR
+            self.pixels = rows[:, :self.width * 4].reshape(self.height, self.width, 4)
+        logger.info(f"Opened framebuffer {device}: {self.width}x{self.height}, {bpp} bpp, stride {self.stride}")
+
+    def show(self, frame):
+        """Copy a BGR frame of the framebuffer's size to the screen"""
+        if frame.shape[0] != self.height or frame.shape[1] != self.width:
+            raise ValueError(f"Frame is {frame.shape[1]}x{frame.shape[0]}, framebuffer is {self.width}x{self.height}")
+        if self.bpp == 16:
+            self.pixels[:] = bgr_to_rgb565(frame)
+        else:
+            self.pixels[..., :3] = frame
+            self.pixels[..., 3] = 255
+
+    def clear(self):
+        self._map[:] = bytes(len(self._map))
+
+    def close(self):
+        self.pixels = None
+        self._map.close()
+        self._file.close()
+
+class KeyboardInput:
+    """Reads key presses from all evdev keyboards"""
+
+    KEY_ACTIONS = {}
+    if evdev:
+        KEY_ACTIONS = {
+            ecodes.KEY_ESC: "exit",
+            ecodes.KEY_R: "reshuffle",
+            ecodes.KEY_N: "new",
+            ecodes.KEY_B: "back",
+        }
+
+    def __init__(self):
+        self.devices = []
+        if evdev is None:
+            logger.warning("python-evdev not installed, keyboard input disabled")
+            return
+        for path in evdev.list_devices():
+            try:
+                device = evdev.InputDevice(path)
+                if ecodes.EV_KEY in device.capabilities():
+                    self.devices.append(device)
+            except OSError as e:
+                logger.debug(f"Skipping input device {path}: {str(e)}")
+        logger.info(f"Listening for keys on {len(self.devices)} input devices")
+
+    def wait_for_key(self, timeout):
+        """Block until input arrives or timeout seconds pass. Returns the key's action or None."""
+        if not self.devices:
+            time.sleep(timeout)
+            return None
+        ready, _, _ = select.select(self.devices, [], [], timeout)
+        for device in ready:
+            try:
+                for event in device.read():
+                    if event.type == ecodes.EV_KEY and event.value == 1:  # Key down
+                        return self.KEY_ACTIONS.get(event.code, "next")
+            except OSError:
+                # Device unplugged
+                self.devices.remove(device)
+        return None
+
+def get_framebuffer():
+    global _framebuffer
+    if _framebuffer is None:
+        _framebuffer = Framebuffer(_config['device'], _config['size'], _config['bpp'])
+    return _framebuffer
+
+def get_screen_size():
+    fb = get_framebuffer()
+    return fb.width, fb.height
+
+def get_input():
+    global _input
+    if _input is None:
+        _input = KeyboardInput()
+    return _input
+
+def present(frame, display_interval, scheduler=None, animation=None):
+    """Show a frame on the framebuffer and wait for a key or the interval.
+
+    animation, a KenBurns, keeps rendering frames while waiting.
+    """
+    fb = get_framebuffer()
+    if frame.shape[:2] != (fb.height, fb.width):
+        # 'original' mode frames are sized for a 1200 pixel tall screen
+        frame = cv2.resize(frame, (fb.width, fb.height), interpolation=cv2.INTER_AREA)
+    engine = transitions.get_engine()
+    action = None
+    with profiler.span('present'):
+        if engine:
+            action = _blender.transition(engine, frame, fb.show, get_input().wait_for_key)
+            _blender.remember(frame)
+        fb.show(frame)
+    if action:
+        return action
+    if animation is None:
+        return (scheduler or IdleScheduler()).wait(display_interval, get_input().wait_for_key)
+    action = (scheduler or IdleScheduler()).wait(display_interval,
+                                                 animation.animate(get_input().wait_for_key, fb.show))
+    if engine:
+        _blender.remember(animation.frame)
+    return action
+
+def show_photo(image_path, display_interval, rotation=0, scheduler=None):
+    """Display photo with caption on the framebuffer and return the key action"""
+    fb = get_framebuffer()
+    frame = compose_photo(image_path, fb.width, fb.height, rotation)
+    if frame is None:
+        return None
+    return present(frame, display_interval, scheduler)
+
+def show_photo_simple(image_path, display_interval, rotation=0, scheduler=None):
+    """Display photo centered with black borders on the framebuffer"""
+    fb = get_framebuffer()
+    frame = compose_photo_simple(image_path, fb.width, fb.height, rotation)
+    if frame is None:
+        return None
+    return present(frame, display_interval, scheduler)
+
+def show_photo_fill(image_path, display_interval, rotation=0, scheduler=None):
+    """Display photo filling the framebuffer, cropped around its subject"""
+    fb = get_framebuffer()
+    frame = compose_photo_fill(image_path, fb.width, fb.height, rotation)
+    if frame is None:
+        return None
+    return present(frame, display_interval, scheduler)
+
+def show_blank(duration, scheduler=None):
+    """Clear the framebuffer for quiet hours and wait for a key or the duration"""
+    get_framebuffer().clear()
+    _blender.forget()
+    return (scheduler or IdleScheduler()).wait(duration, get_input().wait_for_key)
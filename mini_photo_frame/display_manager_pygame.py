@@ -1,73 +1,276 @@
-import pygame
+# display_manager_pygame.py
+# Display backend that draws with pygame. The fullscreen display surface, the
+# caption font and recent caption renders are kept between photos, and decoded
+# photos are wrapped as surfaces without copying, then converted once to the
+# display's pixel format. Transitions blend surfaces that are also kept, using
+# SDL's alpha blits.
+import logging
 import os
-from display_manager import get_caption  # reuse your caption logic
-from PIL import Image
 import time
+from collections import OrderedDict
+import cv2
+import pygame
+import memory_budget
+import profiler
+import transitions
+from display_manager import get_caption, rotate_image, compose_photo_fill  # reuse your caption logic
+from scheduler import IdleScheduler
+from ingest import get_display_source
 
-def show_photo(image_path, display_interval, rotation=0):
-    pygame.init()
-    screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
-    pygame.mouse.set_visible(False)
-    screen_width, screen_height = screen.get_size()
+logger = logging.getLogger(__name__)
+
+KEY_ACTIONS = {
+    pygame.K_ESCAPE: "exit",
+    pygame.K_r: "reshuffle",
+    pygame.K_n: "new",
+    pygame.K_b: "back",
+}
+
+CAPTION_FONT = 'Arial'
+CAPTION_SIZE = 28
+CAPTION_CACHE_SIZE = 32  # Rendered captions kept, so going back or a small library doesn't re-render
+
+_renderer = None
+
+class Renderer:
+    """The fullscreen display surface plus everything worth keeping between photos"""
+
+    def __init__(self, size=None):
+        pygame.init()
+        if size:
+            self.screen = pygame.display.set_mode(size)
+        else:
+            self.screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+        pygame.mouse.set_visible(False)
+        self.width, self.height = self.screen.get_size()
+        self._font = None
+        self._captions = OrderedDict()  # caption -> (text, outline) surfaces
+        memory_budget.register_cache('pygame captions', self._captions.clear)
+        # Offscreen copies of the frame on screen and the next one, for transitions
+        self._previous = None
+        self._next = None
+        self._on_screen = False
+
+    def font(self):
+        # SysFont searches the system font list, far too slow to repeat per photo
+        if self._font is None:
+            self._font = pygame.font.SysFont(CAPTION_FONT, CAPTION_SIZE)
+        return self._font
+
+    def caption_surfaces(self, caption):
+        surfaces = self._captions.get(caption)
+        if surfaces is None:
+            font = self.font()
+            surfaces = (font.render(caption, True, (255, 255, 255)).convert_alpha(),
+                        font.render(caption, True, (0, 0, 0)).convert_alpha())
+            self._captions[caption] = surfaces
+            if len(self._captions) > CAPTION_CACHE_SIZE:
+                self._captions.popitem(last=False)
+        else:
+            self._captions.move_to_end(caption)
+        return surfaces
+
+    def to_surface(self, img):
+        """Wrap a BGR image without copying and convert it to the display's pixel format"""
+        height, width = img.shape[:2]
+        if not img.flags['C_CONTIGUOUS']:
+            img = img.copy()
+        return pygame.image.frombuffer(img, (width, height), 'BGR').convert()
+
+    def prepare(self, image_path, rotation=0):
+        """Decode, rotate and scale a photo to fit the screen. Returns (surface, caption)."""
+        # Read the upright, pre-scaled rendition if the photo was ingested
+        source_path, caption = get_display_source(image_path)
+        img = memory_budget.read_image(source_path, (self.width, self.height))
+        if img is None:
+            print(f"Error loading image: {image_path}")
+            return None, None
+        img = rotate_image(img, rotation)
+
+        img_height, img_width = img.shape[:2]
+        scale = min(self.width / img_width, self.height / img_height)
+        new_size = (max(1, int(img_width * scale)), max(1, int(img_height * scale)))
+        if new_size != (img_width, img_height):
+            # Area averaging when shrinking avoids aliasing, bilinear is enough when enlarging
+            interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+            img = cv2.resize(img, new_size, interpolation=interpolation)
+        if caption is None:
+            caption = get_caption(image_path)
+        return self.to_surface(img), caption
+
+    def blit(self, frame):
+        """Put a screen-sized BGR frame straight on screen, e.g. an animation frame"""
+        self.screen.blit(self.to_surface(frame), (0, 0))
+        pygame.display.flip()
+
+    def compose(self, target, surface, caption=None):
+        """Draw a prepared surface centered on black, with the caption along the bottom"""
+        target.fill((0, 0, 0))
+        if surface is not None:
+            target.blit(surface, ((self.width - surface.get_width()) // 2,
+                                  (self.height - surface.get_height()) // 2))
+        if caption:
+            text, outline = self.caption_surfaces(caption)
+            text_rect = text.get_rect(center=(self.width // 2, self.height - 30))
+            target.blit(outline, text_rect.move(2, 2))
+            target.blit(text, text_rect)
+
+    def show(self, surface, caption=None):
+        """Put a prepared surface on screen, through a transition if one is set.
+
+        Returns the action of a key pressed during the transition, None otherwise.
+        """
+        engine = transitions.get_engine()
+        if engine is None or not self._on_screen:
+            self.compose(self.screen, surface, caption)
+            pygame.display.flip()
+            self._on_screen = True
+            return None
+
+        if self._next is None:
+            self._previous = self.screen.copy()
+            self._next = self.screen.copy()
+        self._previous.blit(self.screen, (0, 0))
+        self.compose(self._next, surface, caption)
+        previous, following = self._previous, self._next
+
+        def draw(progress):
+            if engine.kind == transitions.SLIDE:
+                offset = int(self.width * progress)
+                self.screen.blit(previous, (-offset, 0))
+                self.screen.blit(following, (self.width - offset, 0))
+            else:
+                self.screen.blit(previous, (0, 0))
+                following.set_alpha(int(255 * progress))
+                self.screen.blit(following, (0, 0))
+            pygame.display.flip()
 
-    # Load and optionally rotate image
-    img = Image.open(image_path)
+        action = engine.run(draw, wait_for_key)
+        following.set_alpha(None)
+        self.screen.blit(following, (0, 0))
+        pygame.display.flip()
+        return action
+
+def get_renderer():
+    global _renderer
+    if _renderer is None:
+        _renderer = Renderer()
+    return _renderer
+
+def get_screen_size():
+    renderer = get_renderer()
+    return renderer.width, renderer.height
+
+def wait_for_key(timeout):
+    """Sleep until an event arrives or timeout seconds pass. Returns the key's action or None."""
+    event = pygame.event.wait(max(1, int(timeout * 1000)))
+    if event.type == pygame.KEYDOWN:
+        return KEY_ACTIONS.get(event.key, "next")
+    return None
+
+def present(frame, display_interval, scheduler=None, animation=None):
+    """Show a screen-sized BGR frame, e.g. one rendered by the sync process.
+
+    animation, a KenBurns, keeps rendering frames while waiting.
+    """
+    renderer = get_renderer()
+    with profiler.span('present'):
+        action = renderer.show(renderer.to_surface(frame))
+    if action:
+        return action
+    if animation is None:
+        return (scheduler or IdleScheduler()).wait(display_interval, wait_for_key)
+    return (scheduler or IdleScheduler()).wait(display_interval, animation.animate(wait_for_key, renderer.blit))
+
+def show_photo(image_path, display_interval, rotation=0, scheduler=None):
+    renderer = get_renderer()
+    surface, caption = renderer.prepare(image_path, rotation)
+    if surface is None:
+        return None
+    with profiler.span('present', image_path):
+        action = renderer.show(surface, caption)
+    if action:
+        # A key pressed during the transition
+        return action
+
+    # Block on input until the interval ends, running any scheduled work in between
+    return (scheduler or IdleScheduler()).wait(display_interval, wait_for_key)
+
+def show_photo_fill(image_path, display_interval, rotation=0, scheduler=None):
+    """Display photo filling the screen, cropped around its subject"""
+    renderer = get_renderer()
+    frame = compose_photo_fill(image_path, renderer.width, renderer.height, rotation)
+    if frame is None:
+        return None
+    return present(frame, display_interval, scheduler)
+
+def show_blank(duration, scheduler=None):
+    """Show a black screen for quiet hours and return the action for any key pressed"""
+    action = get_renderer().show(None)
+    if action:
+        return action
+    return (scheduler or IdleScheduler()).wait(duration, wait_for_key)
+
+def prepare_previous(screen, image_path, rotation=0):
+    """The frame preparation this backend used to do for every photo, kept for the benchmark"""
+    from PIL import Image
+    screen_width, screen_height = screen.get_size()
+    source_path, caption = get_display_source(image_path)
+    img = Image.open(source_path)
     if rotation:
         img = img.rotate(-rotation, expand=True)
-    img_width, img_height = img.size
-
-    # Scale image to fit screen
-    img_ratio = img_width / img_height
-    screen_ratio = screen_width / screen_height
-    if img_ratio > screen_ratio:
-        new_width = screen_width
-        new_height = int(screen_width / img_ratio)
+    img_ratio = img.size[0] / img.size[1]
+    if img_ratio > screen_width / screen_height:
+        new_size = (screen_width, int(screen_width / img_ratio))
     else:
-        new_height = screen_height
-        new_width = int(screen_height * img_ratio)
-
-    img = img.resize((new_width, new_height))
-    img = pygame.image.fromstring(img.tobytes(), img.size, img.mode)
-
-    # Fill screen and blit image centered
+        new_size = (int(screen_height * img_ratio), screen_height)
+    img = img.resize(new_size)
+    surface = pygame.image.fromstring(img.tobytes(), img.size, img.mode)
     screen.fill((0, 0, 0))
-    x_offset = (screen_width - new_width) // 2
-    y_offset = (screen_height - new_height) // 2
-    screen.blit(img, (x_offset, y_offset))
-
-    # Draw caption
-    caption = get_caption(image_path)
-    font = pygame.font.SysFont('Arial', 28)
+    screen.blit(surface, ((screen_width - new_size[0]) // 2, (screen_height - new_size[1]) // 2))
+    if caption is None:
+        caption = get_caption(image_path)
+    font = pygame.font.SysFont(CAPTION_FONT, CAPTION_SIZE)
     text = font.render(caption, True, (255, 255, 255))
-    text_rect = text.get_rect(center=(screen_width // 2, screen_height - 30))
     outline = font.render(caption, True, (0, 0, 0))
-    outline_rect = outline.get_rect(center=(screen_width // 2, screen_height - 30))
-    screen.blit(outline, outline_rect.move(2, 2))
+    text_rect = text.get_rect(center=(screen_width // 2, screen_height - 30))
+    screen.blit(outline, text_rect.move(2, 2))
     screen.blit(text, text_rect)
 
-    pygame.display.flip()
-
-    # Timer and key loop
-    start_time = time.time()
-    while time.time() - start_time < display_interval:
-        for event in pygame.event.get():
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
-                    pygame.quit()
-                    return "exit"
-                elif event.key == pygame.K_r:
-                    pygame.quit()
-                    return "reshuffle"
-                elif event.key == pygame.K_n:
-                    pygame.quit()
-                    return "new"
-                elif event.key == pygame.K_b:
-                    pygame.quit()
-                    return "back"
-                else:
-                    pygame.quit()
-                    return "next"
-        time.sleep(0.1)
+def benchmark(paths, rounds=5, size=(1920, 1080)):
+    """Time frame preparation per photo, the previous way and with the persistent renderer"""
+    renderer = Renderer(size)
+    for rotation in (0, 90):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for path in paths:
+                prepare_previous(renderer.screen, path, rotation)
+        previous = (time.perf_counter() - start) / (rounds * len(paths))
 
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for path in paths:
+                surface, caption = renderer.prepare(path, rotation)
+                renderer.show(surface, caption)
+        current = (time.perf_counter() - start) / (rounds * len(paths))
+        print(f"rotation {rotation:>3}: previous {previous * 1000:.0f} ms/frame, "
+              f"renderer {current * 1000:.0f} ms/frame ({previous / current:.1f}x)")
     pygame.quit()
-    return "next"
\ No newline at end of file
+
+if __name__ == "__main__":
+    # python display_manager_pygame.py [photos...]: benchmark frame preparation,
+    # on a sample photo if none are given. Needs no screen.
+    import sys
+    import tempfile
+    from ingest import create_sample
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    if len(sys.argv) > 1:
+        benchmark(sys.argv[1:])
+    else:
+        with tempfile.TemporaryDirectory() as samples:
+            # A camera original, and the size of an ingest rendition
+            for size in ((4032, 3024), (1920, 1440)):
+                path = os.path.join(samples, f'sample_{size[0]}.jpg')
+                create_sample(path, size)
+                print(f"{size[0]}x{size[1]} photo:")
+                benchmark([path])
@@ -0,0 +1,183 @@
+# download_queue.py
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+
+import profiler
+from drive_manager import create_drive_service, download_photo
+
+logger = logging.getLogger(__name__)
+
+# How many photos ahead of the playlist cursor get top download priority
+DEFAULT_LOOKAHEAD = 5
+
+# Priority tiers, lowest value downloads first
+TIER_UPCOMING = 0      # About to be shown by the playlist
+TIER_SEARCH = 1        # Matches the active search query
+TIER_BACKGROUND = 2    # Everything else, in listing order
+
+class DownloadQueue:
+    """Downloads missing photos in a background thread, most urgent first.
+
+    Photos are ranked by where the playlist cursor is: the next photos to be
+    shown come first, then search matches, then everything else in the order
+    the Drive listing returned them. Call reprioritize() whenever the cursor
+    moves or the search setting changes to re-rank what is still pending.
+
+    Photos come from Drive unless a fetch function is given, called as
+    fetch(photo, local_path) in the worker thread (a client frame fetches
+    from its hub this way).
+    """
+
+    def __init__(self, creds, local_folder, ingest=None, fetch=None):
+        self.creds = creds
+        self.local_folder = local_folder
+        self.ingest = ingest  # IngestPipeline that checks and prepares each downloaded photo
+        self.fetch = fetch
+        self._cond = threading.Condition()
+        self._pending = {}      # path -> photo dict from list_photos
+        self._order = {}        # path -> listing order, used as tie breaker
+        self._ranks = {}        # path -> current (tier, position) rank
+        self._upcoming = set()  # paths currently boosted by the playlist cursor
+        self._heap = []         # (rank, seq, path), stale entries skipped on pop
+        self._seq = itertools.count()
+        self._active = None
+        self._thread = None
+
+    def start(self):
+        """Start the background download worker"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="download-queue", daemon=True)
+            self._thread.start()
+            logger.info("Started background download queue")
+
+    def add(self, photo):
+        """Queue a photo for download. Returns True if it was not already queued.
+
+        Never blocks: the listing runs on the display thread, and the pending
+        photo dicts are small enough to hold the whole library.
+        """
+        path = photo['path'].replace('\\', '/')
+        with self._cond:
+            if path == self._active:
+                return False
+            is_new = path not in self._pending
+            if is_new:
+                self._order[path] = next(self._seq)
+            self._pending[path] = photo
+            self._push(path, self._rank_for(path))
+            self._cond.notify_all()
+            return is_new
+
+    def retain(self, paths):
+        """Drop pending downloads for photos that are no longer in Drive"""
+        keep = {p.replace('\\', '/') for p in paths}
+        with self._cond:
+            for path in list(self._pending):
+                if path not in keep:
+                    logger.debug(f"Dropping queued download no longer in Drive: {path}")
+                    self._forget(path)
+
+    def reprioritize(self, upcoming):
+        """Re-rank pending downloads around the playlist cursor.
+
+        upcoming is the ordered list of photo paths the playlist will show
+        next; the first of them downloads first.
+        """
+        upcoming = [p.replace('\\', '/') for p in upcoming]
+        with self._cond:
+            previous = self._upcoming
+            self._upcoming = {p for p in upcoming if p in self._pending}
+            for position, path in enumerate(upcoming):
+                if path in self._pending:
+                    self._push(path, (TIER_UPCOMING, position))
+            for path in previous - self._upcoming:
+                if path in self._pending:
+                    self._push(path, self._rank_for(path))
+            if self._upcoming:
+                self._cond.notify_all()
+
+    def is_pending(self, path):
+        """Check if a photo is queued or currently downloading"""
+        path = path.replace('\\', '/')
+        with self._cond:
+            return path in self._pending or path == self._active
+
+    def wait_for(self, path, timeout):
+        """Block until the given photo is downloaded, up to timeout seconds.
+
+        Returns True if the photo is on disk when this returns.
+        """
+        path = path.replace('\\', '/')
+        with self._cond:
+            self._cond.wait_for(
+                lambda: path not in self._pending and path != self._active,
+                timeout=timeout)
+        return os.path.exists(os.path.join(self.local_folder, path))
+
+    def pending_count(self):
+        with self._cond:
+            return len(self._pending) + (1 if self._active else 0)
+
+    def _rank_for(self, path):
+        if path in self._upcoming:
+            return self._ranks.get(path, (TIER_UPCOMING, 0))
+        tier = TIER_SEARCH if self._pending[path].get('search_match') else TIER_BACKGROUND
+        return (tier, self._order[path])
+
+    def _push(self, path, rank):
+        self._ranks[path] = rank
+        heapq.heappush(self._heap, (rank, next(self._seq), path))
+
+    def _forget(self, path):
+        self._pending.pop(path, None)
+        self._ranks.pop(path, None)
+        self._order.pop(path, None)
+        self._upcoming.discard(path)
+
+    def _next_photo(self):
+        """Pop the most urgent pending photo, waiting until one is available"""
+        with self._cond:
+            while True:
+                while self._heap:
+                    rank, _, path = heapq.heappop(self._heap)
+                    # Skip entries that were re-ranked or dropped after being pushed
+                    if path in self._pending and self._ranks.get(path) == rank:
+                        photo = self._pending[path]
+                        self._forget(path)
+                        self._active = path
+                        self._cond.notify_all()
+                        return path, photo
+                self._cond.wait()
+
+    def _drive_fetch(self):
+        # The Drive client is not thread safe, so the worker builds its own
+        service = None
+        while service is None:
+            try:
+                service = create_drive_service(self.creds)
+            except Exception as e:
+                logger.error(f"Download queue could not create Drive service, retrying: {str(e)}")
+                time.sleep(30)
+        return lambda photo, local_path: download_photo(service, photo, local_path)
+
+    def _run(self):
+        fetch = self.fetch or self._drive_fetch()
+        while True:
+            path, photo = self._next_photo()
+            local_path = os.path.join(self.local_folder, path)
+            try:
+                with profiler.span('download', path):
+                    downloaded = fetch(photo, local_path)
+                if downloaded:
+                    logger.info(f"Downloaded new photo: {path}")
+                    if self.ingest is not None:
+                        self.ingest.submit(path, photo.get('md5Checksum'))
+            except Exception as e:
+                logger.error(f"Background download failed for {path}: {str(e)}")
+            with self._cond:
+                self._active = None
+                self._cond.notify_all()
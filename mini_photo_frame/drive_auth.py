@@ -1,11 +1,26 @@
 # drive_auth.py
+import datetime
+import logging
 import os
 import sys
+import threading
+import time
+import httplib2
+import google_auth_httplib2
 from google.oauth2 import service_account
-from googleapiclient.discovery import build
 
 SCOPES = ['https://www.googleapis.com/auth/drive']
 
+# Refresh access tokens this long before they expire
+TOKEN_REFRESH_MARGIN = 5 * 60  # seconds
+TOKEN_RETRY_INTERVAL = 60      # seconds, after a failed refresh (e.g. offline)
+
+logger = logging.getLogger(__name__)
+
+# (json path, mtime, credentials) of the last successfully loaded service account
+_cached_credentials = None
+_refresh_lock = threading.Lock()
+
 def is_frozen():
     """Check if we're running in a PyInstaller bundle"""
     return getattr(sys, 'frozen', False)
@@ -29,6 +44,17 @@ def get_service_account_path():
         return os.path.join(get_base_path(), 'service_account')
 
 def authenticate_google_drive():
+    global _cached_credentials
+    # Reuse the credentials we already loaded if the JSON file hasn't changed
+    if _cached_credentials:
+        cached_path, cached_mtime, cached_creds = _cached_credentials
+        try:
+            if os.path.getmtime(cached_path) == cached_mtime:
+                return cached_creds
+        except OSError:
+            pass
+        _cached_credentials = None
+
     # Get the correct service account directory path
     service_account_path = get_service_account_path()
     
@@ -62,8 +88,50 @@ def authenticate_google_drive():
     try:
         creds = service_account.Credentials.from_service_account_file(
             service_acct_json, scopes=SCOPES)
+        _cached_credentials = (service_acct_json, os.path.getmtime(service_acct_json), creds)
         return creds
     except Exception as e:
         print(f"\nError loading service account credentials: {e}")
         print(f"Please check that your service account JSON file is valid.")
         return None
+
+def refresh_credentials(creds):
+    """Fetch a new access token for creds. Safe to call from several threads."""
+    with _refresh_lock:
+        creds.refresh(google_auth_httplib2.Request(httplib2.Http()))
+
+def seconds_until_refresh(creds):
+    """Seconds until creds should be refreshed, 0 if they need it now"""
+    if not creds.valid or creds.expiry is None:
+        return 0
+    # google-auth keeps expiry as a naive UTC datetime
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    remaining = (creds.expiry - now).total_seconds() - TOKEN_REFRESH_MARGIN
+    return max(0, remaining)
+
+def start_token_refresher(creds):
+    """Keep the access token fresh in a background thread.
+
+    Drive calls then never have to stop for a token refresh, and a frame that
+    lost its connection gets a new token as soon as it is back online.
+    """
+    def refresh_loop():
+        while True:
+            delay = seconds_until_refresh(creds)
+            if delay > 0:
+                time.sleep(delay)
+                continue
+            try:
+                refresh_credentials(creds)
+                logger.debug(f"Refreshed Drive access token, expires {creds.expiry}")
+            except Exception as e:
+                logger.warning(f"Could not refresh Drive access token: {str(e)}")
+                time.sleep(TOKEN_RETRY_INTERVAL)
+
+    thread = threading.Thread(target=refresh_loop, name="token-refresher", daemon=True)
+    thread.start()
+    return thread
+
+def create_authorized_http(creds, timeout=None):
+    """Create a keep-alive HTTP transport that adds creds to every request"""
+    return google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=timeout))
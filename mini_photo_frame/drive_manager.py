@@ -1,43 +1,201 @@
 # drive_manager.py
 import os
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build, build_from_document
 from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
 import googleapiclient.http
+from googleapiclient.errors import HttpError
+import drive_requests
+import profiler
+import storage
+from drive_requests import execute
 import io
+import json
 import logging
+import mimetypes
 import random
 import socket
+import threading
+from drive_auth import create_authorized_http, get_base_path
+from quiet_hours import parse_quiet_hours, to_folder_name
+from playlists import parse_playlist, to_folder_name as playlist_folder_name
 
-# Set up logging with more detailed format
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
 logger = logging.getLogger(__name__)
 
+# Timeout for a single Drive HTTP request, in seconds
+HTTP_TIMEOUT = 60
+
+# Photo types synced from Drive. Anything but JPEG is transcoded at ingest.
+PHOTO_MIME_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/heic', 'image/heif')
+HEIC_MIME_TYPES = ('image/heic', 'image/heif')
+
+# Types the listing asks Drive for, narrowed by configure_photo_types to those this frame can show
+_listed_mime_types = PHOTO_MIME_TYPES
+
+# Uploads are sent in chunks of this size (a multiple of 256 KB), so a dropped
+# connection only costs the chunk in flight
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Drive clients are not thread safe, so each thread keeps its own
+_thread_services = threading.local()
+
+def get_discovery_cache_path():
+    """Where a downloaded Drive discovery document is kept for offline startups"""
+    return os.path.join(get_base_path(), 'drive_v3_discovery.json')
+
+def load_discovery_document():
+    """Load the Drive v3 discovery document without using the network.
+
+    Prefers the copy bundled with google-api-python-client, then one cached
+    by an earlier startup. Returns None if neither is available.
+    """
+    try:
+        from googleapiclient.discovery_cache import get_static_doc
+        document = get_static_doc('drive', 'v3')
+        if document:
+            return document
+    except ImportError:
+        pass
+    try:
+        with open(get_discovery_cache_path(), 'r') as f:
+            return f.read()
+    except OSError:
+        return None
+
 def create_drive_service(creds):
+    """Create a Drive service for the calling thread.
+
+    The service is built from a local discovery document, so startup needs no
+    network, and it is reused for later calls on the same thread so all of
+    that thread's Drive calls share one keep-alive HTTP connection.
+    """
+    cached = getattr(_thread_services, 'service', None)
+    if cached and _thread_services.creds is creds:
+        return cached
+    
     logger.info("Creating Google Drive service...")
     try:
-        service = build('drive', 'v3', credentials=creds)
+        http = create_authorized_http(creds, timeout=HTTP_TIMEOUT)
+        document = load_discovery_document()
+        if document:
+            service = build_from_document(document, http=http)
+        else:
+            # No local copy yet: fetch it once and keep it for offline startups
+            logger.info("No local Drive discovery document, fetching it")
+            service = build('drive', 'v3', http=http, cache_discovery=False)
+            try:
+                with open(get_discovery_cache_path(), 'w') as f:
+                    json.dump(service._rootDesc, f)
+            except OSError as e:
+                logger.warning(f"Could not cache Drive discovery document: {str(e)}")
         logger.info("Successfully created Google Drive service")
+        _thread_services.service = service
+        _thread_services.creds = creds
         return service
     except Exception as e:
         logger.error(f"Failed to create Drive service: {str(e)}")
         raise
 
-def upload_photo(service, file_path, folder_id=None):
+def configure_photo_types(transcoding, heic=True):
+    """Only sync photo types this frame can show.
+
+    Without ingest transcoding only JPEG photos are synced, and HEIC photos
+    also need a HEIC decoder. Anything else would be downloaded only to be
+    skipped by the display.
+    """
+    global _listed_mime_types
+    if not transcoding:
+        _listed_mime_types = ('image/jpeg',)
+    elif not heic:
+        _listed_mime_types = tuple(m for m in PHOTO_MIME_TYPES if m not in HEIC_MIME_TYPES)
+    else:
+        _listed_mime_types = PHOTO_MIME_TYPES
+    skipped = [m for m in PHOTO_MIME_TYPES if m not in _listed_mime_types]
+    if skipped:
+        reason = "INGEST=false" if not transcoding else "the pillow-heif package is not installed"
+        logger.info(f"Not syncing {', '.join(skipped)} photos: {reason}")
+
+def get_mime_type(file_path):
+    """Mime type of a photo from its extension, None if it isn't a photo type the frame shows"""
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in ('.heic', '.heif'):
+        return 'image/' + extension[1:]  # Not known to mimetypes on every platform
+    mime_type = mimetypes.guess_type(file_path)[0]
+    return mime_type if mime_type in PHOTO_MIME_TYPES else None
+
+def get_upload_offset(http, resumable_uri, size):
+    """Ask Drive how much of an unfinished resumable upload it has.
+
+    Returns (bytes received, None) for an upload to continue, or
+    (size, file resource) if Drive already has all of it. Raises HttpError
+    for other answers, e.g. 404 or 410 once the session has expired.
+    """
+    resp, content = http.request(resumable_uri, method='PUT', body=b'',
+                                 headers={'Content-Length': '0', 'Content-Range': f'bytes */{size}'})
+    if resp.status in (200, 201):
+        return size, json.loads(content.decode('utf-8'))
+    if resp.status == 308:
+        # Range is 'bytes=0-<last byte received>', missing if nothing arrived yet
+        received = resp.get('range')
+        return (int(received.rsplit('-', 1)[1]) + 1 if received else 0), None
+    raise HttpError(resp, content, uri=resumable_uri)
+
+def upload_photo(service, file_path, folder_id=None, name=None, file_id=None, app_properties=None,
+                 resumable_uri=None, on_session=None):
+    """Upload a photo in resumable chunks and return its Drive ID.
+
+    With file_id the existing Drive file gets the new content instead. An
+    upload an earlier run didn't finish continues from resumable_uri, and
+    on_session(uri) is called once a new upload session has started, so the
+    caller can keep it for that. Each chunk goes through the shared rate
+    limiter, and failed chunks are retried from where Drive says it got to.
+    """
     logger.info(f"Uploading photo: {file_path}")
     try:
-        file_metadata = {'name': os.path.basename(file_path)}
-        if folder_id:
-            file_metadata['parents'] = [folder_id]
-            logger.info(f"Uploading to folder ID: {folder_id}")
+        file_metadata = {'name': name or os.path.basename(file_path)}
+        if app_properties:
+            file_metadata['appProperties'] = app_properties
+        media = MediaFileUpload(file_path, mimetype=get_mime_type(file_path) or 'application/octet-stream',
+                                chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
+        if file_id:
+            request = service.files().update(fileId=file_id, body=file_metadata, media_body=media, fields='id')
+        else:
+            if folder_id:
+                file_metadata['parents'] = [folder_id]
+                logger.info(f"Uploading to folder ID: {folder_id}")
+            request = service.files().create(body=file_metadata, media_body=media, fields='id')
         
-        media = MediaFileUpload(file_path, mimetype='image/jpeg')
-        file = service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-        logger.info(f'Successfully uploaded file with ID: {file.get("id")}')
-        return file.get('id')
+        response = None
+        if resumable_uri:
+            try:
+                offset, response = drive_requests.executor.call(
+                    get_upload_offset, request.http, resumable_uri, media.size())
+            except HttpError as e:
+                if e.resp.status not in (404, 410):
+                    raise
+                logger.info(f"Upload session for {file_path} expired, restarting")
+                return upload_photo(service, file_path, folder_id, name, file_id, app_properties,
+                                    on_session=on_session)
+            if response is None:
+                logger.info(f"Continuing upload of {file_path} from byte {offset}")
+                request.resumable_uri = resumable_uri
+                request.resumable_progress = offset
+        while response is None:
+            try:
+                status, response = drive_requests.executor.call(request.next_chunk)
+            except HttpError as e:
+                if resumable_uri and e.resp.status in (404, 410):
+                    # The earlier session expired, start over
+                    logger.info(f"Upload session for {file_path} expired, restarting")
+                    return upload_photo(service, file_path, folder_id, name, file_id, app_properties,
+                                        on_session=on_session)
+                raise
+            if on_session and request.resumable_uri != resumable_uri:
+                resumable_uri = request.resumable_uri
+                on_session(resumable_uri)
+            if status:
+                logger.debug(f"Upload progress: {int(status.progress() * 100)}%")
+        logger.info(f'Successfully uploaded file with ID: {response.get("id")}')
+        return response.get('id')
     except Exception as e:
         logger.error(f"Failed to upload photo {file_path}: {str(e)}")
         raise
@@ -54,9 +212,11 @@ def get_local_photos(local_folder):
     """Get list of local photos and their paths"""
     local_photos = []
     local_photos_map = {}
-    for root, _, files in os.walk(local_folder):
+    for root, dirs, files in os.walk(local_folder):
+        # Dotfiles and dot folders (.gitkeep, partial downloads, caches) are not photos
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
         for file in files:
-            if file != ".gitkeep":
+            if not file.startswith('.'):
                 rel_path = os.path.relpath(os.path.join(root, file), local_folder).replace('\\', '/')
                 local_photos.append(rel_path)
                 local_photos_map[rel_path] = os.path.join(root, file)
@@ -88,98 +248,103 @@ def cleanup_deleted_photos(local_photos_map, drive_photos, local_folder):
             except Exception as e:
                 logger.error(f"  Error deleting {rel_path}: {str(e)}")
 
-def list_photos(service, folder_id=None, search_query=None, shuffle_enabled=False):
-    """List all photos in the given folder and its subfolders"""
-    logger.info(f"Listing photos from folder ID: {folder_id}")
-    if search_query:
-        logger.info(f"Active search query: '{search_query}'")
-    
-    # First check internet connection
-    if not check_internet_connection():
-        logger.warning("No internet connection available. Cannot list photos from Drive.")
-        return None  # Return None instead of empty list to indicate connection failure
-    
-    photos = []
-    search_matches = []  # Track photos that match the search query
-    
-    def get_items_in_folder(folder_id):
+def iter_photo_pages(service, folder_id, search_query=None, strict=False):
+    """Walk the given folder and its subfolders, yielding photos one page at a time.
+
+    Each yielded page is the list of photos from one Drive list call, so callers
+    can start working on the first photos while the rest are still being listed.
+    Photos matching search_query are flagged with 'search_match'. A folder that
+    fails to list is logged and skipped, unless strict is set, when the error
+    is raised so the caller never works from an incomplete listing.
+    """
+    def get_pages_in_folder(folder_id):
         logger.debug(f"Fetching items from folder: {folder_id}")
-        query = f"'{folder_id}' in parents and (mimeType='image/jpeg' or mimeType='application/vnd.google-apps.folder')"
-        items = []
+        mime_types = _listed_mime_types + ('application/vnd.google-apps.folder',)
+        query = f"'{folder_id}' in parents and (" + " or ".join(f"mimeType='{m}'" for m in mime_types) + ")"
         page_token = None
+        total = 0
         
         try:
             while True:
-                results = service.files().list(
-                    q=query,
-                    spaces='drive',
-                    fields="nextPageToken, files(id, name, mimeType, createdTime, description)",
-                    orderBy="createdTime desc",  # Most recent first
-                    pageToken=page_token,
-                    pageSize=1000
-                ).execute()
+                with profiler.span('list', folder_id):
+                    results = execute(service.files().list(
+                        q=query,
+                        spaces='drive',
+                        fields="nextPageToken, files(id, name, mimeType, createdTime, description, md5Checksum, size, appProperties)",
+                        orderBy="createdTime desc",  # Most recent first
+                        pageToken=page_token,
+                        pageSize=1000
+                    ))
                 
                 batch_items = results.get('files', [])
-                items.extend(batch_items)
+                total += len(batch_items)
                 logger.debug(f"Fetched {len(batch_items)} items in this batch")
+                yield batch_items
                 
                 page_token = results.get('nextPageToken')
                 if not page_token:
                     break
                 
-            logger.debug(f"Found total of {len(items)} items in folder {folder_id}")
-            return items
+            logger.debug(f"Found total of {total} items in folder {folder_id}")
         except Exception as e:
             logger.error(f"Error fetching items from folder {folder_id}: {str(e)}")
-            return []
+            if strict:
+                raise
     
     def process_folder(folder_id, current_path=""):
-        items = get_items_in_folder(folder_id)
-        for item in items:
-            safe_name = sanitize_path(item['name'])
-            
-            if item['mimeType'] == 'application/vnd.google-apps.folder':
-                if item['name'].lower() != 'settings':
-                    logger.debug(f"Processing subfolder: {safe_name}")
-                    subfolder_path = os.path.join(current_path, safe_name) if current_path else safe_name
-                    process_folder(item['id'], subfolder_path)
-                else:
-                    logger.debug("Skipping settings folder")
-            else:
-                # Store both the full path and the filename separately
-                item['filename'] = safe_name
-                item['path'] = os.path.join(current_path, safe_name) if current_path else safe_name
-                item['directory'] = current_path
-                
-                # Check if photo matches search query
-                if search_query:
-                    description = item.get('description', '').lower()
-                    name = item['name'].lower()
-                    path = item['path'].lower()
-                    if (search_query in description) or (search_query in name) or (search_query in path):
-                        logger.info(f"Search match found: '{search_query}' in {item['path']}")
-                        search_matches.append(item)
+        for items in get_pages_in_folder(folder_id):
+            photos = []
+            subfolders = []
+            for item in items:
+                safe_name = sanitize_path(item['name'])
                 
-                logger.debug(f"Found photo: {item['path']}")
-                photos.append(item)
-    
-    process_folder(folder_id)
+                if item['mimeType'] == 'application/vnd.google-apps.folder':
+                    if item['name'].lower() != 'settings':
+                        subfolder_path = os.path.join(current_path, safe_name) if current_path else safe_name
+                        subfolders.append((item['id'], subfolder_path))
+                    else:
+                        logger.debug("Skipping settings folder")
+                else:
+                    # Store both the full path and the filename separately
+                    item['filename'] = safe_name
+                    item['path'] = os.path.join(current_path, safe_name) if current_path else safe_name
+                    item['directory'] = current_path
+                    
+                    # Check if photo matches search query
+                    if search_query:
+                        description = item.get('description', '').lower()
+                        name = item['name'].lower()
+                        path = item['path'].lower()
+                        if (search_query in description) or (search_query in name) or (search_query in path):
+                            logger.info(f"Search match found: '{search_query}' in {item['path']}")
+                            item['search_match'] = True
+                    
+                    photos.append(item)
+            
+            # Hand over this page's photos before descending into its subfolders
+            if photos:
+                yield photos
+            for subfolder_id, subfolder_path in subfolders:
+                logger.debug(f"Processing subfolder: {subfolder_path}")
+                yield from process_folder(subfolder_id, subfolder_path)
     
-    # Sort photos by creation time (newest first)
-    photos.sort(key=lambda x: x.get('createdTime', ''), reverse=True)
+    yield from process_folder(folder_id)
+
+def order_search_matches(photos, search_query=None, shuffle_enabled=False):
+    """Move photos matching the search query to the front of a sorted photo list"""
+    search_matches = [p for p in photos if p.get('search_match')]
     
     # If there's a search query, handle the search matches
     if search_query and search_matches:
         # Remove matching photos from main list to avoid duplicates
-        photos = [p for p in photos if p not in search_matches]
+        photos = [p for p in photos if not p.get('search_match')]
         
         # If shuffle is enabled, shuffle the search matches
         if shuffle_enabled:
             random.shuffle(search_matches)
             logger.info("Shuffling search matches")
         else:
-            # Sort search matches by creation time if not shuffling
-            search_matches.sort(key=lambda x: x.get('createdTime', ''), reverse=True)
+            # Search matches keep the creation time order of the sorted list
             logger.info("Sorting search matches by creation time")
         
         # Add search matches after any new photos but before the rest
@@ -188,6 +353,27 @@ def list_photos(service, folder_id=None, search_query=None, shuffle_enabled=Fals
     elif search_query:
         logger.info(f"No photos found matching search query: '{search_query}'")
     
+    return photos
+
+def list_photos(service, folder_id=None, search_query=None, shuffle_enabled=False):
+    """List all photos in the given folder and its subfolders"""
+    logger.info(f"Listing photos from folder ID: {folder_id}")
+    if search_query:
+        logger.info(f"Active search query: '{search_query}'")
+    
+    # First check internet connection
+    if not check_internet_connection():
+        logger.warning("No internet connection available. Cannot list photos from Drive.")
+        return None  # Return None instead of empty list to indicate connection failure
+    
+    photos = []
+    for page in iter_photo_pages(service, folder_id, search_query):
+        photos.extend(page)
+    
+    # Sort photos by creation time (newest first)
+    photos.sort(key=lambda x: x.get('createdTime', ''), reverse=True)
+    photos = order_search_matches(photos, search_query, shuffle_enabled)
+    
     logger.info(f"Found total of {len(photos)} photos")
     return photos
 
@@ -197,7 +383,7 @@ def download_photo(service, photo, local_path):
         if isinstance(photo, str):
             file_id = photo
             logger.info(f"Downloading photo with ID: {file_id}")
-            file_metadata = service.files().get(fileId=file_id, fields='name').execute()
+            file_metadata = execute(service.files().get(fileId=file_id, fields='name'))
             file_name = sanitize_path(file_metadata['name'])
             file_path = local_path #os.path.join(local_path, file_name)
             logger.debug(f"Single file will be saved as: {file_path}")
@@ -210,7 +396,7 @@ def download_photo(service, photo, local_path):
             file_id = photo['id']
             # Use the path directly as it's already properly constructed
             file_path = local_path # os.path.join(local_path, photo['path'])
-            logger.info(f"Downloading photo to: {file_path} (ID: {file_id})")
+            logger.debug(f"Downloading photo to: {file_path} (ID: {file_id})")
 
         # Create the directory structure if needed
         dir_path = os.path.dirname(file_path)
@@ -225,20 +411,39 @@ def download_photo(service, photo, local_path):
         # Download the file
         request = service.files().get_media(fileId=file_id)
         
+        # In sd_card mode the download goes to tmpfs, so the card sees one write of the finished file
+        temp = storage.reserve(photo.get('size')) if isinstance(photo, dict) else None
+        if temp:
+            try:
+                with open(temp.path, 'wb') as fh:
+                    downloader = MediaIoBaseDownload(fh, request)
+                    done = False
+                    while done is False:
+                        status, done = drive_requests.executor.call(downloader.next_chunk)
+                temp.move_to(file_path)
+                logger.debug(f"Successfully downloaded photo to: {file_path}")
+                return file_path
+            finally:
+                temp.release()
+        
         # Stream the file to disk
         with io.BytesIO() as fh:
             downloader = MediaIoBaseDownload(fh, request)
             done = False
             while done is False:
-                status, done = downloader.next_chunk()
-                logger.debug(f"Download progress: {int(status.progress() * 100)}%")
+                status, done = drive_requests.executor.call(downloader.next_chunk)
             fh.seek(0)
             
-            # Write the file
+            # Write the file under a dot name and rename it into place, so a
+            # half-written file is never seen as a photo
             try:
-                with open(file_path, 'wb') as f:
+                directory, name = os.path.split(file_path)
+                temp_path = os.path.join(directory, '.' + name + '.part')
+                with open(temp_path, 'wb') as f:
                     f.write(fh.read())
-                logger.info(f"Successfully downloaded photo to: {file_path}")
+                os.replace(temp_path, file_path)
+                storage.meter.record('photos', os.path.getsize(file_path))
+                logger.debug(f"Successfully downloaded photo to: {file_path}")
                 return file_path
             except Exception as e:
                 logger.error(f"Failed to write file {file_path}: {str(e)}")
@@ -256,20 +461,32 @@ def create_folder(service, folder_name, parent_id=None):
     if parent_id:
         file_metadata['parents'] = [parent_id]
     
-    folder = service.files().create(body=file_metadata, fields='id').execute()
+    folder = execute(service.files().create(body=file_metadata, fields='id'))
     return folder.get('id')
 
+def get_or_create_folder(service, folder_name, parent_id):
+    """ID of the folder with this name in the parent folder, creating it if there is none"""
+    escaped = folder_name.replace('\\', '\\\\').replace("'", "\\'")
+    query = (f"mimeType='application/vnd.google-apps.folder' and name='{escaped}' "
+             f"and '{parent_id}' in parents and trashed=false")
+    folders = execute(service.files().list(q=query, spaces='drive', fields="files(id)")).get('files', [])
+    if folders:
+        return folders[0]['id']
+    logger.info(f"Creating folder: {folder_name}")
+    return create_folder(service, folder_name, parent_id)
+
 def get_or_create_settings_folder(service, parent_folder_id):
     """Get or create the settings folder and return its ID"""
-    logger.info("Looking for settings folder...")
+    # Runs with every settings check, so only logged at debug level
+    logger.debug("Looking for settings folder...")
     try:
         query = f"mimeType='application/vnd.google-apps.folder' and name='settings' and '{parent_folder_id}' in parents"
-        results = service.files().list(q=query, spaces='drive', fields="files(id)").execute()
+        results = execute(service.files().list(q=query, spaces='drive', fields="files(id)"))
         folders = results.get('files', [])
         
         if folders:
             folder_id = folders[0]['id']
-            logger.info(f"Found existing settings folder: {folder_id}")
+            logger.debug(f"Found existing settings folder: {folder_id}")
             return folder_id
         else:
             logger.info("Settings folder not found, creating new one...")
@@ -282,14 +499,14 @@ def get_or_create_settings_folder(service, parent_folder_id):
 
 def get_settings_from_folders(service, settings_folder_id, default_settings):
     """Read settings from folder names in the settings folder"""
-    logger.info("Reading settings from folder names...")
+    logger.debug("Reading settings from folder names...")
     settings = default_settings.copy()
     
     try:
         query = f"mimeType='application/vnd.google-apps.folder' and '{settings_folder_id}' in parents"
-        results = service.files().list(q=query, spaces='drive', fields="files(name)").execute()
+        results = execute(service.files().list(q=query, spaces='drive', fields="files(name)"))
         folders = results.get('files', [])
-        logger.info(f"Found {len(folders)} settings folders")
+        logger.debug(f"Found {len(folders)} settings folders")
         
         found_settings = set()
         has_search = False  # Track if we find a search folder
@@ -323,6 +540,15 @@ def get_settings_from_folders(service, settings_folder_id, default_settings):
                     settings['filter'] = name[7:]
                     found_settings.add('filter')
                     logger.debug(f"Found filter setting: {settings['filter']}")
+                elif name.startswith('playlist_') or name.startswith('dates_'):
+                    value = name[len('playlist_'):] if name.startswith('playlist_') else name[len('dates_'):]
+                    settings['playlist'] = parse_playlist(value)
+                    found_settings.add('playlist')
+                    logger.debug(f"Found playlist setting: {settings['playlist']}")
+                elif name.startswith('quiet_hours_'):
+                    settings['quiet_hours'] = parse_quiet_hours(name[len('quiet_hours_'):])
+                    found_settings.add('quiet_hours')
+                    logger.debug(f"Found quiet hours setting: {settings['quiet_hours']}")
             except ValueError as e:
                 logger.warning(f"Invalid setting folder name: {name} - {str(e)}")
                 continue
@@ -331,7 +557,7 @@ def get_settings_from_folders(service, settings_folder_id, default_settings):
             logger.info("Search folder removed, clearing search setting")
             settings.pop('search', None)
         
-        logger.info("Finished reading settings")
+        logger.debug("Finished reading settings")
         logger.debug(f"Final settings: {settings}")
         return settings, found_settings
     except Exception as e:
@@ -340,7 +566,7 @@ def get_settings_from_folders(service, settings_folder_id, default_settings):
 
 def ensure_default_settings_folders(service, settings_folder_id, default_settings):
     """Create default settings folders if they don't exist and no custom ones are present"""
-    logger.info("Checking for missing default settings folders...")
+    logger.debug("Checking for missing default settings folders...")
     
     # First, get current settings and which ones were found
     _, found_settings = get_settings_from_folders(service, settings_folder_id, default_settings)
@@ -363,14 +589,24 @@ def ensure_default_settings_folders(service, settings_folder_id, default_setting
         default_folders.append(f'shuffle_{shuffle_value}')
         logger.debug(f"Need to create shuffle folder: {shuffle_value}")
     
+    if 'quiet_hours' not in found_settings:
+        quiet_hours_folder = to_folder_name(default_settings.get('quiet_hours'))
+        default_folders.append(quiet_hours_folder)
+        logger.debug(f"Need to create quiet hours folder: {quiet_hours_folder}")
+    
+    if 'playlist' not in found_settings:
+        playlist_folder = playlist_folder_name(default_settings.get('playlist'))
+        default_folders.append(playlist_folder)
+        logger.debug(f"Need to create playlist folder: {playlist_folder}")
+    
     if not default_folders:
-        logger.info("All default settings folders already exist")
+        logger.debug("All default settings folders already exist")
         return
     
     # Check existing folders to avoid duplicates
     try:
         query = f"mimeType='application/vnd.google-apps.folder' and '{settings_folder_id}' in parents"
-        results = service.files().list(q=query, spaces='drive', fields="files(name)").execute()
+        results = execute(service.files().list(q=query, spaces='drive', fields="files(name)"))
         existing_folders = set(folder['name'].lower() for folder in results.get('files', []))
         
         # Create missing folders
@@ -397,8 +633,13 @@ def check_internet_connection():
     except OSError:
         return False
 
-def sync_drive_images(service, folder_id, local_folder, settings=None):
-    """Syncs images and returns a list of any new photos downloaded"""
+def sync_drive_images(service, folder_id, local_folder, settings=None, download_queue=None):
+    """Syncs images and returns a list of any new photos downloaded.
+
+    If a download_queue is given, missing photos are handed to it instead of
+    being downloaded inline, and the returned new photos are the ones that
+    were newly queued.
+    """
     # 1. First get local photos (we need this regardless of online/offline)
     local_photos, local_photos_map = get_local_photos(local_folder)
     
@@ -408,10 +649,74 @@ def sync_drive_images(service, folder_id, local_folder, settings=None):
     
     # 2. Try to get Drive photos, handle failure gracefully
     try:
-        # Attempt to get Drive photos
         search_query = settings.get('search', '').lower() if settings else None
         shuffle_enabled = settings.get('shuffle', False) if settings else False
-        drive_photos = list_photos(service, folder_id, search_query, shuffle_enabled)
+        logger.info(f"Listing photos from folder ID: {folder_id}")
+        if search_query:
+            logger.info(f"Active search query: '{search_query}'")
+        
+        # Stream the listing so downloads start as soon as the first page arrives
+        new_photos = []
+        listed = []  # Every photo, in arrival order
+        canonical = {}  # md5Checksum -> the one copy of that photo that is kept
+        if check_internet_connection():
+            for page in iter_photo_pages(service, folder_id, search_query):
+                for photo in page:
+                    listed.append(photo)
+                    
+                    # The same photo shared into several folders is downloaded and shown once
+                    md5 = photo.get('md5Checksum')
+                    kept = canonical.get(md5) if md5 else None
+                    if kept is not None:
+                        if needs_download(kept, local_photos) and not needs_download(photo, local_photos):
+                            # Keep the copy that is already on disk instead
+                            kept['duplicate'] = True
+                            canonical[md5] = photo
+                        else:
+                            photo['duplicate'] = True
+                            continue
+                    elif md5:
+                        canonical[md5] = photo
+                    
+                    if not needs_download(photo, local_photos):
+                        continue
+                    if download_queue is not None:
+                        if download_queue.add(photo):
+                            logger.debug(f"Queued new photo for download: {photo['path']}")
+                            new_photos.append(photo['path'])
+                        continue
+                    
+                    photo_dir = os.path.dirname(os.path.join(local_folder, photo['path']))
+                    if photo_dir and not os.path.exists(photo_dir):
+                        os.makedirs(photo_dir)
+                    
+                    local_path = os.path.join(local_folder, photo['path'])
+                    if download_photo(service, photo, local_path):
+                        logger.info(f"Downloaded new photo: {photo['path']}")
+                        new_photos.append(photo['path'])
+        else:
+            logger.warning("No internet connection available. Cannot list photos from Drive.")
+        
+        # Newest first. Each folder arrives newest first, so this merges descending runs in
+        # close to linear time, and the stable sort keeps arrival order for equal times.
+        listed.sort(key=lambda photo: photo.get('createdTime', ''), reverse=True)
+        drive_photos = [photo for photo in listed if not photo.get('duplicate')]
+        duplicates = [photo for photo in listed if photo.get('duplicate')]
+        if duplicates:
+            for photo in duplicates:
+                # A copy in a folder matching the search makes the kept copy match
+                if photo.get('search_match'):
+                    canonical[photo['md5Checksum']]['search_match'] = True
+            saved = sum(int(photo.get('size', 0)) for photo in duplicates)
+            logger.info(f"Skipped {len(duplicates)} duplicate copies of photos in other folders "
+                        f"({saved / 1e6:.1f} MB)")
+        drive_photos = order_search_matches(drive_photos, search_query, shuffle_enabled)
+        
+        # Upload dates stand in for capture dates in date playlists
+        ingest = getattr(download_queue, 'ingest', None)
+        if ingest is not None:
+            ingest.note_created({p['path']: p['createdTime'] for p in drive_photos if p.get('createdTime')})
+        logger.info(f"Found total of {len(drive_photos)} photos")
         
         # If we got here, we're online and have Drive photos
         if not drive_photos:
@@ -421,19 +726,14 @@ def sync_drive_images(service, folder_id, local_folder, settings=None):
                 random.shuffle(local_photos_shuffled)
                 return [], local_photos_shuffled
             return [], local_photos
-            
-        # Download new photos
-        new_photos = []
-        for photo in drive_photos:
-            if needs_download(photo, local_photos):
-                photo_dir = os.path.dirname(os.path.join(local_folder, photo['path']))
-                if photo_dir and not os.path.exists(photo_dir):
-                    os.makedirs(photo_dir)
-                
-                local_path = os.path.join(local_folder, photo['path'])
-                if download_photo(service, photo, local_path):
-                    logger.info(f"Downloaded new photo: {photo['path']}")
-                    new_photos.append(photo['path'])
+        
+        if download_queue is not None:
+            download_queue.retain(p['path'] for p in drive_photos)
+        
+        # New photos were collected in arrival order, put them in listing order
+        if new_photos:
+            new_set = set(new_photos)
+            new_photos = [p['path'] for p in drive_photos if p['path'] in new_set]
         
         # Clean up deleted photos
         cleanup_deleted_photos(local_photos_map, drive_photos, local_folder)
@@ -441,7 +741,7 @@ def sync_drive_images(service, folder_id, local_folder, settings=None):
         # Return paths for all photos, with new ones first
         all_paths = [p['path'] for p in drive_photos]
         if new_photos:
-            all_paths = [p for p in all_paths if p not in new_photos]
+            all_paths = [p for p in all_paths if p not in new_set]
             all_paths = new_photos + all_paths
         
         return new_photos, all_paths
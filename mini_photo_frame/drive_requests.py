@@ -0,0 +1,177 @@
+# drive_requests.py
+import json
+import logging
+import random
+import socket
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+logger = logging.getLogger(__name__)
+
+# Default request budget for one frame. Several frames sharing a service
+# account share its quota, so keep this well below the per-user limit.
+DEFAULT_REQUESTS_PER_SECOND = 5
+DEFAULT_BURST = 10
+
+# Retry settings for rate limit and server errors
+MAX_RETRIES = 6
+BASE_RETRY_DELAY = 1     # seconds
+MAX_RETRY_DELAY = 64     # seconds
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {'userRateLimitExceeded', 'rateLimitExceeded'}
+TRANSIENT_ERRORS = (ConnectionResetError, BrokenPipeError, socket.timeout)
+
+class TokenBucket:
+    """Thread safe token bucket, refilled at rate tokens per second. A rate of 0 or less means no limit."""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until one is available. Returns seconds waited."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+def get_error_reason(error):
+    """Get the Drive error reason (e.g. 'userRateLimitExceeded') from an HttpError"""
+    try:
+        content = json.loads(error.content.decode('utf-8'))
+        errors = content.get('error', {}).get('errors', [])
+        if errors:
+            return errors[0].get('reason')
+    except (ValueError, AttributeError):
+        pass
+    return None
+
+def get_retry_after(error):
+    """Get the Retry-After delay in seconds from an HttpError, if the server sent one"""
+    try:
+        value = error.resp.get('retry-after')
+        return float(value) if value is not None else None
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+def is_retryable(error):
+    """Check if a failed Drive call should be retried"""
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    if not isinstance(error, HttpError):
+        return False
+    status = error.resp.status
+    if status in RETRYABLE_STATUSES:
+        return True
+    return status == 403 and get_error_reason(error) in RATE_LIMIT_REASONS
+
+class DriveRequestExecutor:
+    """Runs every Drive API call through one rate limiter and retry policy.
+
+    Calls wait on a token bucket before going out. Rate limit responses (403
+    userRateLimitExceeded, 429) and server errors are retried with jittered
+    exponential backoff, honoring Retry-After when Drive sends it. Usage is
+    counted per minute and logged so quota pressure shows up in the logs.
+    """
+
+    def __init__(self, requests_per_second=DEFAULT_REQUESTS_PER_SECOND, burst=DEFAULT_BURST,
+                 max_retries=MAX_RETRIES):
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._minute = int(time.time() // 60)
+        self._current = self._empty_stats()
+        self.last_minute = self._empty_stats()
+        self.totals = self._empty_stats()
+
+    def configure(self, requests_per_second, burst=None):
+        """Change the request rate, e.g. from config.txt. 0 turns the limit off."""
+        self.bucket = TokenBucket(requests_per_second, burst or max(1, requests_per_second * 2))
+        if requests_per_second <= 0:
+            logger.info("Drive request rate limit: none")
+        else:
+            logger.info(f"Drive request rate limit: {requests_per_second}/s")
+
+    def execute(self, request):
+        """Execute a googleapiclient request, e.g. service.files().list(...)"""
+        return self.call(request.execute)
+
+    def call(self, func, *args, **kwargs):
+        """Call func (a Drive call) with rate limiting and retries"""
+        attempt = 0
+        while True:
+            waited = self.bucket.acquire()
+            self._record('requests', throttled_seconds=waited)
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    self._record('failures')
+                    raise
+                delay = get_retry_after(e) if isinstance(e, HttpError) else None
+                if delay is None:
+                    # Full jitter keeps several frames from retrying in lockstep
+                    delay = random.uniform(0, min(MAX_RETRY_DELAY, BASE_RETRY_DELAY * 2 ** attempt))
+                if isinstance(e, HttpError) and (e.resp.status == 429 or e.resp.status == 403):
+                    self._record('rate_limited')
+                self._record('retries')
+                attempt += 1
+                logger.warning(f"Drive request failed ({str(e)}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def get_metrics(self):
+        """Return request counts for the last full minute and since startup"""
+        with self._lock:
+            self._roll_minute()
+            return {
+                'last_minute': dict(self.last_minute),
+                'current_minute': dict(self._current),
+                'totals': dict(self.totals),
+            }
+
+    @staticmethod
+    def _empty_stats():
+        return {'requests': 0, 'retries': 0, 'rate_limited': 0, 'failures': 0, 'throttled_seconds': 0.0}
+
+    def _roll_minute(self):
+        minute = int(time.time() // 60)
+        if minute != self._minute:
+            self.last_minute = self._current
+            self._current = self._empty_stats()
+            self._minute = minute
+            stats = self.last_minute
+            if stats['requests']:
+                logger.info(
+                    f"Drive API usage last minute: {stats['requests']} requests, "
+                    f"{stats['retries']} retries, {stats['rate_limited']} rate limited, "
+                    f"{stats['failures']} failed, {stats['throttled_seconds']:.1f}s throttled")
+
+    def _record(self, key, throttled_seconds=0.0):
+        with self._lock:
+            self._roll_minute()
+            for stats in (self._current, self.totals):
+                stats[key] += 1
+                stats['throttled_seconds'] += throttled_seconds
+
+# Shared by every Drive call in the process
+executor = DriveRequestExecutor()
+
+def execute(request):
+    """Execute a Drive request through the shared executor"""
+    return executor.execute(request)
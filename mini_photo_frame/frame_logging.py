@@ -0,0 +1,156 @@
+# frame_logging.py
+# Logging for the frame. Code that logs (or prints) only puts the record on a
+# bounded in-memory queue; one listener thread formats it and writes it to the
+# console and, if LOG_FILE is set, to a size-capped rotating file. Printed
+# lines still go to stdout as they are, whatever LOG_LEVEL is. When the
+# queue is full records are dropped rather than waiting. Repeated messages
+# from the same line of code are rate limited, so a retry loop or a big
+# listing can't flood the journal or wear out the SD card.
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+DEFAULT_MAX_BYTES = 1024 * 1024  # Size of the log file before it is rotated
+DEFAULT_BACKUPS = 2              # Rotated log files kept
+DEFAULT_RATE_LIMIT = 10          # Messages per minute from one line of code, 0 for no limit
+RATE_LIMIT_WINDOW = 60           # Seconds
+QUEUE_SIZE = 10000               # Records waiting to be written before new ones are dropped
+CONSOLE_LOGGER = 'console'       # Logger that captured print() output goes through
+
+_listener = None
+
+class RateLimitFilter(logging.Filter):
+    """Lets at most limit records a minute through from each line of code.
+
+    Errors always get through. The first record let through after some were
+    held back says how many.
+    """
+
+    def __init__(self, limit=DEFAULT_RATE_LIMIT, window=RATE_LIMIT_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._counts = {}  # (file, line) -> [window start, records let through, records suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            count = self._counts.get((record.pathname, record.lineno))
+            if count is None or now - count[0] >= self.window:
+                suppressed = count[2] if count else 0
+                self._counts[(record.pathname, record.lineno)] = [now, 1, 0]
+            elif count[1] < self.limit:
+                count[1] += 1
+                return True
+            else:
+                count[2] += 1
+                return False
+        if suppressed:
+            record.msg = f"{record.getMessage()} ({suppressed} similar messages suppressed)"
+            record.args = None
+        return True
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """A QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class PrintToLog:
+    """Stands in for sys.stdout, so print() goes through the log queue as well.
+
+    Lines are logged at INFO on a logger of their own that ignores LOG_LEVEL,
+    so instructions such as setup steps are never hidden.
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+        self._partial = ''
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:
+            lines = (self._partial + text).split('\n')
+            self._partial = lines.pop()
+        for line in lines:
+            if line.strip():
+                # Attributed to the print() call, so each one is rate limited on its own
+                self.logger.info(line, stacklevel=2)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+def configure(level='INFO', log_file=None, max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS,
+              rate_limit=DEFAULT_RATE_LIMIT, capture_prints=True):
+    """Send all logging (and print() if capture_prints) through the queue to the console and log_file"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+    else:
+        atexit.register(shutdown)
+
+    formatter = logging.Formatter(LOG_FORMAT, DATE_FORMAT)
+    # Written to the real stderr and stdout, which capture_prints leaves alone
+    stderr_handler = logging.StreamHandler(sys.__stderr__)
+    stderr_handler.addFilter(lambda record: record.name != CONSOLE_LOGGER)
+    handlers = [stderr_handler]
+    if log_file:
+        directory = os.path.dirname(log_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backups, encoding='utf-8', delay=True))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    # Printed lines appear on stdout just as printed, and in the log file with the rest
+    stdout_handler = logging.StreamHandler(sys.__stdout__)
+    stdout_handler.addFilter(logging.Filter(CONSOLE_LOGGER))
+    handlers.append(stdout_handler)
+
+    log_queue = queue.Queue(QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    if rate_limit:
+        queue_handler.addFilter(RateLimitFilter(rate_limit))
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers)
+    _listener.start()
+
+    if capture_prints and not isinstance(sys.stdout, PrintToLog):
+        console = logging.getLogger(CONSOLE_LOGGER)
+        console.setLevel(logging.INFO)  # Not the root's LOG_LEVEL
+        sys.stdout = PrintToLog(console)
+    return queue_handler
+
+def shutdown():
+    """Write out what is still queued. Registered to run at exit."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,534 @@
+# hub.py
+import email.utils
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import random
+import shutil
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import storage
+from drive_manager import get_local_photos, cleanup_deleted_photos
+from ingest import is_native, get_display_source
+from playlists import DateIndex
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HUB_PORT = 8765
+
+# Settings a hub shares with its clients. Display mode and rotation are per frame.
+# Clients select the hub's date playlist themselves, from the capture dates in the manifest.
+SHARED_SETTINGS = ('display_interval', 'sync_interval', 'shuffle', 'search', 'filter', 'quiet_hours', 'playlist')
+
+# Client side bookkeeping, kept in the images folder (dotfiles are not photos)
+HUB_STATE_FILE = '.hub_state.json'
+PARTIAL_SUFFIX = '.part'
+
+CHUNK_SIZE = 64 * 1024
+REQUEST_TIMEOUT = 30
+STATE_SAVE_EVERY = 20      # Downloads between writes of the client's hub state
+STATE_SAVE_INTERVAL = 60   # Most seconds a finished download goes unsaved (see storage for sd_card mode)
+
+def file_etag(file_path):
+    """Cheap strong-enough ETag for a local file, from its size and mtime"""
+    stat = os.stat(file_path)
+    return '"%x-%x"' % (stat.st_size, int(stat.st_mtime_ns // 1000))
+
+class HubServer:
+    """Serves the synced photo manifest and images to other frames on the LAN.
+
+    GET /manifest returns the current photo order and shared settings as JSON.
+    GET /images/<path> returns a photo, with ETag/If-None-Match and single
+    byte Range support so clients only fetch what changed and can resume.
+    """
+
+    def __init__(self, local_folder, port=DEFAULT_HUB_PORT, host='0.0.0.0'):
+        self.local_folder = os.path.realpath(local_folder)
+        self.port = port
+        self.host = host
+        self._lock = threading.Lock()
+        self._paths = []
+        self._settings = {}
+        self._dates = {}
+        self._server = None
+
+    def update(self, all_paths, settings, dates=None):
+        """Publish the latest sync result to clients.
+
+        dates maps photo paths to yyyymmdd capture dates, for date playlists on clients.
+        """
+        with self._lock:
+            self._paths = list(all_paths)
+            self._settings = {k: settings[k] for k in SHARED_SETTINGS if k in settings}
+            self._dates = dict(dates or {})
+
+    def resolve_image(self, rel_path):
+        """Map a manifest path to the file served for it, or None if unsafe or missing"""
+        rel_path = posixpath.normpath('/' + rel_path).lstrip('/')
+        file_path = os.path.realpath(os.path.join(self.local_folder, rel_path))
+        if not file_path.startswith(self.local_folder + os.sep) or not os.path.isfile(file_path):
+            return None
+        # Clients get the display-size rendition where ingest made one (OpenCV reads
+        # the JPEG whatever the name), so they download and decode no more than they show
+        source_path, _ = get_display_source(file_path)
+        if source_path == file_path and not is_native(file_path):
+            return None  # HEIC or WebP not transcoded yet, offered once it is
+        return source_path
+
+    def build_manifest(self):
+        """Build the manifest from photos that are actually on disk"""
+        with self._lock:
+            paths = list(self._paths)
+            settings = dict(self._settings)
+            dates = self._dates
+        photos = []
+        for path in paths:
+            rel_path = path.replace('\\', '/')
+            file_path = self.resolve_image(rel_path)
+            if file_path:
+                photo = {
+                    'path': rel_path,
+                    'etag': file_etag(file_path),
+                    'size': os.path.getsize(file_path),
+                }
+                if path in dates:
+                    photo['taken'] = dates[path]
+                photos.append(photo)
+        body = json.dumps({'photos': photos, 'settings': settings}, sort_keys=True).encode('utf-8')
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        return body, etag
+
+    def start(self):
+        """Start serving in a background thread"""
+        hub = self
+
+        class Handler(HubRequestHandler):
+            server_hub = hub
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]  # The port picked by the OS if port was 0
+        thread = threading.Thread(target=self._server.serve_forever, name="hub-server", daemon=True)
+        thread.start()
+        logger.info(f"Hub serving {self.local_folder} on port {self.port}")
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+class HubRequestHandler(BaseHTTPRequestHandler):
+    server_hub = None
+    protocol_version = 'HTTP/1.1'  # Keep-alive between a client and the hub
+
+    def do_HEAD(self):
+        self.handle_get(send_body=False)
+
+    def do_GET(self):
+        self.handle_get(send_body=True)
+
+    def handle_get(self, send_body):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == '/manifest':
+            body, etag = self.server_hub.build_manifest()
+            if self.headers.get('If-None-Match') == etag:
+                self.send_empty(304, etag)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', etag)
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+        elif url.path.startswith('/images/'):
+            rel_path = urllib.parse.unquote(url.path[len('/images/'):])
+            file_path = self.server_hub.resolve_image(rel_path)
+            if not file_path:
+                self.send_empty(404)
+                return
+            self.send_file(file_path, send_body)
+        else:
+            self.send_empty(404)
+
+    def send_file(self, file_path, send_body):
+        etag = file_etag(file_path)
+        if self.headers.get('If-None-Match') == etag:
+            self.send_empty(304, etag)
+            return
+
+        size = os.path.getsize(file_path)
+        start, end = 0, size - 1
+        status = 200
+        range_header = self.headers.get('Range')
+        # A Range for an older version of the file (If-Range mismatch) gets the whole file
+        if range_header and self.headers.get('If-Range', etag) == etag:
+            byte_range = parse_range(range_header, size)
+            if byte_range is None:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            start, end = byte_range
+            status = 206
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', email.utils.formatdate(os.path.getmtime(file_path), usegmt=True))
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+        if not send_body:
+            return
+        with open(file_path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def send_empty(self, status, etag=None):
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logger.debug(f"Hub request from {self.address_string()}: {format % args}")
+
+def parse_range(header, size):
+    """Parse a single 'bytes=start-end' range. Returns (start, end) or None if unsatisfiable."""
+    if not header.startswith('bytes=') or ',' in header:
+        return None
+    start_text, _, end_text = header[len('bytes='):].strip().partition('-')
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(0, size - int(end_text))
+            end = size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        return None
+    return start, end
+
+def check_hub_connection(hub_url):
+    """Check if the hub is reachable"""
+    try:
+        request = urllib.request.Request(hub_url.rstrip('/') + '/manifest', method='HEAD')
+        with urllib.request.urlopen(request, timeout=3):
+            return True
+    except (urllib.error.URLError, OSError):
+        return False
+
+def load_hub_state(local_folder):
+    try:
+        with open(os.path.join(local_folder, HUB_STATE_FILE), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'manifest_etag': None, 'manifest': None, 'etags': {}, 'partials': {}}
+
+_saved_states = {}  # images folder -> state as last written
+
+def save_hub_state(local_folder, state):
+    """Write the state file, unless it is unchanged since the last write"""
+    text = json.dumps(state)
+    if _saved_states.get(local_folder) == text:
+        return
+    state_path = os.path.join(local_folder, HUB_STATE_FILE)
+    with open(state_path + '.tmp', 'w') as f:
+        f.write(text)
+    os.replace(state_path + '.tmp', state_path)
+    _saved_states[local_folder] = text
+    storage.meter.record('hub state', len(text))
+
+def fetch_manifest(hub_url, state):
+    """Get the hub manifest, reusing the cached copy if it hasn't changed"""
+    request = urllib.request.Request(hub_url.rstrip('/') + '/manifest')
+    if state.get('manifest_etag') and state.get('manifest'):
+        request.add_header('If-None-Match', state['manifest_etag'])
+    try:
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            manifest = json.loads(response.read().decode('utf-8'))
+            state['manifest_etag'] = response.headers.get('ETag')
+            state['manifest'] = manifest
+            return manifest
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            logger.debug("Hub manifest unchanged")
+            return state['manifest']
+        raise
+
+class HubState:
+    """A client frame's record of what it has from the hub, shared by its threads.
+
+    Holds the cached manifest and the ETag of each photo on disk and of each
+    partial download. Downloads are recorded as they finish and written out
+    every few photos (on the flush timer in sd_card mode), so an interrupted
+    first sync of a large library carries on where it stopped.
+    """
+
+    def __init__(self, local_folder):
+        self.local_folder = local_folder
+        self._lock = threading.Lock()
+        self._state = load_hub_state(local_folder)
+        self._state.setdefault('etags', {})
+        self._state.setdefault('partials', {})
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+        self._save_timer = None
+        self._date_index = None  # (manifest ETag, DateIndex)
+
+    def fetch_manifest(self, hub_url):
+        with self._lock:
+            cached = {'manifest_etag': self._state.get('manifest_etag'), 'manifest': self._state.get('manifest')}
+        manifest = fetch_manifest(hub_url, cached)
+        with self._lock:
+            self._state.update(cached)
+        return manifest
+
+    def date_index(self):
+        """DateIndex of the capture dates in the cached manifest, rebuilt when the manifest changes"""
+        with self._lock:
+            manifest_etag = self._state.get('manifest_etag')
+            if self._date_index is None or self._date_index[0] != manifest_etag:
+                photos = (self._state.get('manifest') or {}).get('photos', [])
+                dates = {photo['path']: photo['taken'] for photo in photos if photo.get('taken')}
+                self._date_index = (manifest_etag, DateIndex(dates))
+            return self._date_index[1]
+
+    def is_current(self, path, etag):
+        """Check if the photo on disk at path is the version with this ETag"""
+        with self._lock:
+            return self._state['etags'].get(path) == etag
+
+    def partial_etag(self, path):
+        with self._lock:
+            return self._state['partials'].get(path)
+
+    def record(self, path, etag=None, partial_etag=None):
+        """Record a finished download's ETag, or the ETag of the bytes in an unfinished one"""
+        with self._lock:
+            if etag:
+                self._state['etags'][path] = etag
+                self._state['partials'].pop(path, None)
+            elif partial_etag:
+                self._state['partials'][path] = partial_etag
+            else:
+                self._state['partials'].pop(path, None)
+            self._unsaved += 1
+            due = (self._unsaved >= STATE_SAVE_EVERY or partial_etag
+                   or time.monotonic() - self._last_save >= STATE_SAVE_INTERVAL)
+        if due:
+            self._save_soon()
+
+    def retain(self, paths):
+        """Forget photos that are no longer on the hub"""
+        keep = set(paths)
+        with self._lock:
+            for key in ('etags', 'partials'):
+                self._state[key] = {path: etag for path, etag in self._state[key].items() if path in keep}
+
+    def _save_soon(self):
+        """Save now, or in sd_card mode once the flush timer runs, together with later downloads"""
+        if not storage.is_sd_card():
+            self.save()
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(storage.flush_interval(STATE_SAVE_INTERVAL), self._timed_save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _timed_save(self):
+        with self._lock:
+            self._save_timer = None
+        self.save()
+
+    def save(self):
+        with self._lock:
+            self._unsaved = 0
+            self._last_save = time.monotonic()
+            try:
+                save_hub_state(self.local_folder, self._state)
+            except OSError as e:
+                logger.warning(f"Could not save hub sync state: {str(e)}")
+
+_hub_states = {}  # images folder -> HubState
+_hub_states_lock = threading.Lock()
+
+def get_hub_state(local_folder):
+    """The HubState of an images folder, loaded on first use"""
+    with _hub_states_lock:
+        if local_folder not in _hub_states:
+            _hub_states[local_folder] = HubState(local_folder)
+        return _hub_states[local_folder]
+
+def get_settings_from_hub(hub_url, local_folder, default_settings):
+    """Return a copy of default_settings with the settings shared by the hub applied"""
+    state = get_hub_state(local_folder)
+    manifest = state.fetch_manifest(hub_url)
+    state.save()
+    shared = manifest.get('settings', {})
+    settings = default_settings.copy()
+    settings.update(shared)
+    if 'search' not in shared:
+        settings.pop('search', None)
+    return settings
+
+def download_from_hub(hub_url, photo, local_folder, partials=None):
+    """Download one photo from the hub, resuming a partial download if there is one.
+
+    partials maps photo paths to the ETag of the bytes in their partial
+    download, so a resume only appends to bytes of the same version.
+    """
+    if partials is None:
+        partials = {}
+    file_path = os.path.join(local_folder, photo['path'])
+    directory, name = os.path.split(file_path)
+    os.makedirs(directory or local_folder, exist_ok=True)
+    # Dot-prefixed so an interrupted download is never picked up as a photo
+    partial_path = os.path.join(directory, '.' + name + PARTIAL_SUFFIX)
+
+    url = hub_url.rstrip('/') + '/images/' + urllib.parse.quote(photo['path'])
+    request = urllib.request.Request(url)
+
+    # In sd_card mode the download goes to tmpfs, so the card sees one write of the finished file
+    temp = storage.reserve(photo.get('size'))
+    if temp:
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                with open(temp.path, 'wb') as f:
+                    shutil.copyfileobj(response, f, CHUNK_SIZE)
+                etag = response.headers.get('ETag')
+            temp.move_to(file_path)
+            return etag
+        finally:
+            temp.release()
+    offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+    partial_etag = partials.get(photo['path'])
+    if offset and partial_etag:
+        request.add_header('Range', f'bytes={offset}-')
+        # The hub sends the whole file instead if it changed since the partial was fetched
+        request.add_header('If-Range', partial_etag)
+
+    try:
+        response = urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT)
+    except urllib.error.HTTPError as e:
+        if e.code != 416:
+            raise
+        # The partial is no shorter than the file on the hub, so it can't be the same version
+        logger.debug(f"Partial download of {photo['path']} is stale, starting over")
+        os.remove(partial_path)
+        partials.pop(photo['path'], None)
+        return download_from_hub(hub_url, photo, local_folder, partials)
+    with response:
+        etag = response.headers.get('ETag')
+        mode = 'ab' if response.status == 206 else 'wb'
+        partials[photo['path']] = etag
+        with open(partial_path, mode) as f:
+            shutil.copyfileobj(response, f, CHUNK_SIZE)
+    os.replace(partial_path, file_path)
+    partials.pop(photo['path'], None)
+    storage.meter.record('photos', os.path.getsize(file_path))
+    return etag
+
+class HubDownloader:
+    """Downloads one photo from the hub: the fetch function of a client frame's DownloadQueue"""
+
+    def __init__(self, hub_url, local_folder):
+        self.hub_url = hub_url
+        self.local_folder = local_folder
+        self.state = get_hub_state(local_folder)
+
+    def __call__(self, photo, local_path):
+        path = photo['path']
+        partial_etag = self.state.partial_etag(path)
+        partials = {path: partial_etag} if partial_etag else {}
+        try:
+            etag = download_from_hub(self.hub_url, photo, self.local_folder, partials)
+        except (urllib.error.URLError, OSError):
+            # Keep the ETag of the bytes fetched so far, so the next try resumes them
+            self.state.record(path, partial_etag=partials.get(path))
+            raise
+        self.state.record(path, etag or photo['etag'])
+        return True
+
+def sync_from_hub(hub_url, local_folder, settings=None, download_queue=None):
+    """Sync images from a hub instead of Drive. Same return value as sync_drive_images.
+
+    If a download_queue is given (with a HubDownloader to fetch with), missing
+    photos are handed to it instead of being downloaded inline, and the
+    returned new photos are the ones that were newly queued.
+    """
+    local_photos, local_photos_map = get_local_photos(local_folder)
+    state = get_hub_state(local_folder)
+
+    def local_fallback():
+        photos = local_photos.copy()
+        if settings and settings.get('shuffle'):
+            random.shuffle(photos)
+        return [], photos
+
+    try:
+        manifest = state.fetch_manifest(hub_url)
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        logger.warning(f"Unable to reach hub at {hub_url} ({str(e)}). Using local photos.")
+        return local_fallback()
+
+    hub_photos = manifest.get('photos', [])
+    if not hub_photos:
+        logger.warning("Hub has no photos yet. Using local photos.")
+        return local_fallback()
+
+    new_photos = []
+    downloader = HubDownloader(hub_url, local_folder) if download_queue is None else None
+    for photo in hub_photos:
+        path = photo['path']
+        if path in local_photos_map and state.is_current(path, photo['etag']):
+            continue
+        if download_queue is not None:
+            if download_queue.add(photo) and path not in local_photos_map:
+                logger.debug(f"Queued new photo for download from hub: {path}")
+                new_photos.append(path)
+            continue
+        try:
+            downloader(photo, os.path.join(local_folder, path))
+            logger.info(f"Downloaded photo from hub: {path}")
+            if path not in local_photos_map:
+                new_photos.append(path)
+        except (urllib.error.URLError, OSError) as e:
+            logger.error(f"Error downloading {path} from hub: {str(e)}")
+
+    hub_paths = [photo['path'] for photo in hub_photos]
+    if download_queue is not None:
+        download_queue.retain(hub_paths)
+    cleanup_deleted_photos(local_photos_map, hub_photos, local_folder)
+    state.retain(hub_paths)
+    state.save()
+
+    # Keep the hub's order, with new photos first like a Drive sync
+    new_set = set(new_photos)
+    all_paths = new_photos + [path for path in hub_paths if path not in new_set]
+    return new_photos, all_paths
@@ -0,0 +1,601 @@
+# ingest.py
+# Post-download ingest: every downloaded photo is checked against Drive's md5,
+# decoded once to prove it is intact, turned upright from its EXIF orientation,
+# has its IPTC caption, capture date and the region to keep when cropping read,
+# and gets a display-size rendition. The work
+# runs in a process pool so it uses every core, and the results are recorded in
+# a photo index the display path reads instead of redoing the work each time.
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+import storage
+from playlists import DateIndex, capture_date
+from smart_crop import find_focus
+
+try:
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+except ImportError:  # HEIC photos are left out of the Drive listing instead
+    register_heif_opener = None
+
+# Whether HEIC photos can be transcoded, so whether they are synced at all
+HEIC_SUPPORTED = register_heif_opener is not None
+
+logger = logging.getLogger(__name__)
+
+# Both live in the images folder; dotfiles and dot folders are not photos
+PHOTO_INDEX_FILE = '.photo_index.json'
+CACHE_DIR = '.frame_cache'
+MOTION_CACHE_DIR = 'ken_burns'  # Renditions for ken_burns mode, inside CACHE_DIR
+
+DEFAULT_RENDITION_SIZE = 1920   # Longest edge of display renditions, in pixels
+RENDITION_QUALITY = 90
+FLUSH_INTERVAL = 5              # Most seconds between index writes while ingesting (see storage for sd_card mode)
+MAX_FAILURES = 3                # Corrupt downloads are deleted and fetched again this many times
+
+EXIF_ORIENTATION = 0x0112
+EXIF_IFD = 0x8769
+EXIF_DATE_TIME_ORIGINAL = 0x9003
+
+# dHash bits two photos may differ in and still count as the same picture
+NEAR_DUPLICATE_DISTANCE = 4
+
+# Formats the display decodes directly. Everything else (PNG, WebP, HEIC) always
+# gets a JPEG rendition, so the display never decodes the original.
+NATIVE_EXTENSIONS = ('.jpg', '.jpeg')
+
+def is_native(file_path):
+    return os.path.splitext(file_path)[1].lower() in NATIVE_EXTENSIONS
+
+def flatten(img):
+    """Convert to RGB, putting any transparency on black like the display background"""
+    if img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info:
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (0, 0, 0))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    return img.convert('RGB') if img.mode != 'RGB' else img
+
+def dhash(img):
+    """64 bit difference hash: which neighbouring pixels get brighter in a 9x8 thumbnail.
+
+    Survives resizing and re-encoding, so copies of a photo exported at
+    different sizes or qualities get the same or a very close hash.
+    """
+    pixels = list(img.convert('L').resize((9, 8), Image.BILINEAR, reducing_gap=2.0).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] < pixels[row * 9 + col + 1])
+    return f'{value:016x}'
+
+def find_near_duplicates(records, max_distance=NEAR_DUPLICATE_DISTANCE):
+    """Map each near-duplicate photo to the copy that should be kept instead.
+
+    records maps paths to index records, in playlist order. Of each group of
+    similar photos the largest is kept. Hashes are split into max_distance + 1
+    bands: two hashes within max_distance bits must agree exactly on at least
+    one band, so only photos sharing a band are compared.
+    """
+    bands = max_distance + 1
+    band_bits = -(-64 // bands)
+    hashes = {path: int(record['dhash'], 16) for path, record in records.items() if record.get('dhash')}
+    buckets = {}
+    for path, value in hashes.items():
+        for band in range(bands):
+            key = (band, (value >> (band * band_bits)) & ((1 << band_bits) - 1))
+            buckets.setdefault(key, []).append(path)
+
+    # Union the similar pairs into groups
+    parent = {path: path for path in hashes}
+    def find(path):
+        while parent[path] != path:
+            parent[path] = parent[parent[path]]
+            path = parent[path]
+        return path
+    for paths in buckets.values():
+        for i, first in enumerate(paths):
+            for second in paths[i + 1:]:
+                if bin(hashes[first] ^ hashes[second]).count('1') <= max_distance:
+                    parent[find(first)] = find(second)
+
+    groups = {}
+    for path in hashes:
+        groups.setdefault(find(path), []).append(path)
+    duplicates = {}
+    for members in groups.values():
+        if len(members) > 1:
+            keep = max(members, key=lambda p: records[p].get('width', 0) * records[p].get('height', 0))
+            for path in members:
+                if path != keep:
+                    duplicates[path] = keep
+    return duplicates
+
+def file_md5(file_path):
+    md5 = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+def ingest_photo(file_path, rendition_path, expected_md5=None, rendition_size=DEFAULT_RENDITION_SIZE,
+                 motion_path=None, motion_size=None):
+    """Verify, orient, read metadata and render one photo. Runs in a worker process.
+
+    With motion_size (width, height) the upright photo is also saved to
+    motion_path scaled to just cover that size, for ken_burns mode.
+
+    Returns the photo's index record. A record with 'error' set could not be
+    shown; 'corrupt' says whether fetching it again could help, and
+    'permanent' marks photos that are intact but can never be decoded here
+    (too large, or a format no installed decoder reads).
+    """
+    # Imported here so worker processes only load OpenCV when they ingest
+    from display_manager import read_iptc
+
+    stat = os.stat(file_path)
+    record = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+    record['md5'] = file_md5(file_path)
+    if expected_md5 and record['md5'] != expected_md5:
+        record.update(error=f"md5 mismatch: Drive has {expected_md5}, file has {record['md5']}", corrupt=True)
+        return record
+
+    try:
+        with Image.open(file_path) as img:
+            exif = img.getexif()
+            orientation = exif.get(EXIF_ORIENTATION, 1)
+            exif_date = exif.get_ifd(EXIF_IFD).get(EXIF_DATE_TIME_ORIGINAL)
+            width, height = img.size
+            if orientation in (5, 6, 7, 8):
+                width, height = height, width
+            needs_rendition = not is_native(file_path) or max(width, height) > rendition_size or orientation != 1
+            # Photos smaller than the ken_burns source are kept at their own size, not enlarged
+            motion_scale = min(1.0, max(motion_size[0] / width, motion_size[1] / height)) if motion_size else None
+            if needs_rendition or motion_size:
+                # Let the JPEG decoder scale down while decoding, much faster than a full decode
+                # (other formats ignore this)
+                scale = min(1.0, max(rendition_size / max(width, height), motion_scale or 0))
+                img.draft('RGB', (int(img.size[0] * scale), int(img.size[1] * scale)))
+            # Decoding every scan proves the file is complete
+            img.load()
+            upright = flatten(ImageOps.exif_transpose(img))
+            record['dhash'] = dhash(upright)
+            # Fraction of the upright photo to keep in view when cropping it to fill the screen
+            record['focus'] = find_focus(upright)
+            if motion_size:
+                motion = upright.resize((max(1, round(width * motion_scale)), max(1, round(height * motion_scale))),
+                                        Image.LANCZOS)
+                save_rendition(motion, motion_path)
+                record['motion_size'] = list(motion_size)
+            if needs_rendition:
+                img = upright
+                img.thumbnail((rendition_size, rendition_size), Image.LANCZOS)
+                save_rendition(img, rendition_path)
+    except (Image.DecompressionBombError, UnidentifiedImageError) as e:
+        record.update(error=f"cannot decode: {str(e)}", permanent=True)
+        return record
+    except (OSError, SyntaxError, ValueError) as e:
+        # Bytes that match Drive's md5 are what Drive has, so downloading them again can't help
+        record.update(error=f"cannot decode: {str(e)}", corrupt=not expected_md5)
+        return record
+
+    record.update(width=width, height=height, orientation=orientation, rendition=needs_rendition)
+    try:
+        record['caption'], record['date'] = read_iptc(file_path)
+    except Exception as e:
+        logger.debug(f"No IPTC info in {file_path}: {str(e)}")
+        record['caption'], record['date'] = None, None
+    # When the photo was taken, for date playlists. Drive's upload date is the fallback.
+    record['taken'] = capture_date(record['date']) or capture_date(exif_date)
+    return record
+
+def save_rendition(img, rendition_path):
+    os.makedirs(os.path.dirname(rendition_path), exist_ok=True)
+    temp_path = rendition_path + '.tmp'
+    img.save(temp_path, 'JPEG', quality=RENDITION_QUALITY)
+    os.replace(temp_path, rendition_path)
+
+def rendition_path_for(local_folder, rel_path):
+    # photo.heic and photo.jpg side by side must not share a rendition
+    name = rel_path if is_native(rel_path) else rel_path + '.jpg'
+    return os.path.join(local_folder, CACHE_DIR, name)
+
+def motion_path_for(local_folder, rel_path):
+    name = rel_path if is_native(rel_path) else rel_path + '.jpg'
+    return os.path.join(local_folder, CACHE_DIR, MOTION_CACHE_DIR, name)
+
+def load_index(local_folder):
+    try:
+        with open(os.path.join(local_folder, PHOTO_INDEX_FILE), 'r') as f:
+            return json.load(f).get('photos', {})
+    except (OSError, ValueError):
+        return {}
+
+def save_index(local_folder, photos):
+    index_path = os.path.join(local_folder, PHOTO_INDEX_FILE)
+    with open(index_path + '.tmp', 'w') as f:
+        json.dump({'version': 1, 'photos': photos}, f)
+    os.replace(index_path + '.tmp', index_path)
+    storage.meter.record('photo index', os.path.getsize(index_path))
+
+def is_current(record, file_path):
+    """Check if an index record still describes the file on disk"""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return False
+    return record.get('size') == stat.st_size and record.get('mtime') == stat.st_mtime_ns
+
+class IngestPipeline:
+    """Runs ingest_photo for downloaded photos in a process pool and keeps the photo index"""
+
+    def __init__(self, local_folder, rendition_size=DEFAULT_RENDITION_SIZE, workers=0, dedupe_similar=False,
+                 motion_size=None):
+        self.local_folder = local_folder
+        self.rendition_size = rendition_size
+        self.motion_size = motion_size  # Source size for ken_burns mode, (width, height), None if not used
+        self.dedupe_similar = dedupe_similar  # Hide resized and re-encoded copies from the playlist
+        # Leave a core for the display and the downloads
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self._lock = threading.Lock()
+        self._records = load_index(local_folder)
+        self._created = {}  # Drive createdTime (yyyymmdd) per photo, for photos without a capture date
+        self._date_index = None
+        self._in_flight = set()
+        self._pool = None
+        self._dirty = False
+        self._last_flush = 0
+        self._flush_timer = None
+        self._batch_started = None
+        self._batch_count = 0
+        self.ingested = 0
+        self.failed = 0
+
+    def start(self):
+        # Spawned workers: the parent has threads, which don't mix with fork
+        self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                         mp_context=multiprocessing.get_context('spawn'))
+        # The display in this process reads records from here, whether or not they are written out yet
+        _live_indexes[os.path.abspath(self.local_folder)] = self._records
+        logger.info(f"Ingest pipeline started with {self.workers} worker processes")
+
+    def stop(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        _live_indexes.pop(os.path.abspath(self.local_folder), None)
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+        self.flush()
+
+    def submit(self, rel_path, expected_md5=None):
+        """Ingest a photo that was just written to the images folder"""
+        with self._lock:
+            if rel_path in self._in_flight or self._pool is None:
+                return
+            self._in_flight.add(rel_path)
+            if self._batch_started is None:
+                self._batch_started = time.monotonic()
+                self._batch_count = 0
+        file_path = os.path.join(self.local_folder, rel_path)
+        future = self._pool.submit(ingest_photo, file_path, rendition_path_for(self.local_folder, rel_path),
+                                   expected_md5, self.rendition_size,
+                                   motion_path_for(self.local_folder, rel_path), self.motion_size)
+        future.add_done_callback(lambda f: self._finished(rel_path, f))
+
+    def catch_up(self, all_paths):
+        """Ingest photos on disk that have no current index record and forget deleted ones"""
+        paths = set(all_paths)
+        with self._lock:
+            removed = [p for p in self._records if p not in paths]
+            for rel_path in removed:
+                record = self._records.pop(rel_path)
+                kept = [rendition_path_for(self.local_folder, rel_path)] if record.get('rendition') else []
+                if record.get('motion_size'):
+                    kept.append(motion_path_for(self.local_folder, rel_path))
+                for path in kept:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            if removed:
+                self._dirty = True
+                self._date_index = None
+            missing = [p for p in all_paths
+                       if p not in self._in_flight
+                       and self._needs_ingest(p)
+                       and os.path.exists(os.path.join(self.local_folder, p))]
+        for rel_path in missing:
+            self.submit(rel_path)
+        if missing:
+            logger.info(f"Ingesting {len(missing)} photos that are not in the photo index yet")
+        elif removed:
+            self._flush_soon()
+
+    def _needs_ingest(self, rel_path):
+        record = self._records.get(rel_path, {})
+        if not is_current(record, os.path.join(self.local_folder, rel_path)):
+            return True
+        # Photos ingested before capture dates and crop focus were recorded
+        if not record.get('error') and ('taken' not in record or 'focus' not in record):
+            return True
+        # Photos without a ken_burns rendition for this screen
+        if self.motion_size and not record.get('error') and record.get('motion_size') != list(self.motion_size):
+            return True
+        # Photos ingested before perceptual hashes were recorded
+        return self.dedupe_similar and not record.get('error') and 'dhash' not in record
+
+    def get(self, rel_path):
+        with self._lock:
+            return self._records.get(rel_path)
+
+    def note_created(self, created_times):
+        """Record Drive creation times ({path: createdTime}) from a listing"""
+        with self._lock:
+            for rel_path, created in created_times.items():
+                day = capture_date(created)
+                if day and self._created.get(rel_path) != day:
+                    self._created[rel_path] = day
+                    self._date_index = None
+
+    def capture_dates(self):
+        """Map each ingested photo to its capture date (yyyymmdd), or its upload date if it has none"""
+        with self._lock:
+            return self._capture_dates()
+
+    def _capture_dates(self):
+        dates = {}
+        for rel_path, record in self._records.items():
+            day = record.get('taken') or self._created.get(rel_path)
+            if day and not record.get('error'):
+                dates[rel_path] = day
+        return dates
+
+    def date_index(self):
+        """DateIndex of every ingested photo, rebuilt only after the index changes"""
+        with self._lock:
+            if self._date_index is None:
+                self._date_index = DateIndex(self._capture_dates())
+            return self._date_index
+
+    def unshowable(self, paths):
+        """Photos among paths that are intact but can never be decoded on this frame"""
+        with self._lock:
+            return {p for p in paths if self._records.get(p, {}).get('permanent')}
+
+    def near_duplicates(self, paths):
+        """Map resized or re-encoded copies among paths to the copy to show instead"""
+        with self._lock:
+            records = {p: self._records[p] for p in paths
+                       if p in self._records and not self._records[p].get('error')}
+        return find_near_duplicates(records)
+
+    def _finished(self, rel_path, future):
+        file_path = os.path.join(self.local_folder, rel_path)
+        try:
+            record = future.result()
+        except Exception as e:
+            # Cancelled on shutdown, or the file went away before a worker got to it
+            logger.debug(f"Ingest of {rel_path} did not finish: {str(e)}")
+            with self._lock:
+                self._in_flight.discard(rel_path)
+            return
+
+        with self._lock:
+            self._in_flight.discard(rel_path)
+            if record.get('error'):
+                self.failed += 1
+                record['failures'] = self._records.get(rel_path, {}).get('failures', 0) + 1
+            else:
+                self.ingested += 1
+            self._records[rel_path] = record
+            self._dirty = True
+            self._date_index = None
+            self._batch_count += 1
+            batch_done = not self._in_flight
+            if batch_done and self._batch_started is not None:
+                elapsed = time.monotonic() - self._batch_started
+                logger.info(f"Ingested {self._batch_count} photos in {elapsed:.1f}s "
+                            f"({self._batch_count / max(elapsed, 0.001):.1f}/s with {self.workers} workers)")
+                self._batch_started = None
+
+        if record.get('error'):
+            if record.get('corrupt') and record['failures'] <= MAX_FAILURES:
+                # Removing it makes the next sync download it again
+                logger.error(f"Damaged download {rel_path} ({record['error']}), removing it to fetch again")
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+            elif record.get('permanent'):
+                logger.warning(f"Skipping {rel_path}, it cannot be shown on this frame ({record['error']})")
+            else:
+                logger.error(f"Could not ingest {rel_path}: {record['error']}")
+        else:
+            logger.debug(f"Ingested {rel_path}")
+            if record.get('rendition'):
+                try:
+                    storage.meter.record('renditions', os.path.getsize(rendition_path_for(self.local_folder, rel_path)))
+                except OSError:
+                    pass
+
+        if batch_done or time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self._flush_soon()
+
+    def _flush_soon(self):
+        """Write the index now, or in sd_card mode once the flush timer runs, together with later changes"""
+        if not storage.is_sd_card():
+            self.flush()
+            return
+        with self._lock:
+            if self._flush_timer is not None:
+                return
+            self._flush_timer = threading.Timer(storage.flush_interval(FLUSH_INTERVAL), self._timed_flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _timed_flush(self):
+        with self._lock:
+            self._flush_timer = None
+        self.flush()
+
+    def flush(self):
+        """Write the photo index if it changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            photos = dict(self._records)
+            self._dirty = False
+            self._last_flush = time.monotonic()
+        try:
+            save_index(self.local_folder, photos)
+        except OSError as e:
+            logger.warning(f"Could not save photo index: {str(e)}")
+
+# Display side: read the index written by the pipeline, possibly in another process
+
+_indexes = {}  # images folder -> (index mtime, records)
+_live_indexes = {}  # images folder -> records of an ingest pipeline running in this process
+
+def _find_index(image_path):
+    """Find the images folder an image belongs to and its current index records"""
+    directory = os.path.dirname(os.path.abspath(image_path))
+    while True:
+        if directory in _live_indexes:
+            return directory, _live_indexes[directory]
+        index_path = os.path.join(directory, PHOTO_INDEX_FILE)
+        try:
+            mtime = os.stat(index_path).st_mtime_ns
+        except OSError:
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                return None, None
+            directory = parent
+            continue
+        cached = _indexes.get(directory)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, load_index(directory))
+            _indexes[directory] = cached
+        return directory, cached[1]
+
+def _current_record(image_path):
+    """Return (images folder, relative path, record) if the index has a current record for the photo"""
+    local_folder, records = _find_index(image_path)
+    if not records:
+        return None
+    rel_path = os.path.relpath(os.path.abspath(image_path), local_folder).replace('\\', '/')
+    record = records.get(rel_path)
+    if not record or record.get('error') or not is_current(record, image_path):
+        return None
+    return local_folder, rel_path, record
+
+def is_ingested(image_path):
+    """Check if the index has a current record for the photo"""
+    return _current_record(image_path) is not None
+
+def get_focus(image_path):
+    """Region of the upright photo to keep when cropping, (x0, y0, x1, y1) fractions, None if not ingested"""
+    found = _current_record(image_path)
+    return found[2].get('focus') if found else None
+
+def get_motion_source(image_path):
+    """Path to decode for ken_burns mode.
+
+    The ingested rendition that just covers the zoomed-in screen if there is
+    one, else the photo itself, so the most zoomed-in view stays sharp.
+    """
+    found = _current_record(image_path)
+    if found and found[2].get('motion_size'):
+        motion_path = motion_path_for(found[0], found[1])
+        if os.path.exists(motion_path):
+            return motion_path
+    if is_native(image_path):
+        return image_path
+    return get_display_source(image_path)[0]
+
+def get_display_source(image_path):
+    """Return (path to decode, caption) for showing a photo.
+
+    Uses the ingested rendition and caption when the index has a current
+    record for the photo. The caption is None if it still needs reading.
+    """
+    found = _current_record(image_path)
+    if not found:
+        return image_path, None
+    local_folder, rel_path, record = found
+
+    from display_manager import format_caption
+    caption = format_caption(image_path, record.get('caption'), record.get('date'))
+    if record.get('rendition'):
+        rendition_path = rendition_path_for(local_folder, rel_path)
+        if os.path.exists(rendition_path):
+            return rendition_path, caption
+    return image_path, caption
+
+def create_sample(path, size=(4032, 3024)):
+    """Write a synthetic photo for the benchmark, in the format given by path's extension"""
+    import numpy as np
+    height, width = size[1], size[0]
+    # Smooth gradients plus noise compress roughly like a real photo
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    rng = np.random.default_rng(0)
+    pixels = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+    pixels += rng.normal(0, 12, pixels.shape)
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(path, quality=90)
+
+def benchmark(paths, rounds=3, workers=0):
+    """Time ingest_photo per format, on one core and through the process pool"""
+    import tempfile
+    from collections import defaultdict
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    by_format = defaultdict(list)
+    for path in paths:
+        by_format[os.path.splitext(path)[1].lower()].append(path)
+
+    with tempfile.TemporaryDirectory() as cache:
+        print(f"{'format':8} {'files':>5} {'MB':>7} {'ms/photo':>9} {'photos/s':>9} ({workers} workers)")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            # Warm up the workers so process start-up isn't timed
+            list(pool.map(file_md5, paths[:workers]))
+            for ext, files in sorted(by_format.items()):
+                rendition = lambda i: os.path.join(cache, f'{ext[1:]}-{i}.jpg')
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    for i, path in enumerate(files):
+                        record = ingest_photo(path, rendition(i))
+                        if record.get('error'):
+                            print(f"{ext}: {record['error']}")
+                single = (time.perf_counter() - start) / (rounds * len(files))
+
+                jobs = [f for _ in range(rounds) for f in files] * workers
+                start = time.perf_counter()
+                list(pool.map(ingest_photo, jobs, [rendition(i) for i in range(len(jobs))]))
+                throughput = len(jobs) / (time.perf_counter() - start)
+
+                megabytes = sum(os.path.getsize(f) for f in files) / len(files) / 1e6
+                print(f"{ext:8} {len(files):>5} {megabytes:>7.1f} {single * 1000:>9.0f} {throughput:>9.1f}")
+
+if __name__ == "__main__":
+    # python ingest.py [photos...]: benchmark ingest per format, on sample photos if none are given
+    import sys
+    import tempfile
+    if len(sys.argv) > 1:
+        benchmark(sys.argv[1:])
+    else:
+        formats = ['.jpg', '.png', '.webp'] + (['.heic'] if HEIC_SUPPORTED else [])
+        with tempfile.TemporaryDirectory() as samples:
+            paths = [os.path.join(samples, 'sample' + ext) for ext in formats]
+            for path in paths:
+                create_sample(path)
+            benchmark(paths)
@@ -0,0 +1,156 @@
+# ken_burns.py
+# Ken Burns display mode: a slow pan and zoom across the photo. The source is a
+# rendition a little larger than the screen, made once at ingest, and the path
+# across it is precomputed as one affine matrix per frame, so each frame is a
+# single cv2.warpAffine into a reused buffer. Frames come at a low rate, lowered
+# further when rendering would use more than a set share of the CPU.
+import math
+import random
+import time
+import cv2
+import numpy as np
+import memory_budget
+from display_manager import rotate_image
+from ingest import get_motion_source
+
+DEFAULT_FPS = 4
+DEFAULT_CPU_LIMIT = 0.25  # Share of one core rendering may use
+ZOOM = 1.15               # Largest zoom, relative to the photo just covering the screen
+CYCLE = 60                # Seconds to move from one end of the path to the other and back
+
+_config = {'fps': DEFAULT_FPS, 'cpu_limit': DEFAULT_CPU_LIMIT}
+
+def configure(fps=DEFAULT_FPS, cpu_limit=DEFAULT_CPU_LIMIT):
+    _config.update(fps=max(0.1, fps), cpu_limit=min(1.0, max(0.01, cpu_limit)))
+
+def source_size(screen_width, screen_height, rotation=0):
+    """Size the ingest renditions for this mode must cover, in the photo's upright orientation"""
+    if rotation in (90, 270):
+        screen_width, screen_height = screen_height, screen_width
+    return math.ceil(screen_width * ZOOM), math.ceil(screen_height * ZOOM)
+
+class KenBurns:
+    """A photo's precomputed pan-and-zoom path, rendered frame by frame into one buffer"""
+
+    def __init__(self, img, screen_width, screen_height, fps=None, cpu_limit=None, rng=random):
+        self.width, self.height = screen_width, screen_height
+        self.fps = fps or _config['fps']
+        self.cpu_limit = cpu_limit or _config['cpu_limit']
+
+        # Even the most zoomed-in view needs a source pixel per screen pixel. Renditions made
+        # at ingest are that size already, anything else is scaled once here.
+        img_height, img_width = img.shape[:2]
+        scale = ZOOM * max(screen_width / img_width, screen_height / img_height)
+        if 0.99 <= scale <= 1.0 and img_width >= screen_width and img_height >= screen_height:
+            size = (img_width, img_height)
+            self.source = img
+        else:
+            size = (max(screen_width, round(img_width * scale)), max(screen_height, round(img_height * scale)))
+            interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+            self.source = cv2.resize(img, size, interpolation=interpolation)
+
+        self.matrices = self._path(size, rng)
+        self.frame = np.empty((screen_height, screen_width, 3), dtype=np.uint8)
+        self.started = time.monotonic()
+        self._next_frame = 0.0
+
+    def _path(self, size, rng):
+        """One affine matrix per frame for half a cycle, from one view to another"""
+        source_width, source_height = size
+        aspect = self.width / self.height
+        full_width = min(source_width, source_height * aspect)
+
+        def view(zoom):
+            width = full_width / zoom
+            height = width / aspect
+            return (rng.uniform(0, source_width - width), rng.uniform(0, source_height - height), width)
+
+        start, end = view(1.0), view(ZOOM)
+        if rng.random() < 0.5:
+            start, end = end, start  # Zoom out instead of in
+
+        steps = max(2, int(CYCLE / 2 * self.fps))
+        t = np.linspace(0.0, 1.0, steps)
+        t = t * t * (3 - 2 * t)  # Ease in and out at the ends of the path
+        x, y, width = (a + (b - a) * t for a, b in zip(start, end))
+        scale = self.width / width
+        matrices = np.zeros((steps, 2, 3), dtype=np.float32)
+        matrices[:, 0, 0] = scale
+        matrices[:, 1, 1] = scale
+        matrices[:, 0, 2] = -x * scale
+        matrices[:, 1, 2] = -y * scale
+        return matrices
+
+    def render(self, elapsed=None):
+        """Render the frame for elapsed seconds into the photo. Returns the reused frame buffer."""
+        if elapsed is None:
+            elapsed = time.monotonic() - self.started
+        steps = len(self.matrices)
+        # Ping-pong along the path
+        step = int(elapsed * self.fps) % (2 * steps - 2)
+        if step >= steps:
+            step = 2 * steps - 2 - step
+        cv2.warpAffine(self.source, self.matrices[step], (self.width, self.height), dst=self.frame,
+                       flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        return self.frame
+
+    def animate(self, wait_for_key, show):
+        """Wrap a backend's wait_for_key(timeout) so waiting for input also plays the animation.
+
+        show(frame) puts a frame on screen. The frame interval is stretched when
+        rendering and showing take more than cpu_limit of it.
+        """
+        def wait(timeout):
+            until = time.monotonic() + timeout
+            while True:
+                now = time.monotonic()
+                if now >= self._next_frame:
+                    started = time.perf_counter()
+                    show(self.render(now - self.started))
+                    cost = time.perf_counter() - started
+                    self._next_frame = now + max(1.0 / self.fps, cost / self.cpu_limit)
+                remaining = until - time.monotonic()
+                if remaining <= 0:
+                    return None
+                action = wait_for_key(min(remaining, max(0.0, self._next_frame - time.monotonic())))
+                if action:
+                    return action
+        return wait
+
+def make_display_func(display):
+    """Display function for the ken_burns mode, for backends that can present frames"""
+    def show_photo(image_path, display_interval, rotation=0, scheduler=None):
+        width, height = display.get_screen_size()
+        # Enough pixels for the most zoomed-in view
+        img = memory_budget.read_image(get_motion_source(image_path), source_size(width, height, rotation))
+        if img is None:
+            print(f"Error loading image: {image_path}")
+            return None
+        img = rotate_image(img, rotation)
+        motion = KenBurns(img, width, height)
+        return display.present(motion.render(0), display_interval, scheduler, animation=motion)
+    return show_photo
+
+def benchmark(size=(1920, 1080), seconds=5):
+    """Render time per frame and the CPU share it would use at the default frame rate"""
+    from ingest import create_sample
+    import tempfile
+    import os
+    with tempfile.TemporaryDirectory() as samples:
+        path = os.path.join(samples, 'sample.jpg')
+        create_sample(path, (1920, 1440))
+        img = cv2.imread(path)
+    start = time.perf_counter()
+    motion = KenBurns(img, *size)
+    setup = time.perf_counter() - start
+    frames = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        motion.render(frames / motion.fps)
+        frames += 1
+    per_frame = (time.perf_counter() - start) / frames
+    print(f"{size[0]}x{size[1]}: path and source {setup * 1000:.0f} ms, {per_frame * 1000:.1f} ms per frame, "
+          f"{per_frame * motion.fps * 100:.0f}% of a core at {motion.fps} fps")
+
+if __name__ == "__main__":
+    benchmark()
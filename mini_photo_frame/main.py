@@ -1,26 +1,56 @@
 import time
 import os
-import random
 import sys
-import pyautogui
 from drive_auth import (
     authenticate_google_drive, 
     is_frozen, 
-    get_base_path
+    get_base_path,
+    start_token_refresher
 )
 import drive_manager
+import frame_logging
+import drive_requests
+import hub
+import memory_budget
+import profiler
+import storage
+import sync_daemon
+import transitions
+import ken_burns
 from drive_manager import (
     create_drive_service, download_photo,
     get_or_create_settings_folder, get_settings_from_folders,
-    ensure_default_settings_folders, check_internet_connection
+    ensure_default_settings_folders, check_internet_connection,
+    get_local_photos
+)
+from download_queue import DownloadQueue, DEFAULT_LOOKAHEAD
+from ingest import IngestPipeline, DEFAULT_RENDITION_SIZE, HEIC_SUPPORTED
+from scheduler import IdleScheduler
+from adaptive_sync import AdaptiveSyncInterval, DEFAULT_MIN_INTERVAL, DEFAULT_MAX_INTERVAL
+from quiet_hours import parse_quiet_hours, seconds_until_wake
+from playlists import parse_playlist, select_playlist
+from weighted_sampler import (
+    WeightedSampler, update_weights, parse_folder_weights,
+    DEFAULT_RECENT_WEIGHT, DEFAULT_FAVORITE_WEIGHT
 )
-from display_manager import show_photo, show_photo_simple
 from datetime import datetime, timedelta
 import logging
+import multiprocessing
+
+# Seconds to wait for a queued photo before skipping past it
+DOWNLOAD_WAIT_TIMEOUT = 60
+
+SETTINGS_CHECK_INTERVAL = 60  # Check settings every minute
+INTERNET_CHECK_INTERVAL = 30  # Check internet every 30 seconds while offline
+SHUFFLE_BATCH = 100  # Photos drawn from the weighted shuffle at a time
+
+logger = logging.getLogger(__name__)
 
 def move_mouse_to_corner():
     """Move mouse to bottom right corner"""
     try:
+        # Only needed with a desktop session, so imported here
+        import pyautogui
         # Get screen size
         screen_width, screen_height = pyautogui.size()
         # Move to bottom right (subtract a few pixels to ensure it triggers corner)
@@ -28,14 +58,69 @@ def move_mouse_to_corner():
     except Exception as e:
         print(f"Could not move mouse: {str(e)}")
 
+def get_display_module(backend):
+    """Import the display backend selected in config.txt"""
+    if backend == 'framebuffer':
+        import display_manager_fb
+        return display_manager_fb
+    if backend == 'pygame':
+        import display_manager_pygame
+        return display_manager_pygame
+    import display_manager
+    return display_manager
+
+def parse_size(value):
+    """Parse a WIDTHxHEIGHT setting such as 800x480"""
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
 def load_config():
     """Load configuration from config.txt file"""
     config = {
         'FOLDER_ID': None,
         'DISPLAY_INTERVAL': 45 * 60,  # 45 minutes default
         'SYNC_INTERVAL': 5 * 60,      # 5 minutes default
+        'MIN_SYNC_INTERVAL': DEFAULT_MIN_INTERVAL,  # Sync interval right after changes
+        'MAX_SYNC_INTERVAL': DEFAULT_MAX_INTERVAL,  # Longest sync interval while nothing changes
         'SHUFFLE': True,              # Shuffle by default after showing new photos
         'LOG_LEVEL': 'INFO',          # Default logging level
+        'LOG_FILE': None,             # Also log to this file, rotated by size
+        'LOG_MAX_KB': frame_logging.DEFAULT_MAX_BYTES // 1024,
+        'LOG_BACKUPS': frame_logging.DEFAULT_BACKUPS,
+        'LOG_RATE_LIMIT': frame_logging.DEFAULT_RATE_LIMIT,  # Messages per minute from one line of code
+        'DRIVE_REQUESTS_PER_SECOND': drive_requests.DEFAULT_REQUESTS_PER_SECOND,
+        'MODE': 'standalone',         # standalone, hub or client
+        'HUB_URL': None,              # Hub address for client mode
+        'HUB_PORT': hub.DEFAULT_HUB_PORT,
+        'DISPLAY_BACKEND': 'opencv',  # opencv, pygame or framebuffer
+        'FRAMEBUFFER_DEVICE': '/dev/fb0',
+        'FRAMEBUFFER_SIZE': None,     # Read from the device unless set
+        'FRAMEBUFFER_BPP': None,      # Read from the device unless set
+        'QUIET_HOURS': None,          # e.g. 23:00-07:00, display off and no syncing
+        'QUIET_CATCHUP_MINS': 10,     # Sync and prefetch this long before quiet hours end
+        'SPLIT_PROCESSES': False,     # Drive sync and photo decoding in a separate process
+        'INGEST': True,               # Verify and pre-scale downloaded photos
+        'INGEST_WORKERS': 0,          # Ingest worker processes, 0 for one less than the CPU count
+        'RENDITION_SIZE': DEFAULT_RENDITION_SIZE,
+        'DEDUPE_SIMILAR': False,      # Also hide resized and re-encoded copies of photos
+        'RECENT_WEIGHT': DEFAULT_RECENT_WEIGHT,      # Shuffle weight of the newest photos
+        'FAVORITE_WEIGHT': DEFAULT_FAVORITE_WEIGHT,  # Shuffle weight of photos in a favorites folder
+        'FOLDER_WEIGHTS': None,       # e.g. Holidays:2,Screenshots:0.2
+        'PLAYLIST': None,             # on_this_day, this_month or a date range, all photos if not set
+        'TRANSITION': transitions.CROSSFADE,  # none, crossfade or slide
+        'TRANSITION_SECS': transitions.DEFAULT_DURATION,
+        'TRANSITION_FPS': transitions.DEFAULT_FPS,
+        'KEN_BURNS_FPS': ken_burns.DEFAULT_FPS,
+        'KEN_BURNS_CPU': ken_burns.DEFAULT_CPU_LIMIT * 100,  # Percent of a core for ken_burns mode
+        'KEN_BURNS_SOURCE_SIZE': None,  # Size of ken_burns renditions, set from the screen at startup
+        'MONITORS': '1',              # Monitors to show photos on: all, or numbers such as 1,2
+        'STORAGE_MODE': storage.NORMAL,  # normal, or sd_card to write as little as possible
+        'TEMP_DIR': storage.DEFAULT_TEMP_DIR,  # tmpfs for downloads in progress in sd_card mode
+        'TEMP_LIMIT_MB': storage.DEFAULT_TEMP_LIMIT // (1024 * 1024),
+        'STATE_FLUSH_MINS': storage.DEFAULT_FLUSH_INTERVAL // 60,  # Photo index writes in sd_card mode
+        'MEMORY_BUDGET_MB': 0,        # Memory the frame keeps within, 0 for a quarter of the device's
+        'PROFILE_DIR': 'profiles',    # Where profiles started with SIGUSR1 are written
+        'PROFILE_SECS': profiler.DEFAULT_SECONDS,
     }
     
     # Try to find config file in different locations
@@ -66,32 +151,156 @@ def load_config():
         # Convert values to appropriate types
         config['DISPLAY_INTERVAL'] = int(config['DISPLAY_INTERVAL'])
         config['SYNC_INTERVAL'] = int(config['SYNC_INTERVAL'])
+        config['MIN_SYNC_INTERVAL'] = int(config['MIN_SYNC_INTERVAL'])
+        config['MAX_SYNC_INTERVAL'] = int(config['MAX_SYNC_INTERVAL'])
+        config['DRIVE_REQUESTS_PER_SECOND'] = float(config['DRIVE_REQUESTS_PER_SECOND'])
+        config['HUB_PORT'] = int(config['HUB_PORT'])
+        config['MODE'] = config['MODE'].lower()
+        config['DISPLAY_BACKEND'] = config['DISPLAY_BACKEND'].lower()
+        config['FRAMEBUFFER_SIZE'] = parse_size(config['FRAMEBUFFER_SIZE']) if config['FRAMEBUFFER_SIZE'] else None
+        config['FRAMEBUFFER_BPP'] = int(config['FRAMEBUFFER_BPP']) if config['FRAMEBUFFER_BPP'] else None
+        config['QUIET_HOURS'] = parse_quiet_hours(config['QUIET_HOURS'])
+        config['QUIET_CATCHUP_MINS'] = int(config['QUIET_CATCHUP_MINS'])
         if 'SHUFFLE' in config:
             config['SHUFFLE'] = config['SHUFFLE'].lower() == 'true'
+        config['SPLIT_PROCESSES'] = str(config['SPLIT_PROCESSES']).lower() == 'true'
+        config['INGEST'] = str(config['INGEST']).lower() == 'true'
+        config['INGEST_WORKERS'] = int(config['INGEST_WORKERS'])
+        config['RENDITION_SIZE'] = int(config['RENDITION_SIZE'])
+        config['DEDUPE_SIMILAR'] = str(config['DEDUPE_SIMILAR']).lower() == 'true'
+        config['RECENT_WEIGHT'] = float(config['RECENT_WEIGHT'])
+        config['FAVORITE_WEIGHT'] = float(config['FAVORITE_WEIGHT'])
+        config['PLAYLIST'] = parse_playlist(config['PLAYLIST'])
+        config['TRANSITION'] = config['TRANSITION'].lower()
+        config['TRANSITION_SECS'] = float(config['TRANSITION_SECS'])
+        config['TRANSITION_FPS'] = int(config['TRANSITION_FPS'])
+        config['KEN_BURNS_FPS'] = float(config['KEN_BURNS_FPS'])
+        config['KEN_BURNS_CPU'] = float(config['KEN_BURNS_CPU'])
+        
+        config['LOG_MAX_KB'] = int(config['LOG_MAX_KB'])
+        config['LOG_BACKUPS'] = int(config['LOG_BACKUPS'])
+        config['LOG_RATE_LIMIT'] = int(config['LOG_RATE_LIMIT'])
+        config['STORAGE_MODE'] = config['STORAGE_MODE'].lower()
+        config['TEMP_LIMIT_MB'] = int(config['TEMP_LIMIT_MB'])
+        config['STATE_FLUSH_MINS'] = int(config['STATE_FLUSH_MINS'])
+        config['MEMORY_BUDGET_MB'] = int(config['MEMORY_BUDGET_MB'])
+        config['PROFILE_SECS'] = int(config['PROFILE_SECS'])
         
         # Set logging level
-        if 'LOG_LEVEL' in config:
-            log_level = config['LOG_LEVEL'].upper()
-            if log_level in ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']:
-                logging.getLogger().setLevel(getattr(logging, log_level))
-                print(f"Setting log level to: {log_level}")
+        log_level = config['LOG_LEVEL'].upper()
+        if log_level in ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']:
+            config['LOG_LEVEL'] = log_level
+            print(f"Setting log level to: {log_level}")
+        else:
+            config['LOG_LEVEL'] = 'INFO'
     else:
         print("\nNo config.txt found. Using default settings.")
         if not is_frozen():
             print("Development mode: Create a config.txt file in the project root.")
     
+    # Relative to the executable/project root, like IMAGES_PATH, so `photo_frame profile` finds the frame
+    if not os.path.isabs(config['PROFILE_DIR']):
+        config['PROFILE_DIR'] = os.path.join(get_base_path(), config['PROFILE_DIR'])
+    
     return config
 
-def sync_drive_images(service, folder_id, local_folder, settings=None):
-    """Syncs images and returns a list of any new photos downloaded"""
+def sync_drive_images(service, folder_id, local_folder, settings=None, download_queue=None, hub_server=None):
+    """Syncs images and returns a list of any new photos downloaded.
+
+    A hub_server is given every synced photo before the playlist setting
+    narrows what this frame shows, so clients keep the whole library.
+    """
     # Ensure the local folder exists
     if not os.path.exists(local_folder):
         os.makedirs(local_folder)
 
-    # Get list of photos in Google Drive (sorted by creation time)
-    new_photos, all_photos = drive_manager.sync_drive_images(service, folder_id, local_folder, settings)
+    # In split mode the sync process does the work
+    if settings and settings.get('sync_socket'):
+        return sync_daemon.get_client(settings['sync_socket']).sync(local_folder, settings)
+
+    # Client frames get their photos from the hub instead of Drive
+    if settings and settings.get('hub_url'):
+        new_photos, all_photos = hub.sync_from_hub(settings['hub_url'], local_folder, settings, download_queue)
+        # Capture dates come in the hub's manifest
+        date_index = hub.get_hub_state(local_folder).date_index
+    else:
+        new_photos, all_photos, date_index = sync_from_drive(service, folder_id, local_folder, settings,
+                                                             download_queue, hub_server)
+
+    # Date playlists come from the capture dates recorded at ingest, on the hub for
+    # a client frame. New photos are still shown first, whatever their date.
+    if settings and settings.get('playlist'):
+        if date_index is None:
+            logger.warning("Date playlists need INGEST=true, showing all photos")
+        else:
+            playlist = select_playlist(date_index(), settings['playlist'], all_photos)
+            if playlist is None:
+                logger.info(f"No photos in playlist {settings['playlist']}, showing all photos")
+            else:
+                logger.info(f"Playlist {settings['playlist']}: {len(playlist)} of {len(all_photos)} photos")
+                all_photos = playlist
     return new_photos, all_photos
 
+def sync_from_drive(service, folder_id, local_folder, settings, download_queue, hub_server):
+    """The Drive part of sync_drive_images. Also returns the date_index function for playlists, or None."""
+    # Get list of photos in Google Drive (sorted by creation time)
+    new_photos, all_photos = drive_manager.sync_drive_images(
+        service, folder_id, local_folder, settings, download_queue)
+    
+    # Ingest photos downloaded before the pipeline ran and forget deleted ones
+    ingest = getattr(download_queue, 'ingest', None)
+    if ingest is not None:
+        ingest.catch_up(all_photos)
+        # Left out of the playlist, or the display would skip straight past them every time
+        unshowable = ingest.unshowable(all_photos)
+        if unshowable:
+            logger.info(f"Leaving out {len(unshowable)} photos that cannot be shown on this frame")
+            new_photos = [p for p in new_photos if p not in unshowable]
+            all_photos = [p for p in all_photos if p not in unshowable]
+        if ingest.dedupe_similar:
+            duplicates = ingest.near_duplicates(all_photos)
+            if duplicates:
+                logger.info(f"Hiding {len(duplicates)} resized or re-encoded copies of other photos")
+                new_photos = [p for p in new_photos if p not in duplicates]
+                all_photos = [p for p in all_photos if p not in duplicates]
+    if hub_server:
+        hub_server.update(all_photos, settings, ingest.capture_dates() if ingest is not None else None)
+    return new_photos, all_photos, ingest.date_index if ingest is not None else None
+
+def resolve_playlist(settings, download_queue, playlist):
+    """Paths in a date playlist, None if capture dates aren't known on this frame"""
+    if settings.get('sync_socket'):
+        return sync_daemon.get_client(settings['sync_socket']).resolve_playlist(playlist)
+    fetch = getattr(download_queue, 'fetch', None)
+    if isinstance(fetch, hub.HubDownloader):
+        # Client frame: capture dates come in the hub's manifest
+        return fetch.state.date_index().resolve(playlist)
+    ingest = getattr(download_queue, 'ingest', None)
+    if ingest is None:
+        return None
+    return ingest.date_index().resolve(playlist)
+
+def check_connection(settings):
+    """Check if we can reach our photo source: the hub in client mode, otherwise the internet"""
+    if settings.get('sync_socket'):
+        return sync_daemon.get_client(settings['sync_socket']).check_connection(settings)
+    if settings.get('hub_url'):
+        return hub.check_hub_connection(settings['hub_url'])
+    return check_internet_connection()
+
+def fetch_settings(service, folder_id, local_folder, settings):
+    """Get the latest settings from the Drive settings folders, or from the hub in client mode"""
+    if settings.get('sync_socket'):
+        return sync_daemon.get_client(settings['sync_socket']).fetch_settings(settings)
+    if settings.get('hub_url'):
+        return hub.get_settings_from_hub(settings['hub_url'], local_folder, settings)
+    settings_folder_id = get_or_create_settings_folder(service, folder_id)
+    # Ensure settings folders exist
+    ensure_default_settings_folders(service, settings_folder_id, settings)
+    # Get current settings
+    new_settings, _ = get_settings_from_folders(service, settings_folder_id, settings)
+    return new_settings
+
 def validate_images_path(path):
     """Validate and create images directory if needed"""
     try:
@@ -112,15 +321,7 @@ def validate_images_path(path):
             except Exception as e:
                 return False, f"Could not create directory {path}: {str(e)}"
         
-        # Try to write a test file
-        test_file = os.path.join(path, '.write_test')
-        try:
-            with open(test_file, 'w') as f:
-                f.write('test')
-            os.remove(test_file)
-        except Exception as e:
-            return False, f"Directory is not writable {path}: {str(e)}"
-            
+        # No test write: os.access is enough, and a probe file is a write to the card on every start
         return True, path
     except Exception as e:
         return False, f"Invalid path {path}: {str(e)}"
@@ -158,161 +359,393 @@ def get_images_path(config):
     
     return result
 
-def run_digital_picture_frame(folder_id, local_image_folder, service, settings):
-    """Run the picture frame with the given settings"""
+def run_digital_picture_frame(folder_id, local_image_folder, service, settings, download_queue=None,
+                              hub_server=None, monitors=None):
+    """Run the picture frame with the given settings, on each of monitors if there are several"""
     # Initial sync
-    new_photos, all_photos = sync_drive_images(service, folder_id, local_image_folder, settings)
+    new_photos, all_photos = sync_drive_images(service, folder_id, local_image_folder, settings, download_queue,
+                                               hub_server)
     last_sync_time = time.time()
-    last_settings_check = time.time()
-    settings_check_interval = 60  # Check settings every minute
-    last_internet_check = 0
-    internet_check_interval = 30  # Check internet every 30 seconds
-    is_offline = not check_internet_connection()
+    is_offline = not check_connection(settings)
     
     # Track current position for back functionality
     current_index = 0
     photo_history = []
     photos_to_display = all_photos
-    already_shown = set()  # Track which photos have been shown
+    
+    # Weighted shuffle: recent uploads, favorites and search matches come up more
+    # often, and each photo is drawn once per cycle
+    sampler = WeightedSampler()
+    update_weights(sampler, all_photos, settings)
+    
+    # Results of checks that ran while a photo was showing, applied before the next one
+    pending_new_photos = []
+    search_changed = False
+    playlist_reset = False
+    
+    # Quiet hours state
+    quiet = False         # Display blanked and background checks paused
+    caught_up = False     # Catch-up sync ran before the end of quiet hours
+    awake_until = 0       # A key press during quiet hours keeps the frame awake until this time
 
     # Get display function based on config
-    display_func = show_photo_simple if settings.get('display_mode') == 'simple' else show_photo
+    display = get_display_module(settings.get('display_backend', 'opencv'))
+    
+    # Several monitors each get their own shuffle, of their own selection of the photos
+    wall = None
+    if monitors:
+        import multi_monitor
+        wall = multi_monitor.PanelWall(monitors, local_image_folder, settings, download_queue,
+                                       lambda playlist: resolve_playlist(settings, download_queue, playlist))
+        wall_photos = None
+        wall_started = False
+
+    if settings.get('display_mode') == 'simple':
+        display_func = getattr(display, 'show_photo_simple', display.show_photo)
+    elif settings.get('display_mode') == 'fill':
+        display_func = getattr(display, 'show_photo_fill', display.show_photo)
+    elif settings.get('display_mode') == 'ken_burns':
+        display_func = ken_burns.make_display_func(display)
+    else:
+        display_func = display.show_photo
+    if settings.get('sync_socket') and settings.get('display_mode') != 'ken_burns':
+        # Show frames the sync process has already decoded (ken_burns animates
+        # from its own source, so it still decodes here)
+        display_func = sync_daemon.make_display_func(
+            display, download_queue, local_image_folder, settings, display_func)
+    
+    # All periodic work shares one timer heap, so the frame sleeps until the
+    # next photo, sync, settings check or key press instead of polling
+    scheduler = IdleScheduler()
+    
+    # Sync often while photos are changing and back off past sync_interval when they aren't
+    sync_interval = AdaptiveSyncInterval(settings.get('min_sync_interval', DEFAULT_MIN_INTERVAL),
+                                         lambda: settings['sync_interval'],
+                                         settings.get('max_sync_interval', DEFAULT_MAX_INTERVAL))
+    
+    def go_offline():
+        nonlocal is_offline
+        is_offline = True
+        print("\nInternet connection lost. Operating in offline mode.")
+        scheduler.every('internet', INTERNET_CHECK_INTERVAL, check_internet)
+    
+    def check_internet():
+        """Probe for the connection coming back. Only scheduled while offline."""
+        nonlocal is_offline
+        if check_connection(settings):
+            is_offline = False
+            print("\nInternet connection restored. Resuming normal operation.")
+            scheduler.cancel('internet')
+            # Force a sync on reconnection
+            scheduler.reschedule('settings', 0)
+            scheduler.reschedule('sync', 0)
+    
+    def is_online():
+        """Check the connection right before network work, instead of on its own timer"""
+        if is_offline:
+            return False
+        if not check_connection(settings):
+            go_offline()
+            return False
+        return True
+    
+    def check_settings():
+        nonlocal search_changed
+        if not is_online():
+            return
+        try:
+            new_settings = fetch_settings(service, folder_id, local_image_folder, settings)
+            if new_settings != settings:
+                print("\nSettings updated from Google Drive folders:")
+                if new_settings['display_interval'] != settings['display_interval']:
+                    print(f"Display interval: {new_settings['display_interval'] // 60} minutes")
+                if new_settings['sync_interval'] != settings['sync_interval']:
+                    print(f"Sync interval: {new_settings['sync_interval'] // 60} minutes")
+                if new_settings['shuffle'] != settings['shuffle']:
+                    print(f"Shuffle mode: {new_settings['shuffle']}")
+                if new_settings.get('quiet_hours') != settings.get('quiet_hours'):
+                    print(f"Quiet hours: {new_settings.get('quiet_hours') or 'off'}")
+                if new_settings.get('search') != settings.get('search'):
+                    print(f"Search query updated: {new_settings.get('search', '(none)')}")
+                    search_changed = True
+                    scheduler.reschedule('sync', 0)
+                if new_settings.get('playlist') != settings.get('playlist'):
+                    print(f"Playlist: {new_settings.get('playlist') or 'all photos'}")
+                    search_changed = True
+                    scheduler.reschedule('sync', 0)
+                settings.update(new_settings)
+        except Exception as e:
+            print(f"\nError checking settings: {str(e)}")
+            print("Continuing with current settings...")
+    
+    def check_for_new_photos():
+        nonlocal all_photos, last_sync_time, search_changed, playlist_reset, sampler
+        if not is_online():
+            return
+        print("Checking for new photos...")
+        previous_photos = all_photos
+        new_photos, all_photos = sync_drive_images(service, folder_id, local_image_folder, settings, download_queue,
+                                                   hub_server)
+        last_sync_time = time.time()
+        sync_interval.record(bool(new_photos) or set(all_photos) != set(previous_photos))
+        if search_changed:
+            # If settings changed, reset everything
+            search_changed = False
+            playlist_reset = True
+            sampler = WeightedSampler()
+            update_weights(sampler, all_photos, settings)
+        else:
+            update_weights(sampler, all_photos, settings, previous_photos)
+            if new_photos:
+                pending_new_photos.extend(new_photos)
+    
+    def log_wakeups():
+        logger.info(f"Idle scheduler: {scheduler.wakeups_per_hour():.1f} wakeups per hour")
+        scheduler.reset_metrics()
+        logger.info(f"Adaptive sync: {sync_interval.changed_syncs} of {sync_interval.syncs} syncs found changes, "
+                    f"syncing every {sync_interval.interval():.0f} seconds")
+        if transitions.get_engine():
+            logger.info(f"Transitions: {transitions.get_engine().stats()}")
+        logger.info(f"Storage writes: {storage.meter.report()}")
+        logger.info(f"Memory: {memory_budget.report()}")
+    
+    def start_background_checks(delay=None):
+        scheduler.every('settings', SETTINGS_CHECK_INTERVAL, check_settings, delay)
+        scheduler.every('sync', sync_interval.interval, check_for_new_photos, delay)
+        if is_offline:
+            scheduler.every('internet', INTERNET_CHECK_INTERVAL, check_internet, delay)
+    
+    def prepare_for_wake():
+        """One bulk sync and prefetch shortly before quiet hours end, so the first photo is ready"""
+        nonlocal caught_up
+        print("\nQuiet hours ending soon. Catching up with Google Drive...")
+        if is_offline:
+            check_internet()
+        check_settings()
+        check_for_new_photos()
+        caught_up = True
+        if download_queue is not None:
+            upcoming = all_photos if playlist_reset else pending_new_photos + photos_to_display[current_index:]
+            download_queue.reprioritize(upcoming[:DEFAULT_LOOKAHEAD])
+    
+    def enter_quiet_hours(wake_in):
+        """Pause syncing, settings checks and connection probes until shortly before wake up"""
+        nonlocal quiet, caught_up
+        quiet = True
+        caught_up = False
+        print(f"\nQuiet hours ({settings['quiet_hours']}): display off for {wake_in / 3600:.1f} hours")
+        for name in ('settings', 'sync', 'internet'):
+            scheduler.cancel(name)
+        scheduler.once('quiet_catchup', wake_in - settings['quiet_catchup'], prepare_for_wake)
+    
+    def leave_quiet_hours():
+        nonlocal quiet
+        quiet = False
+        print("\nQuiet hours over. Resuming photos.")
+        scheduler.cancel('quiet_catchup')
+        # Check right away if the catch-up sync didn't get to run, e.g. woken early by a key
+        start_background_checks(None if caught_up else 0)
+    
+    start_background_checks()
+    scheduler.every('wakeup_stats', 60 * 60, log_wakeups)
+    
+    def insert_new_photos(new_photos):
+        """Insert new photos at current position"""
+        nonlocal photos_to_display
+        new_set = set(new_photos)
+        photos_before = photos_to_display[:current_index]
+        photos_after = photos_to_display[current_index:]
+        photos_to_display = photos_before + new_photos + [p for p in photos_after if p not in new_set]
+        print(f"Added {len(new_photos)} new photos at current position in the queue")
 
     while True:
-        current_time = time.time()
-        settings_updated = False
+        # Run any checks that came due since the last photo
+        scheduler.run_due()
         
-        # Check internet connectivity periodically
-        if current_time - last_internet_check >= internet_check_interval:
-            was_offline = is_offline
-            is_offline = not check_internet_connection()
-            if was_offline and not is_offline:
-                print("\nInternet connection restored. Resuming normal operation.")
-                # Force a sync on reconnection
-                last_sync_time = 0
-                last_settings_check = 0
-            elif not was_offline and is_offline:
-                print("\nInternet connection lost. Operating in offline mode.")
-            last_internet_check = current_time
+        # Quiet hours: blank the screen and don't decode or poll anything until morning
+        wake_in = seconds_until_wake(settings.get('quiet_hours'))
+        if wake_in and time.time() >= awake_until:
+            if not quiet:
+                enter_quiet_hours(wake_in)
+            if wall is not None:
+                action = wall.blank(wake_in, scheduler)
+            else:
+                action = display.show_blank(wake_in, scheduler=scheduler)
+            if action == "exit":
+                return
+            # Any key wakes the frame for the rest of this quiet period
+            awake_until = time.time() + seconds_until_wake(settings.get('quiet_hours'))
+            continue
+        if quiet:
+            leave_quiet_hours()
         
-        # Check for settings updates periodically
-        if not is_offline and current_time - last_settings_check >= settings_check_interval:
-            try:
-                settings_folder_id = get_or_create_settings_folder(service, folder_id)
-                # Ensure settings folders exist
-                ensure_default_settings_folders(service, settings_folder_id, settings)
-                # Get current settings
-                new_settings, _ = get_settings_from_folders(service, settings_folder_id, settings)
-                if new_settings != settings:
-                    print("\nSettings updated from Google Drive folders:")
-                    if new_settings['display_interval'] != settings['display_interval']:
-                        print(f"Display interval: {new_settings['display_interval'] // 60} minutes")
-                    if new_settings['sync_interval'] != settings['sync_interval']:
-                        print(f"Sync interval: {new_settings['sync_interval'] // 60} minutes")
-                    if new_settings['shuffle'] != settings['shuffle']:
-                        print(f"Shuffle mode: {new_settings['shuffle']}")
-                    if new_settings.get('search') != settings.get('search'):
-                        print(f"Search query updated: {new_settings.get('search', '(none)')}")
-                        settings_updated = True
-                    settings.update(new_settings)
-            except Exception as e:
-                print(f"\nError checking settings: {str(e)}")
-                print("Continuing with current settings...")
-            last_settings_check = current_time
-            
-        # Check for new photos on interval or if settings were updated
-        if not is_offline and (settings_updated or current_time - last_sync_time >= settings['sync_interval']):
-            print("Checking for new photos...")
-            new_photos, all_photos = sync_drive_images(service, folder_id, local_image_folder, settings)
-            last_sync_time = current_time
-            if settings_updated:
-                # If settings changed, reset everything
-                photos_to_display = all_photos
-                current_index = 0
-                photo_history = []
-                already_shown.clear()
-            elif new_photos:
-                # Insert new photos at current position
-                photos_before = photos_to_display[:current_index]
-                photos_after = photos_to_display[current_index:]
-                photos_to_display = photos_before + new_photos + [p for p in photos_after if p not in new_photos]
-                print(f"Added {len(new_photos)} new photos at current position in the queue")
+        if wall is not None:
+            # Hand each sync's results to the panels, which pick and show their own photos
+            if playlist_reset or all_photos is not wall_photos:
+                wall.update(all_photos, pending_new_photos, settings, reset=playlist_reset)
+                playlist_reset = False
+                pending_new_photos.clear()
+                wall_photos = all_photos
+            if not wall_started:
+                wall.start(settings['display_interval'])
+                wall_started = True
+            action = wall.step(scheduler)
+            if action == "exit":
+                wall.close()
+                return
+            elif action == "reshuffle":
+                print("Reshuffling photos...")
+                wall.reshuffle()
+            elif action == "new":
+                scheduler.reschedule('sync', 0)
+                scheduler.reschedule('settings', 0)
+            elif action == "back":
+                wall.back()
+            elif action:
+                wall.advance()
+            continue
+        
+        if playlist_reset:
+            playlist_reset = False
+            pending_new_photos.clear()
+            photos_to_display = all_photos
+            current_index = 0
+            photo_history = []
+            sampler.reset()
+        elif pending_new_photos:
+            insert_new_photos(pending_new_photos)
+            pending_new_photos.clear()
 
         # Handle end of list
         if current_index >= len(photos_to_display):
             if settings['shuffle']:
-                # When reshuffling, exclude photos we've already shown this cycle
-                unshown_photos = [p for p in photos_to_display if p not in already_shown]
-                if unshown_photos:
-                    random.shuffle(unshown_photos)
-                    photos_to_display = unshown_photos
-                else:
+                # Draw the next photos not yet shown this cycle
+                if not sampler.remaining():
                     # If all photos shown, start fresh
-                    already_shown.clear()
-                    photos_to_display = all_photos.copy()
-                    random.shuffle(photos_to_display)
+                    sampler.reset()
+                photos_to_display = sampler.draw_many(SHUFFLE_BATCH)
             else:
                 # For non-shuffle mode, just start over
                 photos_to_display = all_photos
-                already_shown.clear()
+                sampler.reset()
+            if not photos_to_display:
+                photos_to_display = all_photos
             current_index = 0
             photo_history = []
 
+        # Download the photos about to be shown before anything else
+        if download_queue is not None:
+            download_queue.reprioritize(photos_to_display[current_index:current_index + DEFAULT_LOOKAHEAD])
+
         # Display current photo
         photo_name = photos_to_display[current_index]
         photo_path = os.path.join(local_image_folder, photo_name)
         if not os.path.exists(photo_path):
+            if download_queue is not None and download_queue.is_pending(photo_name):
+                print(f"Waiting for download: {photo_name}")
+                if download_queue.wait_for(photo_name, DOWNLOAD_WAIT_TIMEOUT):
+                    continue
             current_index += 1
             continue
             
         print(f"Showing photo: {photo_name}")
-        already_shown.add(photo_name)  # Mark this photo as shown
-        action = display_func(photo_path, settings['display_interval'], settings['rotation'])
+        sampler.take(photo_name)  # Mark this photo as shown this cycle
+        action = display_func(photo_path, settings['display_interval'], settings['rotation'], scheduler=scheduler)
         
         if action == "exit":
             return
         elif action == "reshuffle":
-            already_shown.clear()  # Reset on manual reshuffle
-            random.shuffle(photos_to_display)
+            sampler.reset()  # Reset on manual reshuffle
+            photos_to_display = sampler.draw_many(SHUFFLE_BATCH) or photos_to_display
             current_index = 0
             photo_history = []
             print("Reshuffling photos...")
         elif action == "new":
             # Force a sync check
-            last_sync_time = 0
-            last_settings_check = 0
+            scheduler.reschedule('sync', 0)
+            scheduler.reschedule('settings', 0)
         elif action == "back":
             if photo_history:
                 current_index = photo_history.pop()
-                if photos_to_display[current_index] in already_shown:
-                    already_shown.remove(photos_to_display[current_index])
         else:  # "next" or any other key
             photo_history.append(current_index)
             if len(photo_history) > 50:  # Limit history size
                 photo_history.pop(0)
             current_index += 1
             
-            # Quick check for new photos on 'next'
-            if current_time - last_sync_time >= 30:  # Only check if it's been at least 30 seconds
-                temp_settings = settings.copy()
-                temp_settings.pop('search', None)  # Remove search to preserve current order
-                new_photos, _ = sync_drive_images(service, folder_id, local_image_folder, temp_settings)
-                last_sync_time = current_time
-                if new_photos:
-                    # Insert new photos at current position
-                    photos_before = photos_to_display[:current_index]
-                    photos_after = photos_to_display[current_index:]
-                    photos_to_display = photos_before + new_photos + [p for p in photos_after if p not in new_photos]
-                    print(f"Added {len(new_photos)} new photos at current position in the queue")
+            # Quick check for new photos on 'next', through the scheduled sync so the
+            # photo list, weights, hub and sync interval all see its result
+            if time.time() - last_sync_time >= 30:  # Only check if it's been at least 30 seconds
+                scheduler.reschedule('sync', 0)
+
+def run_split_processes(config, local_image_folder, settings, monitors=None):
+    """Run the display in this process and the Drive sync in a supervised sync process"""
+    socket_path = sync_daemon.default_socket_path()
+    supervisor = sync_daemon.SyncSupervisor(config, local_image_folder, socket_path)
+    supervisor.start()
+    profiler.on_start(supervisor.profile)  # Profile the sync process along with the display
+    settings['sync_socket'] = socket_path
+    client = sync_daemon.get_client(socket_path)
+    try:
+        print("\nWaiting for the sync process to start...")
+        if client.wait_until_ready():
+            try:
+                settings = fetch_settings(None, config['FOLDER_ID'], local_image_folder, settings)
+            except Exception as e:
+                print(f"\nCould not get settings ({str(e)}). Starting with local settings...")
+        else:
+            print("\nSync process not ready yet. Starting with local photos...")
+        
+        print("\nStarting photo frame with settings:")
+        print(f"Display interval: {settings['display_interval'] // 60} minutes")
+        print(f"Sync interval: {settings['sync_interval'] // 60} minutes")
+        print(f"Shuffle mode: {settings['shuffle']}")
+        
+        # The client stands in for the download queue, which lives in the sync process
+        run_digital_picture_frame(config['FOLDER_ID'], local_image_folder, None, settings, client,
+                                  monitors=monitors)
+    finally:
+        supervisor.stop()
 
 def main():
-    # Move mouse to corner at startup
-    move_mouse_to_corner()
-    
     # Load configuration
     config = load_config()
     
-    if not config['FOLDER_ID'] or config['FOLDER_ID'] == 'your_google_drive_folder_id_here':
+    # photo_frame profile: have the running frame profile itself
+    if len(sys.argv) > 1 and sys.argv[1] == 'profile':
+        sys.exit(profiler.main(config))
+    
+    # photo_frame upload <dir>: copy photos into the Drive folder instead of showing them
+    uploading = len(sys.argv) > 1 and sys.argv[1] == 'upload'
+    if not uploading:
+        # SIGUSR1 starts a profile. Set up before any thread starts, so they all leave it to the profiler.
+        profiler.install(config['PROFILE_DIR'], config['PROFILE_SECS'], pid_file=True)
+    
+    # Logging and print() are written out by a background thread from here on
+    frame_logging.configure(config['LOG_LEVEL'], config['LOG_FILE'], config['LOG_MAX_KB'] * 1024,
+                            config['LOG_BACKUPS'], config['LOG_RATE_LIMIT'], capture_prints=not uploading)
+    
+    if uploading:
+        import uploader
+        sys.exit(uploader.main(sys.argv[2:], config))
+    
+    if config['DISPLAY_BACKEND'] == 'framebuffer':
+        import display_manager_fb
+        display_manager_fb.configure(config['FRAMEBUFFER_DEVICE'], config['FRAMEBUFFER_SIZE'], config['FRAMEBUFFER_BPP'])
+    else:
+        # Move mouse to corner at startup
+        move_mouse_to_corner()
+    transitions.configure(config['TRANSITION'], config['TRANSITION_SECS'], config['TRANSITION_FPS'])
+    memory_budget.configure(config['MEMORY_BUDGET_MB'])
+    storage.configure(config['STORAGE_MODE'], config['TEMP_DIR'], config['TEMP_LIMIT_MB'] * 1024 * 1024,
+                      config['STATE_FLUSH_MINS'] * 60)
+    ken_burns.configure(config['KEN_BURNS_FPS'], config['KEN_BURNS_CPU'] / 100)
+    
+    if config['MODE'] == 'client':
+        if not config['HUB_URL']:
+            print("\nPlease set HUB_URL in config.txt to use client mode")
+            return
+    elif not config['FOLDER_ID'] or config['FOLDER_ID'] == 'your_google_drive_folder_id_here':
         print("\nPlease set your Google Drive folder ID in config.txt")
         if not is_frozen():
             print("Development mode: Edit config.txt in the project root.")
@@ -322,70 +755,147 @@ def main():
     local_image_folder = get_images_path(config)
     print(f"\nUsing images directory: {local_image_folder}")
     
-    # Initialize credentials and service regardless of internet status
-    creds = authenticate_google_drive()
-    if not creds:
-        return
-        
-    service = create_drive_service(creds)
-    if not service:
-        return
-    
     # Convert config to settings format
     settings = {
         'display_interval': config['DISPLAY_INTERVAL'],
         'sync_interval': config['SYNC_INTERVAL'],
+        'min_sync_interval': config['MIN_SYNC_INTERVAL'],
+        'max_sync_interval': config['MAX_SYNC_INTERVAL'],
         'shuffle': config.get('SHUFFLE', True),
         'filter': None,
         'display_mode': config.get('DISPLAY_MODE', 'original'),  # Default to original mode if not specified
-        'rotation': int(config.get('ROTATION', '0'))  # Default to 0 if not specified
+        'rotation': int(config.get('ROTATION', '0')),  # Default to 0 if not specified
+        'display_backend': config['DISPLAY_BACKEND'],
+        'quiet_hours': config['QUIET_HOURS'],
+        'quiet_catchup': config['QUIET_CATCHUP_MINS'] * 60,
+        'recent_weight': config['RECENT_WEIGHT'],
+        'favorite_weight': config['FAVORITE_WEIGHT'],
+        'folder_weights': parse_folder_weights(config['FOLDER_WEIGHTS']),
+        'playlist': config['PLAYLIST'],
     }
     
     print(f"\nUsing display mode: {settings['display_mode']}")
     print(f"Image rotation: {settings['rotation']} degrees")
+    if settings['quiet_hours']:
+        print(f"Quiet hours: {settings['quiet_hours']}")
+    if settings['playlist']:
+        print(f"Playlist: {settings['playlist']}")
     
-    # Check internet connectivity
-    if not check_internet_connection():
-        print("\nNo internet connection detected. Starting in offline mode...")
-        # Get list of local photos
-        local_photos = []
-        for root, _, files in os.walk(local_image_folder):
-            for file in files:
-                if file != ".gitkeep":
-                    rel_path = os.path.relpath(os.path.join(root, file), local_image_folder).replace('\\', '/')
-                    local_photos.append(rel_path)
-        
-        if not local_photos:
-            print("\nNo local photos found. Please ensure there are photos in the images directory.")
+    # One process drives every selected monitor (OpenCV windows only)
+    monitors = None
+    if config['DISPLAY_BACKEND'] == 'opencv' and str(config['MONITORS']).strip() != '1':
+        import multi_monitor
+        monitors = multi_monitor.select_monitors(config['MONITORS'], multi_monitor.parse_monitor_selections(config))
+        print(f"Monitors: {len(monitors)}")
+    
+    # ken_burns mode pans across renditions made at ingest for this screen (one monitor only)
+    if settings['display_mode'] == 'ken_burns' and not monitors and config['INGEST']:
+        width, height = get_display_module(config['DISPLAY_BACKEND']).get_screen_size()
+        config['KEN_BURNS_SOURCE_SIZE'] = ken_burns.source_size(width, height, settings['rotation'])
+    
+    # Client mode - photos and shared settings come from a hub frame on the LAN
+    if config['MODE'] == 'client':
+        settings['hub_url'] = config['HUB_URL']
+        print(f"\nClient mode: syncing from hub at {config['HUB_URL']}")
+    
+    if config['SPLIT_PROCESSES']:
+        if sync_daemon.is_supported():
+            run_split_processes(config, local_image_folder, settings, monitors)
             return
-            
-        print(f"\nFound {len(local_photos)} local photos.")
-        print("\nStarting photo frame with default settings:")
-        print(f"Display interval: {settings['display_interval'] // 60} minutes")
-        print(f"Shuffle mode: {settings['shuffle']}")
+        print("\nSPLIT_PROCESSES needs Unix domain sockets. Running in a single process.")
+    
+    if config['MODE'] == 'client':
+        try:
+            settings = hub.get_settings_from_hub(config['HUB_URL'], local_image_folder, settings)
+        except (OSError, ValueError) as e:
+            print(f"\nHub not reachable ({str(e)}). Starting with local settings...")
+        # Photos are fetched from the hub in the background, next-to-show first, like from Drive
+        download_queue = DownloadQueue(None, local_image_folder,
+                                       fetch=hub.HubDownloader(config['HUB_URL'], local_image_folder))
+        download_queue.start()
+        run_digital_picture_frame(None, local_image_folder, None, settings, download_queue, monitors=monitors)
+        return
+    
+    # All Drive calls share one rate limit
+    drive_requests.executor.configure(config['DRIVE_REQUESTS_PER_SECOND'])
+    drive_manager.configure_photo_types(config['INGEST'], HEIC_SUPPORTED)
+    
+    # Initialize credentials and service regardless of internet status
+    creds = authenticate_google_drive()
+    if not creds:
+        return
+    
+    # Keep the access token fresh so Drive calls never wait on a refresh
+    start_token_refresher(creds)
         
-        # Start the photo frame with the service object (so it can recover when internet returns)
-        run_digital_picture_frame(config['FOLDER_ID'], local_image_folder, service, settings)
+    service = create_drive_service(creds)
+    if not service:
         return
+
+    # Downloaded photos are verified and prepared for display in worker processes
+    ingest = None
+    if config['INGEST']:
+        ingest = IngestPipeline(local_image_folder, config['RENDITION_SIZE'], config['INGEST_WORKERS'],
+                                config['DEDUPE_SIMILAR'], config.get('KEN_BURNS_SOURCE_SIZE'))
+        ingest.start()
     
-    # Online mode - proceed with normal startup
-    print("\nInternet connection available. Starting in online mode...")
+    # Missing photos are downloaded in the background, next-to-show first
+    download_queue = DownloadQueue(creds, local_image_folder, ingest=ingest)
+    download_queue.start()
     
-    # Set up settings folders in Google Drive
-    settings_folder_id = get_or_create_settings_folder(service, config['FOLDER_ID'])
-    ensure_default_settings_folders(service, settings_folder_id, settings)
+    try:
+        # Hub mode - share this frame's Drive sync with client frames on the LAN
+        hub_server = None
+        if config['MODE'] == 'hub':
+            hub_server = hub.HubServer(local_image_folder, config['HUB_PORT'])
+            hub_server.start()
+            print(f"\nHub mode: serving photos on port {config['HUB_PORT']}")
     
-    # Get any existing settings from folders
-    settings, _ = get_settings_from_folders(service, settings_folder_id, settings)
+        # Check internet connectivity
+        if not check_internet_connection():
+            print("\nNo internet connection detected. Starting in offline mode...")
+            # Get list of local photos
+            local_photos, _ = get_local_photos(local_image_folder)
+        
+            if not local_photos:
+                print("\nNo local photos found. Please ensure there are photos in the images directory.")
+                return
+            
+            print(f"\nFound {len(local_photos)} local photos.")
+            print("\nStarting photo frame with default settings:")
+            print(f"Display interval: {settings['display_interval'] // 60} minutes")
+            print(f"Shuffle mode: {settings['shuffle']}")
+        
+            # Start the photo frame with the service object (so it can recover when internet returns)
+            run_digital_picture_frame(config['FOLDER_ID'], local_image_folder, service, settings, download_queue,
+                                  hub_server, monitors)
+            return
+    
+        # Online mode - proceed with normal startup
+        print("\nInternet connection available. Starting in online mode...")
+    
+        # Set up settings folders in Google Drive
+        settings_folder_id = get_or_create_settings_folder(service, config['FOLDER_ID'])
+        ensure_default_settings_folders(service, settings_folder_id, settings)
     
-    print("\nStarting photo frame with settings:")
-    print(f"Display interval: {settings['display_interval'] // 60} minutes")
-    print(f"Sync interval: {settings['sync_interval'] // 60} minutes")
-    print(f"Shuffle mode: {settings['shuffle']}")
+        # Get any existing settings from folders
+        settings, _ = get_settings_from_folders(service, settings_folder_id, settings)
+    
+        print("\nStarting photo frame with settings:")
+        print(f"Display interval: {settings['display_interval'] // 60} minutes")
+        print(f"Sync interval: {settings['sync_interval'] // 60} minutes")
+        print(f"Shuffle mode: {settings['shuffle']}")
     
-    run_digital_picture_frame(config['FOLDER_ID'], local_image_folder, service, settings)
+        run_digital_picture_frame(config['FOLDER_ID'], local_image_folder, service, settings, download_queue,
+                                  hub_server, monitors)
+    finally:
+        if ingest:
+            ingest.stop()
+        logger.info(f"Storage writes: {storage.meter.report()}")
 
 if __name__ == "__main__":
+    # Needed for the split mode sync process in frozen builds
+    multiprocessing.freeze_support()
     main()
 
 
@@ -0,0 +1,169 @@
+# memory_budget.py
+# Keeps the frame inside a memory budget (MEMORY_BUDGET_MB), for 512 MB devices
+# like the Pi Zero. A photo's size is read from its header before it is
+# decoded: JPEGs larger than the screen are decoded at 1/2, 1/4 or 1/8 scale,
+# which the JPEG decoder does almost for free, and a photo that would still
+# not fit in its share of the budget is skipped instead of decoded. Caches
+# register a shrink function that runs when the process gets close to the
+# budget. Peak memory is tracked per stage (decode, compose) for the logs.
+import logging
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+import cv2
+from PIL import Image
+
+import profiler
+
+logger = logging.getLogger(__name__)
+
+DECODE_SHARE = 0.5     # Most of the budget one decoded photo may use
+PRESSURE_LEVEL = 0.8   # Caches are shrunk when the process uses this much of the budget
+AUTO_SHARE = 0.25      # Budget when none is set, as a share of the device's memory
+REDUCED_DECODES = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                   (2, cv2.IMREAD_REDUCED_COLOR_2))
+JPEG_FORMATS = ('JPEG', 'MPO')  # Formats the decoder can scale down while decoding
+
+_budget = None
+_shrinkers = {}  # cache name -> function that frees what it can
+_peaks = {}      # stage -> highest RSS seen at the end of it, in bytes
+_lock = threading.Lock()
+
+def total_memory():
+    """Physical memory in bytes, None where it can't be read"""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def configure(budget_mb=0):
+    """Set the budget in MB, 0 for a quarter of the device's memory"""
+    global _budget
+    if budget_mb:
+        _budget = int(budget_mb * 1024 * 1024)
+    else:
+        total = total_memory()
+        _budget = int(total * AUTO_SHARE) if total else None
+    if _budget:
+        logger.info(f"Memory budget: {_budget / 1e6:.0f} MB")
+
+def get_budget():
+    return _budget
+
+def current_rss():
+    """Resident memory of this process in bytes, None where it can't be read"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def peak_rss():
+    """Highest resident memory of this process so far in bytes, None where unknown"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def register_cache(name, shrink):
+    """Have shrink() called to free memory when the process nears the budget"""
+    _shrinkers[name] = shrink
+
+def check_pressure():
+    """Shrink the registered caches if memory use is close to the budget. Returns True if it was."""
+    rss = current_rss()
+    if not _budget or rss is None or rss < _budget * PRESSURE_LEVEL:
+        return False
+    logger.warning(f"Memory use {rss / 1e6:.0f} MB is close to the {_budget / 1e6:.0f} MB budget, "
+                   f"shrinking caches ({', '.join(_shrinkers) or 'none'})")
+    for name, shrink in list(_shrinkers.items()):
+        try:
+            shrink()
+        except Exception as e:
+            logger.error(f"Could not shrink the {name} cache: {str(e)}")
+    return True
+
+@contextmanager
+def track(stage):
+    """Record the process's memory use at the end of a stage, keeping the highest"""
+    try:
+        yield
+    finally:
+        rss = current_rss()
+        if rss is not None:
+            with _lock:
+                _peaks[stage] = max(rss, _peaks.get(stage, 0))
+
+def image_size(file_path):
+    """(width, height, format) from the image header without decoding it, None if unreadable.
+
+    Raises Image.DecompressionBombError for images over twice Pillow's pixel limit.
+    """
+    try:
+        with Image.open(file_path) as img:
+            return img.size[0], img.size[1], img.format
+    except (OSError, SyntaxError, ValueError):
+        return None
+
+def decode_scale(width, height, image_format, target_size=None, budget=None):
+    """Scale-down factor (1, 2, 4 or 8) to decode an image at, or None if it doesn't fit the budget"""
+    limit = (budget or 0) * DECODE_SHARE
+    if image_format not in JPEG_FORMATS:
+        # Other decoders produce the whole image first, so only its full size counts
+        return 1 if not limit or width * height * 3 <= limit else None
+    long_edge, short_edge = max(width, height), min(width, height)
+    for factor, _ in REDUCED_DECODES:
+        small = width // factor * (height // factor) * 3
+        # The smallest decode that still covers the screen, in either orientation
+        covers = target_size and (long_edge // factor >= max(target_size)
+                                  and short_edge // factor >= min(target_size))
+        if covers and (not limit or small <= limit):
+            return factor
+    if not limit or width * height * 3 <= limit:
+        return 1
+    for factor, _ in reversed(REDUCED_DECODES):
+        if width // factor * (height // factor) * 3 <= limit:
+            return factor
+    return None
+
+def read_image(file_path, target_size=None):
+    """cv2.imread within the budget: reduced when larger than target_size (width, height) or the budget.
+
+    Returns None, like cv2.imread, if the image can't be read or is too large to decode.
+    """
+    try:
+        header = image_size(file_path)
+    except Image.DecompressionBombError as e:
+        logger.warning(f"Skipping {file_path}: {str(e)}")
+        return None
+    if header is None:
+        img = cv2.imread(file_path)  # A format Pillow can't read, leave it to OpenCV
+    else:
+        width, height, image_format = header
+        factor = decode_scale(width, height, image_format, target_size, _budget)
+        if factor is None:
+            logger.warning(f"Skipping {file_path}: {width}x{height} does not fit the "
+                           f"{_budget / 1e6:.0f} MB memory budget")
+            return None
+        flags = dict(REDUCED_DECODES).get(factor, cv2.IMREAD_COLOR)
+        with track('decode'), profiler.span('decode', file_path):
+            img = cv2.imread(file_path, flags)
+    check_pressure()
+    return img
+
+def report():
+    """Peak memory per stage and overall, for the logs"""
+    with _lock:
+        stages = ', '.join(f"{stage} {rss / 1e6:.0f} MB" for stage, rss in sorted(_peaks.items()))
+    peak = peak_rss()
+    summary = f"peak RSS {peak / 1e6:.0f} MB" if peak else "peak RSS unknown"
+    if stages:
+        summary += f" (at the end of {stages})"
+    if _budget:
+        summary += f", budget {_budget / 1e6:.0f} MB"
+    return summary
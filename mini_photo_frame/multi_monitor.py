@@ -0,0 +1,403 @@
+# multi_monitor.py
+# Several monitors driven from one process (OpenCV backend). Each monitor is a
+# Panel with its own selection of photos (a playlist or Drive folder of its own)
+# and its own weighted shuffle, while the sync, download queue, ingest pipeline
+# and composed frames are shared. The next photo for each panel is composed at
+# the panel's native resolution in a thread pool, so panels render in parallel
+# (OpenCV releases the GIL) and changing photos is only a copy to the screen.
+# Composed frames of ingested photos are kept as JPEGs in the cache folder, so
+# a photo is only scaled and cropped for a monitor once.
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import memory_budget
+import profiler
+import storage
+import transitions
+from display_manager import (
+    compose_photo, compose_photo_simple, compose_photo_fill,
+    fit_to_screen, get_monitor_geometries, open_fullscreen, wait_for_key
+)
+from ingest import CACHE_DIR, RENDITION_QUALITY, is_ingested
+from playlists import parse_playlist
+from weighted_sampler import WeightedSampler, update_weights
+
+logger = logging.getLogger(__name__)
+
+FRAME_CACHE_SIZE = 8  # Composed frames kept in memory, shared by panels of the same size
+MAX_SKIPS = 20        # Photos still downloading a panel passes over to find one on disk
+MONITOR_CACHE_DIR = 'monitors'  # Composed frames on disk, in the ingest cache folder
+
+def select_monitors(value, selections=None):
+    """Monitors in the MONITORS setting: 'all', or 1-based numbers such as '1,3'.
+
+    Returns (number, geometry, selection) for each, where selection is the
+    monitor's entry in selections from parse_monitor_selections, if any.
+    """
+    selections = selections or {}
+    monitors = get_monitor_geometries()
+    if not value or str(value).strip().lower() == 'all':
+        numbers = range(1, len(monitors) + 1)
+    else:
+        numbers = []
+        for number in str(value).split(','):
+            if 1 <= int(number) <= len(monitors):
+                numbers.append(int(number))
+            else:
+                logger.warning(f"Monitor {number.strip()} not found, {len(monitors)} attached")
+    return [(number, monitors[number - 1], selections.get(number)) for number in numbers or [1]]
+
+def parse_monitor_selections(config):
+    """Per-monitor photo selections from MONITOR_<n>_PLAYLIST and MONITOR_<n>_FOLDER settings.
+
+    Returns {monitor number: {'playlist': ..., 'folder': ...}}.
+    """
+    selections = {}
+    for key, value in config.items():
+        parts = key.split('_')
+        if len(parts) != 3 or parts[0] != 'MONITOR' or not parts[1].isdigit() or not value:
+            continue
+        selection = selections.setdefault(int(parts[1]), {})
+        if parts[2] == 'PLAYLIST':
+            selection['playlist'] = parse_playlist(value)
+        elif parts[2] == 'FOLDER':
+            selection['folder'] = value.strip().replace('\\', '/').strip('/')
+        else:
+            logger.warning(f"Unknown monitor setting: {key}")
+    return {number: selection for number, selection in selections.items() if any(selection.values())}
+
+def select_photos(paths, selection, resolve_playlist):
+    """The paths a monitor shows, in their original order.
+
+    resolve_playlist(playlist) returns the paths in a date playlist, or None
+    where capture dates aren't known. Returns None if nothing is selected, so
+    the monitor can fall back to all photos.
+    """
+    folder = selection.get('folder')
+    if folder:
+        prefix = folder.lower() + '/'
+        paths = [p for p in paths if p.replace('\\', '/').lower().startswith(prefix)]
+    playlist = selection.get('playlist')
+    if playlist:
+        selected = resolve_playlist(playlist)
+        if selected is None:
+            logger.warning("No capture dates for monitor playlists (they need INGEST=true), ignoring them")
+        else:
+            selected = set(selected)
+            paths = [p for p in paths if p in selected]
+    return paths or None
+
+class FrameCache:
+    """Composed frames by photo, size, mode and rotation, shared by all panels.
+
+    The latest frames are kept in memory, and frames of ingested photos are
+    also written to the cache folder, so later showings only decode a
+    screen-size JPEG.
+    """
+
+    def __init__(self, local_folder, size=FRAME_CACHE_SIZE):
+        self.local_folder = local_folder
+        self.size = size
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+        memory_budget.register_cache('monitor frames', self.clear)
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+
+    def rendition_path(self, key):
+        path, width, height, mode, rotation = key
+        return os.path.join(self.local_folder, CACHE_DIR, MONITOR_CACHE_DIR,
+                            f"{width}x{height}-{mode}-{rotation}", path + '.jpg')
+
+    def _load(self, key):
+        """A composed frame from the cache folder, None if there is none newer than the photo"""
+        rendition_path = self.rendition_path(key)
+        try:
+            if os.path.getmtime(rendition_path) < os.path.getmtime(os.path.join(self.local_folder, key[0])):
+                return None
+        except OSError:
+            return None
+        return cv2.imread(rendition_path)
+
+    def _save(self, key, frame):
+        # Photos not ingested yet are composed without their crop focus and caption, so aren't kept
+        if not is_ingested(os.path.join(self.local_folder, key[0])):
+            return
+        rendition_path = self.rendition_path(key)
+        temp_path = rendition_path + '.tmp.jpg'
+        try:
+            os.makedirs(os.path.dirname(rendition_path), exist_ok=True)
+            if cv2.imwrite(temp_path, frame, [cv2.IMWRITE_JPEG_QUALITY, RENDITION_QUALITY]):
+                os.replace(temp_path, rendition_path)
+                storage.meter.record('monitor renditions', os.path.getsize(rendition_path))
+        except OSError as e:
+            logger.debug(f"Could not keep monitor rendition {rendition_path}: {str(e)}")
+
+    def forget(self, paths, keys):
+        """Remove the kept frames of deleted photos, for each (width, height, mode, rotation) in keys"""
+        for path in paths:
+            for key in keys:
+                try:
+                    os.remove(self.rendition_path((path,) + key))
+                except OSError:
+                    pass
+
+    def get(self, key, compose):
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+                return frame
+        frame = self._load(key)
+        if frame is None:
+            frame = compose()
+            if frame is not None:
+                self._save(key, frame)
+        if frame is not None:
+            with self._lock:
+                self._frames[key] = frame
+                while len(self._frames) > self.size:
+                    self._frames.popitem(last=False)
+        return frame
+
+class Panel:
+    """One monitor: a fullscreen window, its own playlist, and the next frame being composed"""
+
+    def __init__(self, number, geometry, local_folder, settings, cache, pool, selection=None):
+        self.number = number
+        self.x, self.y, self.width, self.height = geometry
+        self.window = f"Photo Frame {number}"
+        self.local_folder = local_folder
+        self.settings = settings
+        self.cache = cache
+        self.pool = pool
+        self.selection = selection or {}  # Playlist and folder this monitor shows
+        self.photos = []  # Photos this monitor shows, from the latest sync
+        self.sampler = WeightedSampler(random.Random())
+        self.upcoming = []  # New photos to show before drawing from the shuffle
+        self.cursor = 0  # Position in photos when shuffle is off
+        self.history = []
+        self.current = None
+        self.next_switch = 0.0
+        self._next = None  # (path, future frame)
+        self._blender = transitions.FrameBlender()
+
+    def open(self):
+        open_fullscreen(self.window, self.x, self.y)
+
+    def _compose(self, path):
+        image_path = os.path.join(self.local_folder, path)
+        mode = self.settings.get('display_mode', 'original')
+        rotation = self.settings.get('rotation', 0)
+        if mode == 'simple':
+            frame = compose_photo_simple(image_path, self.width, self.height, rotation)
+        elif mode == 'original':
+            # Padded out to the panel's aspect ratio, or at least the 3:2 the captioned photos have
+            frame = compose_photo(image_path, max(self.width, self.height * 3 // 2), self.height, rotation)
+        else:
+            # fill, and ken_burns which needs a display process of its own per monitor
+            frame = compose_photo_fill(image_path, self.width, self.height, rotation)
+        if frame is not None and frame.shape[:2] != (self.height, self.width):
+            # 'original' mode frames are 1200 pixels tall whatever the screen
+            frame = fit_to_screen(frame, self.width, self.height)
+        return frame
+
+    def frame_key(self):
+        """What a composed frame depends on besides the photo"""
+        return (self.width, self.height, self.settings.get('display_mode'), self.settings.get('rotation', 0))
+
+    def render(self, path):
+        """Compose a photo for this panel in the pool, reusing a frame another panel of this size made"""
+        return self.pool.submit(self.cache.get, (path,) + self.frame_key(), lambda: self._compose(path))
+
+    def _draw(self, download_queue):
+        """Pick this panel's next photo that is on disk"""
+        found = None
+        waiting = []
+        for _ in range(MAX_SKIPS):
+            if self.upcoming:
+                path = self.upcoming.pop(0)
+            elif self.settings.get('shuffle', True):
+                if not self.sampler.remaining():
+                    self.sampler.reset()
+                path = self.sampler.draw()
+            else:
+                # In sync order, starting over at the end like a single monitor frame
+                if self.cursor >= len(self.photos):
+                    self.cursor = 0
+                path = self.photos[self.cursor] if self.photos else None
+                self.cursor += 1
+            if path is None:
+                break
+            if os.path.exists(os.path.join(self.local_folder, path)):
+                found = path
+                break
+            if path not in waiting and download_queue is not None and download_queue.is_pending(path):
+                waiting.append(path)
+        if waiting:
+            # Put them back at the front of the line for the next round
+            download_queue.reprioritize(waiting)
+            self.upcoming[:0] = waiting
+        return found
+
+    def prefetch(self, download_queue=None, path=None):
+        """Start composing the photo this panel shows next"""
+        path = path or self._draw(download_queue)
+        self._next = (path, self.render(path)) if path else None
+
+    def show_next(self, download_queue=None):
+        """Switch to the prefetched photo. Returns the action of a key pressed during the transition."""
+        if self._next is None:
+            self.prefetch(download_queue)
+        action = None
+        if self._next is not None:
+            path, future = self._next
+            frame = future.result()
+            if frame is not None:
+                print(f"Monitor {self.number}: {path}")
+                if self.current:
+                    self.history = (self.history + [self.current])[-50:]
+                self.current = path
+                self.sampler.take(path)
+                action = self._present(frame)
+        self.next_switch = time.monotonic() + self.settings['display_interval']
+        self.prefetch(download_queue)
+        return action
+
+    def back(self, download_queue=None):
+        """Show the previous photo again, and come back to the current one after it"""
+        if not self.history:
+            return None
+        previous = self.history.pop()
+        if self.current:
+            self.upcoming.insert(0, self.current)
+        self.current = None
+        self.prefetch(download_queue, previous)
+        return self.show_next(download_queue)
+
+    def blank(self):
+        self._blender.forget()
+        cv2.imshow(self.window, np.zeros((self.height, self.width, 3), dtype=np.uint8))
+
+    def _present(self, frame):
+        engine = transitions.get_engine()
+        action = None
+        with profiler.span('present', self.window):
+            if engine:
+                action = self._blender.transition(engine, frame, lambda f: cv2.imshow(self.window, f), wait_for_key)
+                self._blender.remember(frame)
+            cv2.imshow(self.window, frame)
+        return action
+
+class PanelWall:
+    """All panels, fed from one sync"""
+
+    def __init__(self, monitors, local_folder, settings, download_queue=None, resolve_playlist=None):
+        """monitors are (number, geometry, selection) from select_monitors.
+
+        resolve_playlist(playlist) returns the paths in a date playlist, for
+        monitors with a playlist of their own.
+        """
+        self.download_queue = download_queue
+        self.resolve_playlist = resolve_playlist or (lambda playlist: None)
+        self.cache = FrameCache(local_folder, max(FRAME_CACHE_SIZE, 2 * len(monitors)))
+        # One composing thread per panel
+        self.pool = ThreadPoolExecutor(max_workers=len(monitors), thread_name_prefix="panel-render")
+        self.panels = [Panel(number, geometry, local_folder, settings, self.cache, self.pool, selection)
+                       for number, geometry, selection in monitors]
+        self._all_photos = []
+        self._next_new = 0
+        for panel in self.panels:
+            panel.open()
+            logger.info(f"Monitor {panel.number}: {panel.width}x{panel.height} at {panel.x},{panel.y}"
+                        + (f", showing {panel.selection}" if panel.selection else ""))
+
+    def update(self, all_photos, new_photos, settings, reset=False):
+        """Apply a sync result. New photos are dealt round-robin to the panels that show them, so each shows once, soon."""
+        for panel in self.panels:
+            photos = all_photos
+            if panel.selection:
+                photos = select_photos(all_photos, panel.selection, self.resolve_playlist)
+                if photos is None:
+                    logger.info(f"No photos for monitor {panel.number} in {panel.selection}, showing all photos")
+                    photos = all_photos
+            if reset:
+                panel.sampler = WeightedSampler(random.Random())
+                panel.upcoming = []
+                panel.cursor = 0
+            elif panel.cursor and photos is not panel.photos:
+                # Carry on after the same photo in the new order
+                last = panel.photos[panel.cursor - 1] if panel.cursor <= len(panel.photos) else None
+                panel.cursor = photos.index(last) + 1 if last in photos else 0
+            update_weights(panel.sampler, photos, settings, [] if reset else panel.photos)
+            panel.photos = photos
+        for path in new_photos:
+            showing = [panel for panel in self.panels if panel.photos is all_photos or path in panel.sampler]
+            if showing:
+                showing[self._next_new % len(showing)].upcoming.append(path)
+                self._next_new += 1
+        removed = set(self._all_photos) - set(all_photos)
+        if removed:
+            self.cache.forget(removed, {panel.frame_key() for panel in self.panels})
+        self._all_photos = all_photos
+        if self.download_queue is not None:
+            upcoming = [p for panel in self.panels for p in panel.upcoming[:2]]
+            self.download_queue.reprioritize(upcoming)
+
+    def start(self, display_interval):
+        """Show a first photo everywhere, then stagger the panels so they don't all change at once"""
+        for panel in self.panels:
+            panel.prefetch(self.download_queue)
+        for i, panel in enumerate(self.panels):
+            panel.show_next(self.download_queue)
+            panel.next_switch += display_interval * i / len(self.panels)
+
+    def step(self, scheduler):
+        """Change the photos that are due, then wait for the next one or a key. Returns a key's action or None."""
+        for panel in self.panels:
+            if time.monotonic() >= panel.next_switch:
+                action = panel.show_next(self.download_queue)
+                if action:
+                    return action
+        keys = []
+
+        def wait(timeout):
+            action = wait_for_key(timeout)
+            if action:
+                keys.append(action)
+            return action
+
+        next_switch = min(panel.next_switch for panel in self.panels)
+        scheduler.wait(max(0.0, next_switch - time.monotonic()), wait)
+        return keys[-1] if keys else None
+
+    def advance(self):
+        for panel in self.panels:
+            panel.next_switch = 0.0
+
+    def back(self):
+        for panel in self.panels:
+            panel.back(self.download_queue)
+
+    def reshuffle(self):
+        for panel in self.panels:
+            panel.sampler.reset()
+            panel.prefetch(self.download_queue)
+            panel.next_switch = 0.0
+
+    def blank(self, duration, scheduler):
+        """Blank every monitor for quiet hours. Returns the action of a key pressed meanwhile."""
+        for panel in self.panels:
+            panel.blank()
+        return scheduler.wait(duration, wait_for_key)
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
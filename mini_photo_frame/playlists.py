@@ -0,0 +1,128 @@
+# playlists.py
+import bisect
+import re
+from datetime import date, datetime
+
+ON_THIS_DAY = 'on_this_day'
+THIS_MONTH = 'this_month'
+
+# 20240101-20241231 (config.txt) or 20240101_20241231 (dates_ settings folder name)
+DATE_RANGE_PATTERN = re.compile(r'^(\d{8})[-_](\d{8})$')
+
+def parse_playlist(value):
+    """Parse a playlist setting into on_this_day, this_month or a 'YYYYMMDD-YYYYMMDD' range.
+
+    Returns None for an empty value or 'all' (every photo).
+    """
+    if not value or value.strip().lower() in ('all', 'off', 'none'):
+        return None
+    value = value.strip().lower()
+    if value.replace('-', '_') in (ON_THIS_DAY, THIS_MONTH):
+        return value.replace('-', '_')
+    match = DATE_RANGE_PATTERN.match(value)
+    if not match:
+        raise ValueError(f"Invalid playlist '{value}', expected all, on_this_day, this_month "
+                         f"or a date range such as 20240101-20241231")
+    start, end = match.groups()
+    for day in (start, end):
+        datetime.strptime(day, '%Y%m%d')  # Raises ValueError for impossible dates
+    if start > end:
+        start, end = end, start
+    return f"{start}-{end}"
+
+def to_folder_name(playlist):
+    """Settings folder name for a playlist, e.g. playlist_on_this_day or dates_20240101_20241231"""
+    if not playlist:
+        return 'playlist_all'
+    if DATE_RANGE_PATTERN.match(playlist):
+        return 'dates_' + playlist.replace('-', '_')
+    return 'playlist_' + playlist
+
+def capture_date(exif_date):
+    """Turn an EXIF ('2024:07:14 18:03:22'), IPTC ('20240714') or Drive
+    ('2024-07-14T18:03:22.000Z') date into yyyymmdd, None if it isn't one"""
+    digits = re.sub(r'\D', '', str(exif_date or ''))[:8]
+    if len(digits) != 8 or digits.startswith('0000'):
+        return None
+    try:
+        datetime.strptime(digits, '%Y%m%d')
+    except ValueError:
+        return None
+    return digits
+
+class DateIndex:
+    """Photos sorted by capture date, and by month and day, so playlists resolve with bisect"""
+
+    def __init__(self, dates):
+        """dates maps photo path -> yyyymmdd capture date"""
+        by_date = sorted((day, path) for path, day in dates.items())
+        self._dates = [day for day, _ in by_date]
+        self._date_paths = [path for _, path in by_date]
+        by_day = sorted((day[4:], day, path) for path, day in dates.items())
+        self._days = [mmdd for mmdd, _, _ in by_day]
+        self._day_years = [day[:4] for _, day, _ in by_day]
+        self._day_paths = [path for _, _, path in by_day]
+
+    def __len__(self):
+        return len(self._dates)
+
+    def between(self, start, end):
+        """Photos taken from start to end, both yyyymmdd and inclusive"""
+        lo = bisect.bisect_left(self._dates, start)
+        hi = bisect.bisect_right(self._dates, end)
+        return self._date_paths[lo:hi]
+
+    def on_day(self, mmdd, before_year=None):
+        """Photos taken on this month and day in any year, optionally only before a year"""
+        lo = bisect.bisect_left(self._days, mmdd)
+        hi = bisect.bisect_right(self._days, mmdd)
+        if before_year is None:
+            return self._day_paths[lo:hi]
+        return [path for path, year in zip(self._day_paths[lo:hi], self._day_years[lo:hi]) if year < before_year]
+
+    def in_month(self, mm):
+        """Photos taken in this month in any year"""
+        lo = bisect.bisect_left(self._days, mm + '00')
+        hi = bisect.bisect_right(self._days, mm + '99')
+        return self._day_paths[lo:hi]
+
+    def resolve(self, playlist, today=None):
+        """Paths in a playlist as returned by parse_playlist"""
+        today = (today or date.today()).strftime('%Y%m%d')
+        if playlist == ON_THIS_DAY:
+            # Past years only, photos taken today are new uploads that are shown first anyway
+            return self.on_day(today[4:], before_year=today[:4])
+        if playlist == THIS_MONTH:
+            return self.in_month(today[4:6])
+        start, end = playlist.split('-')
+        return self.between(start, end)
+
+def select_playlist(index, playlist, paths, today=None):
+    """Keep the paths in a playlist, in their original order.
+
+    Returns None if no photo is in it, so the caller can fall back to all photos.
+    """
+    selected = set(index.resolve(playlist, today))
+    matches = [p for p in paths if p in selected]
+    return matches or None
+
+def benchmark(count=100_000, rounds=20):
+    """Time building the index and resolving each kind of playlist for count photos"""
+    import random
+    import time
+    rng = random.Random(1)
+    dates = {f'photo_{i:06d}.jpg': f'{rng.randint(2000, 2024)}{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}'
+             for i in range(count)}
+    paths = list(dates)
+    start = time.perf_counter()
+    index = DateIndex(dates)
+    print(f"{count} photos: index built in {(time.perf_counter() - start) * 1000:.0f} ms")
+    for playlist in (ON_THIS_DAY, THIS_MONTH, '20190101-20191231'):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            selected = select_playlist(index, playlist, paths)
+        elapsed = (time.perf_counter() - start) / rounds
+        print(f"{playlist}: {len(selected or [])} photos in {elapsed * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    benchmark()
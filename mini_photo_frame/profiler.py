@@ -0,0 +1,220 @@
+# profiler.py
+# Profiling a frame in the field without restarting it. Sending SIGUSR1 to a
+# running frame (or running `photo_frame profile`) starts a time-boxed session:
+# a sampler thread records the stack of every thread SAMPLE_RATE times a second
+# and, when the session ends, writes a pstats file (python -m pstats, snakeviz)
+# and a Chrome trace (chrome://tracing or ui.perfetto.dev) of the most recent
+# spans: listing, downloads, decodes and presents. Spans go into a fixed size
+# ring buffer for a microsecond or two each; nothing else runs until a session
+# is started.
+import atexit
+import collections
+import json
+import logging
+import marshal
+import os
+import signal
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SECONDS = 60    # Length of a profiling session
+SAMPLE_RATE = 100       # Stack samples per second while a session runs
+SPAN_BUFFER = 4096      # Most recent spans kept for the trace
+PID_FILE = 'photo_frame.pid'  # In the profile folder, read by `photo_frame profile`
+
+_spans = collections.deque(maxlen=SPAN_BUFFER)  # (name, detail, start ns, duration ns, thread id)
+_thread_names = {}  # Thread id -> name, kept for threads that have finished by the time of the trace
+_config = {'dir': 'profiles', 'seconds': DEFAULT_SECONDS, 'name': 'photo_frame', 'on_start': None}
+_session = None
+_lock = threading.Lock()
+
+@contextmanager
+def span(name, detail=None):
+    """Record how long the block takes in the trace ring buffer, e.g. span('decode', path)"""
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        ident = threading.get_ident()
+        if ident not in _thread_names:
+            _thread_names[ident] = threading.current_thread().name
+        # deque.append is atomic, so no lock on the hot path
+        _spans.append((name, detail, start, time.perf_counter_ns() - start, ident))
+
+class StackSampler:
+    """Samples every thread's stack and adds the samples up into pstats form"""
+
+    def __init__(self, rate=SAMPLE_RATE):
+        self.interval = 1 / rate
+        self.samples = 0
+        self._own = collections.Counter()      # function -> samples it was running in
+        self._total = collections.Counter()    # function -> samples it was on the stack in
+        self._callers = collections.Counter()  # (caller, function) -> samples
+
+    def sample(self):
+        me = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            callee = None
+            seen = set()
+            while frame is not None:
+                code = frame.f_code
+                func = (code.co_filename, code.co_firstlineno, code.co_name)
+                if callee is None:
+                    self._own[func] += 1
+                else:
+                    self._callers[(func, callee)] += 1
+                if func not in seen:  # Recursion counts once per sample
+                    seen.add(func)
+                    self._total[func] += 1
+                callee = func
+                frame = frame.f_back
+        self.samples += 1
+
+    def run(self, until, stop):
+        while not stop.wait(self.interval) and time.monotonic() < until:
+            self.sample()
+
+    def stats(self):
+        """The samples as pstats data: sample counts stand in for calls, seconds of samples for times"""
+        callers = collections.defaultdict(dict)
+        for (caller, func), count in self._callers.items():
+            callers[func][caller] = (count, count, count * self.interval, count * self.interval)
+        return {func: (count, count, self._own[func] * self.interval, count * self.interval, callers[func])
+                for func, count in self._total.items()}
+
+    def dump_stats(self, file_path):
+        """Write a file pstats.Stats can load, like cProfile.Profile.dump_stats"""
+        with open(file_path, 'wb') as f:
+            marshal.dump(self.stats(), f)
+
+def trace_events(spans, pid=None):
+    """Chrome trace events (complete events in microseconds) for spans, with thread names"""
+    pid = pid or os.getpid()
+    names = dict(_thread_names)
+    names.update((thread.ident, thread.name) for thread in threading.enumerate())
+    events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': _config['name']}}]
+    for ident in sorted({s[4] for s in spans}):
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': ident,
+                       'args': {'name': names.get(ident, f"thread {ident}")}})
+    for name, detail, start, duration, ident in spans:
+        event = {'name': name, 'cat': 'frame', 'ph': 'X', 'pid': pid, 'tid': ident,
+                 'ts': start / 1000, 'dur': duration / 1000}
+        if detail is not None:
+            event['args'] = {'detail': str(detail)}
+        events.append(event)
+    return events
+
+class Session:
+    """One profiling session, run by its own thread"""
+
+    def __init__(self, seconds, directory):
+        self.seconds = seconds
+        self.directory = directory
+        self.sampler = StackSampler()
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        global _session
+        started = time.perf_counter_ns()
+        try:
+            self.sampler.run(time.monotonic() + self.seconds, self._stop)
+            _spans.append(('profile', f"{self.sampler.samples} samples", started,
+                           time.perf_counter_ns() - started, threading.get_ident()))
+            self.write()
+        except Exception as e:
+            logger.error(f"Profiling failed: {str(e)}")
+        finally:
+            with _lock:
+                _session = None
+
+    def write(self):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f"{_config['name']}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+        self.sampler.dump_stats(base + '.pstats')
+        with open(base + '.trace.json', 'w') as f:
+            json.dump({'traceEvents': trace_events(list(_spans)), 'displayTimeUnit': 'ms'}, f)
+        logger.info(f"Profile written: {base}.pstats ({self.sampler.samples} samples) and {base}.trace.json")
+
+def start_session(seconds=None):
+    """Profile for seconds (PROFILE_SECS by default) in the background. False if a session is running."""
+    global _session
+    with _lock:
+        if _session is not None:
+            return False
+        session = _session = Session(seconds or _config['seconds'], _config['dir'])
+    logger.info(f"Profiling for {session.seconds:.0f} seconds")
+    session.thread.start()
+    if _config['on_start']:
+        _config['on_start']()
+    return True
+
+def stop_session():
+    """End a running session early, still writing its files"""
+    session = _session
+    if session is not None:
+        session.stop()
+        session.thread.join()
+
+def on_start(callback):
+    """Have callback() run whenever a session starts, e.g. to signal the sync process too"""
+    _config['on_start'] = callback
+
+def _wait_for_signals():
+    while True:
+        signal.sigwait({signal.SIGUSR1})
+        start_session()
+
+def install(directory, seconds=DEFAULT_SECONDS, name='photo_frame', pid_file=False):
+    """Start a session on SIGUSR1, writing to directory. Call from the main thread before starting threads.
+
+    SIGUSR1 is blocked and waited for by a thread of its own, so a session starts
+    right away even while the main thread is blocked in a C call such as
+    cv2.waitKey. Threads started afterwards inherit the block. With pid_file,
+    this process's ID is written where `photo_frame profile` finds it.
+    """
+    _config.update(dir=directory, seconds=seconds, name=name)
+    if not hasattr(signal, 'SIGUSR1'):
+        logger.debug("No SIGUSR1 on this platform, profiling can't be started from outside")
+        return
+    # Also handled the usual way, in case a thread that started earlier gets the signal
+    signal.signal(signal.SIGUSR1, lambda signum, frame: start_session())
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGUSR1})
+    threading.Thread(target=_wait_for_signals, name="profiler-signal", daemon=True).start()
+    if pid_file:
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, PID_FILE), 'w') as f:
+                f.write(str(os.getpid()))
+            atexit.register(_remove_pid_file, os.path.join(directory, PID_FILE))
+        except OSError as e:
+            logger.warning(f"Could not write {PID_FILE} to {directory}: {str(e)}")
+
+def _remove_pid_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def main(config):
+    """photo_frame profile: start a profiling session in the running frame"""
+    pid_path = os.path.join(config['PROFILE_DIR'], PID_FILE)
+    try:
+        with open(pid_path, 'r') as f:
+            pid = int(f.read().strip())
+        os.kill(pid, signal.SIGUSR1)
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"\nCould not signal the running frame using {pid_path}: {str(e)}")
+        return 1
+    print(f"Profiling frame {pid} for {config['PROFILE_SECS']} seconds. "
+          f"The pstats and trace files will be written to {config['PROFILE_DIR']}")
+    return 0
@@ -0,0 +1,56 @@
+# quiet_hours.py
+import re
+from datetime import datetime, timedelta
+
+# 23:00-07:00 (config.txt) or 2300_0700 (settings folder name)
+QUIET_HOURS_PATTERN = re.compile(r'^(\d{1,2}):?(\d{2})[-_](\d{1,2}):?(\d{2})$')
+
+def parse_quiet_hours(value):
+    """Parse a quiet hours window into a normalized 'HH:MM-HH:MM' string.
+
+    Accepts '23:00-07:00' as used in config.txt and '2300_0700' as used in
+    settings folder names. Returns None for an empty value or 'off'.
+    """
+    if not value or value.strip().lower() in ('off', 'none', 'false'):
+        return None
+    match = QUIET_HOURS_PATTERN.match(value.strip())
+    if not match:
+        raise ValueError(f"Invalid quiet hours '{value}', expected e.g. 23:00-07:00")
+    start_hour, start_minute, end_hour, end_minute = (int(g) for g in match.groups())
+    if start_hour > 23 or end_hour > 23 or start_minute > 59 or end_minute > 59:
+        raise ValueError(f"Invalid quiet hours '{value}', hours must be 0-23 and minutes 0-59")
+    return f"{start_hour:02d}:{start_minute:02d}-{end_hour:02d}:{end_minute:02d}"
+
+def to_folder_name(window):
+    """Settings folder name for a quiet hours window, e.g. quiet_hours_2300_0700"""
+    if not window:
+        return 'quiet_hours_off'
+    return 'quiet_hours_' + window.replace(':', '').replace('-', '_')
+
+def _window_minutes(window):
+    start, end = window.split('-')
+    start_hour, start_minute = start.split(':')
+    end_hour, end_minute = end.split(':')
+    return int(start_hour) * 60 + int(start_minute), int(end_hour) * 60 + int(end_minute)
+
+def is_quiet(window, now=None):
+    """Check if now falls inside the quiet hours window. Windows may span midnight."""
+    if not window:
+        return False
+    now = now or datetime.now()
+    start, end = _window_minutes(window)
+    minute = now.hour * 60 + now.minute
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end
+
+def seconds_until_wake(window, now=None):
+    """Seconds until the current quiet period ends (0 if it is not quiet now)"""
+    if not is_quiet(window, now):
+        return 0
+    now = now or datetime.now()
+    _, end = _window_minutes(window)
+    wake = now.replace(hour=end // 60, minute=end % 60, second=0, microsecond=0)
+    if wake <= now:
+        wake += timedelta(days=1)
+    return (wake - now).total_seconds()
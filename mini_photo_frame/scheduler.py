@@ -0,0 +1,110 @@
+# scheduler.py
+import heapq
+import itertools
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class IdleScheduler:
+    """Single timer heap for the frame's periodic work, plus a blocking input wait.
+
+    Instead of polling, the display blocks on input until the earliest of the
+    photo deadline and the next timer (sync, settings check, ...), runs the
+    timers that are due and goes back to sleep. Every return from a blocking
+    wait counts as a wakeup, so wakeups_per_hour() shows how idle the frame is.
+    """
+
+    def __init__(self):
+        self._heap = []      # (deadline, seq, name); stale entries are skipped
+        self._timers = {}    # name -> (deadline, seq, callback, interval)
+        self._seq = itertools.count()
+        self.wakeups = 0
+        self._started = time.monotonic()
+
+    def every(self, name, interval, callback, delay=None):
+        """Run callback every interval seconds (a number or a function returning one).
+
+        The first run is after delay seconds, or after one interval if not given.
+        """
+        self._arm(name, callback, interval, self._interval(interval) if delay is None else delay)
+
+    def once(self, name, delay, callback):
+        """Run callback once, delay seconds from now"""
+        self._arm(name, callback, None, delay)
+
+    def reschedule(self, name, delay):
+        """Move an existing timer so it fires delay seconds from now"""
+        if name in self._timers:
+            _, _, callback, interval = self._timers[name]
+            self._arm(name, callback, interval, delay)
+
+    def cancel(self, name):
+        self._timers.pop(name, None)
+
+    def has_timer(self, name):
+        return name in self._timers
+
+    def next_deadline(self):
+        """Monotonic time of the next timer, or None if there are none"""
+        while self._heap:
+            deadline, seq, name = self._heap[0]
+            timer = self._timers.get(name)
+            if timer and timer[1] == seq:
+                return deadline
+            heapq.heappop(self._heap)
+        return None
+
+    def run_due(self):
+        """Run every timer whose deadline has passed"""
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > time.monotonic():
+                return
+            _, _, name = heapq.heappop(self._heap)
+            _, _, callback, interval = self._timers.pop(name)
+            if interval is not None:
+                # Re-arm before running so the callback can reschedule or cancel itself
+                self._arm(name, callback, interval, self._interval(interval))
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Scheduled task '{name}' failed: {str(e)}")
+
+    def wait(self, duration, wait_for_input):
+        """Wait up to duration seconds for an input action, running timers as they come due.
+
+        wait_for_input(timeout) blocks for at most timeout seconds and returns an
+        action string, or None if there was no input. Returns the action, or
+        "next" once duration has passed.
+        """
+        until = time.monotonic() + duration
+        while True:
+            self.run_due()
+            now = time.monotonic()
+            if now >= until:
+                return "next"
+            deadline = self.next_deadline()
+            timeout = until - now if deadline is None else min(until, deadline) - now
+            action = wait_for_input(max(0, timeout))
+            self.wakeups += 1
+            if action:
+                return action
+
+    def wakeups_per_hour(self):
+        hours = (time.monotonic() - self._started) / 3600
+        return self.wakeups / hours if hours > 0 else 0.0
+
+    def reset_metrics(self):
+        self.wakeups = 0
+        self._started = time.monotonic()
+
+    @staticmethod
+    def _interval(interval):
+        return interval() if callable(interval) else interval
+
+    def _arm(self, name, callback, interval, delay):
+        seq = next(self._seq)
+        deadline = time.monotonic() + max(0, delay)
+        self._timers[name] = (deadline, seq, callback, interval)
+        heapq.heappush(self._heap, (deadline, seq, name))
@@ -0,0 +1,101 @@
+# smart_crop.py
+# Cropping photos to the screen's aspect ratio around what matters in them.
+# Ingest finds the most salient region once per photo (faces if OpenCV's face
+# detector is available, otherwise spectral residual saliency) and stores it
+# as fractions of the upright photo. Showing a photo in fill mode then only
+# computes a rectangle from it, slices and resizes.
+import logging
+import os
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SALIENCY_SIZE = 64       # Saliency is computed on a thumbnail this size
+SALIENCY_THRESHOLD = 3   # Pixels this many times the mean saliency belong to the region
+FACE_DETECT_WIDTH = 480  # Faces are searched for at this width
+
+_face_detector = None
+
+def get_face_detector():
+    """OpenCV's frontal face cascade, or False if this OpenCV build doesn't ship it"""
+    global _face_detector
+    if _face_detector is None:
+        _face_detector = False
+        data = getattr(cv2, 'data', None)
+        path = os.path.join(data.haarcascades, 'haarcascade_frontalface_default.xml') if data else ''
+        if os.path.exists(path):
+            _face_detector = cv2.CascadeClassifier(path)
+    return _face_detector
+
+def find_faces(gray):
+    """Bounding box around all faces as fractions (x0, y0, x1, y1), None if there are none"""
+    detector = get_face_detector()
+    if not detector:
+        return None
+    height, width = gray.shape
+    scale = min(1.0, FACE_DETECT_WIDTH / width)
+    small = cv2.resize(gray, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    faces = detector.detectMultiScale(small, scaleFactor=1.1, minNeighbors=5, minSize=(24, 24))
+    if len(faces) == 0:
+        return None
+    x0 = min(x for x, _, _, _ in faces)
+    y0 = min(y for _, y, _, _ in faces)
+    x1 = max(x + w for x, _, w, _ in faces)
+    y1 = max(y + h for _, y, _, h in faces)
+    return (x0 / small.shape[1], y0 / small.shape[0], x1 / small.shape[1], y1 / small.shape[0])
+
+def find_salient(gray):
+    """Bounding box of the salient region as fractions (x0, y0, x1, y1), by spectral residual.
+
+    The same method as OpenCV contrib's StaticSaliencySpectralResidual: what
+    stands out is what the log amplitude spectrum has beyond its local average.
+    """
+    small = cv2.resize(gray, (SALIENCY_SIZE, SALIENCY_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+    spectrum = np.fft.fft2(small)
+    log_amplitude = np.log(np.abs(spectrum) + 1e-6).astype(np.float32)
+    residual = log_amplitude - cv2.blur(log_amplitude, (3, 3))
+    saliency = np.abs(np.fft.ifft2(np.exp(residual + 1j * np.angle(spectrum)))) ** 2
+    saliency = cv2.GaussianBlur(saliency.astype(np.float32), (9, 9), 2.5)
+    ys, xs = np.nonzero(saliency > saliency.mean() * SALIENCY_THRESHOLD)
+    if len(xs) == 0:
+        return (0.0, 0.0, 1.0, 1.0)
+    return (xs.min() / SALIENCY_SIZE, ys.min() / SALIENCY_SIZE,
+            (xs.max() + 1) / SALIENCY_SIZE, (ys.max() + 1) / SALIENCY_SIZE)
+
+def find_focus(img):
+    """Region to keep when cropping an upright RGB or BGR image, as rounded fractions"""
+    gray = cv2.cvtColor(np.asarray(img), cv2.COLOR_RGB2GRAY)
+    focus = find_faces(gray) or find_salient(gray)
+    return [round(float(value), 3) for value in focus]
+
+def rotate_focus(focus, rotation):
+    """The focus region of a photo after rotating it clockwise by 0, 90, 180 or 270 degrees"""
+    x0, y0, x1, y1 = focus
+    if rotation == 90:
+        return (1 - y1, x0, 1 - y0, x1)
+    if rotation == 180:
+        return (1 - x1, 1 - y1, 1 - x0, 1 - y0)
+    if rotation == 270:
+        return (y0, 1 - x1, y1, 1 - x0)
+    return focus
+
+def crop_rect(width, height, aspect, focus=None):
+    """Largest (x, y, w, h) of the given aspect ratio in a width x height image, centered on focus"""
+    if width / height > aspect:
+        crop_width, crop_height = max(1, round(height * aspect)), height
+    else:
+        crop_width, crop_height = width, max(1, round(width / aspect))
+    x0, y0, x1, y1 = focus or (0.0, 0.0, 1.0, 1.0)
+    center_x = (x0 + x1) / 2 * width
+    center_y = (y0 + y1) / 2 * height
+    x = min(max(0, round(center_x - crop_width / 2)), width - crop_width)
+    y = min(max(0, round(center_y - crop_height / 2)), height - crop_height)
+    return x, y, crop_width, crop_height
+
+def fill(img, width, height, focus=None):
+    """Crop an image to width x height's aspect ratio around focus and scale it to that size"""
+    x, y, crop_width, crop_height = crop_rect(img.shape[1], img.shape[0], width / height, focus)
+    crop = img[y:y + crop_height, x:x + crop_width]
+    interpolation = cv2.INTER_AREA if crop_width > width else cv2.INTER_LINEAR
+    return cv2.resize(crop, (width, height), interpolation=interpolation)
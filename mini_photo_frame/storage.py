@@ -0,0 +1,147 @@
+# storage.py
+# How the frame writes to its own storage. STORAGE_MODE=sd_card is for frames
+# running from an SD card that should be written to as little as possible:
+# the photo index is written out on a timer (and at shutdown) instead of after
+# every batch, and downloads are streamed into tmpfs and only copied onto the
+# card once complete. Either way the frame counts what it writes, so the bytes
+# written per day can be compared between modes.
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+NORMAL = 'normal'
+SD_CARD = 'sd_card'
+MODES = (NORMAL, SD_CARD)
+
+DEFAULT_TEMP_DIR = '/dev/shm'          # tmpfs on Raspberry Pi OS and most Linux systems
+DEFAULT_TEMP_LIMIT = 64 * 1024 * 1024  # Most bytes of downloads held in tmpfs at once
+DEFAULT_FLUSH_INTERVAL = 15 * 60       # Seconds between photo index writes in sd_card mode
+TEMP_RESERVE = 16 * 1024 * 1024        # Free tmpfs space always left for the rest of the system
+
+_config = {'mode': NORMAL, 'temp_dir': None, 'temp_limit': DEFAULT_TEMP_LIMIT,
+           'flush_interval': DEFAULT_FLUSH_INTERVAL}
+_temp_lock = threading.Lock()
+_temp_in_use = 0
+
+def configure(mode=NORMAL, temp_dir=DEFAULT_TEMP_DIR, temp_limit=DEFAULT_TEMP_LIMIT,
+              flush_interval=DEFAULT_FLUSH_INTERVAL):
+    mode = (mode or NORMAL).lower()
+    if mode not in MODES:
+        raise ValueError(f"Unknown storage mode '{mode}', expected one of {', '.join(MODES)}")
+    if mode == SD_CARD and temp_dir and not os.path.isdir(temp_dir):
+        logger.warning(f"Temporary folder {temp_dir} not found, downloads are written straight to the card")
+        temp_dir = None
+    _config.update(mode=mode, temp_dir=temp_dir if mode == SD_CARD else None,
+                   temp_limit=temp_limit, flush_interval=flush_interval)
+
+def is_sd_card():
+    return _config['mode'] == SD_CARD
+
+def flush_interval(default):
+    """Seconds between writes of batched state: default normally, much longer in sd_card mode"""
+    return _config['flush_interval'] if is_sd_card() else default
+
+class TempFile:
+    """A download in progress in tmpfs, within the size guard. Use reserve() to get one."""
+
+    def __init__(self, size):
+        fd, self.path = tempfile.mkstemp(prefix='photo_frame-', suffix='.part', dir=_config['temp_dir'])
+        os.close(fd)
+        self.size = size
+
+    def move_to(self, file_path):
+        """Copy the finished download onto the card in one go, under a dot name, and rename it into place"""
+        directory, name = os.path.split(file_path)
+        temp_path = os.path.join(directory, '.' + name + '.part')
+        shutil.copyfile(self.path, temp_path)
+        os.replace(temp_path, file_path)
+        meter.record('photos', os.path.getsize(file_path))
+
+    def release(self):
+        global _temp_in_use
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        with _temp_lock:
+            _temp_in_use -= self.size
+
+def reserve(size):
+    """A TempFile for a download of size bytes, or None to download straight to the card.
+
+    None outside sd_card mode, when the size isn't known, or when it would go
+    over TEMP_LIMIT or leave too little free memory in tmpfs.
+    """
+    global _temp_in_use
+    if not _config['temp_dir'] or not size:
+        return None
+    size = int(size)
+    with _temp_lock:
+        if _temp_in_use + size > _config['temp_limit']:
+            return None
+        try:
+            if shutil.disk_usage(_config['temp_dir']).free - size < TEMP_RESERVE:
+                return None
+        except OSError:
+            return None
+        _temp_in_use += size
+    try:
+        return TempFile(size)
+    except OSError as e:
+        logger.warning(f"Could not create a temporary file in {_config['temp_dir']}: {str(e)}")
+        with _temp_lock:
+            _temp_in_use -= size
+        return None
+
+def read_kernel_write_bytes():
+    """Bytes this process has caused to be written to storage, from /proc (Linux only), or None"""
+    try:
+        with open('/proc/self/io', 'r') as f:
+            for line in f:
+                if line.startswith('write_bytes:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+class WriteMeter:
+    """Counts the bytes the frame writes to storage, by kind, to report a daily rate"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.monotonic()
+            self.bytes = {}
+            self.kernel_start = read_kernel_write_bytes()
+
+    def record(self, kind, nbytes):
+        with self._lock:
+            self.bytes[kind] = self.bytes.get(kind, 0) + nbytes
+
+    def per_day(self):
+        """Bytes per day for each kind of write since the last reset"""
+        with self._lock:
+            days = max(time.monotonic() - self.started, 1.0) / 86400
+            return {kind: nbytes / days for kind, nbytes in self.bytes.items()}
+
+    def report(self):
+        rates = self.per_day()
+        total = sum(rates.values())
+        kinds = ', '.join(f"{kind} {rate / 1e6:.1f}" for kind, rate in sorted(rates.items()))
+        summary = f"{total / 1e6:.1f} MB/day ({kinds or 'nothing written'}) in {_config['mode']} mode"
+        kernel = read_kernel_write_bytes()
+        if kernel is not None and self.kernel_start is not None:
+            days = max(time.monotonic() - self.started, 1.0) / 86400
+            summary += f", {(kernel - self.kernel_start) / 1e6 / days:.1f} MB/day by the kernel's count"
+        return summary
+
+# Shared by everything that writes in this process
+meter = WriteMeter()
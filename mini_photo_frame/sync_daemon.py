@@ -0,0 +1,549 @@
+# sync_daemon.py
+# Split process mode: a sync process does all the Drive work (listing, downloads,
+# settings, hub serving) and renders upcoming photos into shared memory, while the
+# display process only shows frames. The display talks to the sync process over a
+# Unix socket and restarts it if it dies or stops answering.
+import collections
+import json
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import profiler
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = 5
+REQUEST_TIMEOUT = 600     # A first sync of a large folder can take minutes
+STARTUP_TIMEOUT = 120     # Time for the sync process to authenticate and start listening
+HEARTBEAT_INTERVAL = 30
+HEARTBEAT_TIMEOUT = 10
+HEARTBEAT_FAILURES = 3    # Missed heartbeats before a hung sync process is restarted
+MAX_RESTART_DELAY = 60
+RENDERED_FRAMES = 4       # Rendered frames kept in shared memory
+RENDER_AHEAD = 2          # Upcoming photos rendered while the current one shows
+
+def is_supported():
+    """Split mode needs Unix domain sockets"""
+    return hasattr(socket, 'AF_UNIX')
+
+def default_socket_path():
+    return os.path.join(tempfile.gettempdir(), f'photo_frame_sync_{os.getpid()}.sock')
+
+def send_message(sock_file, message):
+    sock_file.write(json.dumps(message).encode('utf-8') + b'\n')
+    sock_file.flush()
+
+def read_message(sock_file):
+    line = sock_file.readline()
+    if not line:
+        raise ConnectionError("Connection closed")
+    return json.loads(line.decode('utf-8'))
+
+class SyncDaemonUnavailable(OSError):
+    """The sync process is not running or did not answer"""
+
+# Sync process side
+
+class FrameStore:
+    """Rendered frames in shared memory, keyed by photo and render spec.
+
+    Each frame gets its own shared memory block. Old blocks are unlinked once
+    more than RENDERED_FRAMES are kept; a display still mapping one keeps a
+    valid view until it closes it.
+    """
+
+    def __init__(self, local_folder):
+        self.local_folder = local_folder
+        self._frames = collections.OrderedDict()  # key -> (SharedMemory, shape)
+        self._lock = threading.Lock()
+        self._prefetch = None
+        self._prefetch_lock = threading.Lock()
+        import memory_budget
+        memory_budget.register_cache('rendered frames', self.shrink)
+
+    def render(self, path, spec):
+        """Render a photo and return its shared memory name and frame shape, or None"""
+        key = (path, spec['width'], spec['height'], spec['rotation'], spec['mode'])
+        # One render at a time: a request for a photo being prefetched waits for it
+        with self._lock, profiler.span('render', path):
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                shm, shape = self._frames[key]
+                return {'name': shm.name, 'shape': shape}
+            frame = self._compose(path, spec)
+            if frame is None:
+                return None
+            shm = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+            np.ndarray(frame.shape, dtype=np.uint8, buffer=shm.buf)[:] = frame
+            self._frames[key] = (shm, list(frame.shape))
+            while len(self._frames) > RENDERED_FRAMES:
+                _, (old, _) = self._frames.popitem(last=False)
+                old.close()
+                old.unlink()
+            return {'name': shm.name, 'shape': list(frame.shape)}
+
+    def prefetch(self, paths, spec):
+        """Render upcoming photos in the background"""
+        def run():
+            for path in paths:
+                if os.path.exists(os.path.join(self.local_folder, path)):
+                    try:
+                        self.render(path, spec)
+                    except Exception as e:
+                        logger.error(f"Error rendering {path}: {str(e)}")
+        with self._prefetch_lock:
+            if self._prefetch and self._prefetch.is_alive():
+                return  # Still busy with the last batch, the next request will catch up
+            self._prefetch = threading.Thread(target=run, name="frame-prefetch", daemon=True)
+            self._prefetch.start()
+
+    def _compose(self, path, spec):
+        # Imported here, only the sync process renders
+        from display_manager import compose_photo, compose_photo_simple, compose_photo_fill
+        compose = {'simple': compose_photo_simple, 'fill': compose_photo_fill}.get(spec['mode'], compose_photo)
+        image_path = os.path.join(self.local_folder, path)
+        return compose(image_path, spec['width'], spec['height'], spec['rotation'])
+
+    def shrink(self):
+        """Drop all but the newest frame, which the display may be about to show"""
+        with self._lock:
+            while len(self._frames) > 1:
+                _, (old, _) = self._frames.popitem(last=False)
+                old.close()
+                old.unlink()
+
+    def close(self):
+        with self._lock:
+            for shm, _ in self._frames.values():
+                shm.close()
+                shm.unlink()
+            self._frames.clear()
+
+class SyncDaemon:
+    """Answers display requests with the sync process's Drive service and download queue"""
+
+    def __init__(self, folder_id, local_folder, service, download_queue, hub_server):
+        self.folder_id = folder_id
+        self.local_folder = local_folder
+        self.service = service
+        self.download_queue = download_queue
+        self.hub_server = hub_server
+        self.frames = FrameStore(local_folder)
+
+    def handle(self, request):
+        # main is imported here: it imports this module to start split mode
+        import main
+        cmd = request['cmd']
+        settings = request.get('settings')
+        if cmd == 'ping':
+            return 'pong'
+        if cmd == 'check_connection':
+            return main.check_connection(settings)
+        if cmd == 'fetch_settings':
+            return main.fetch_settings(self.service, self.folder_id, self.local_folder, settings)
+        if cmd == 'sync':
+            new_photos, all_paths = main.sync_drive_images(
+                self.service, self.folder_id, self.local_folder, settings, self.download_queue, self.hub_server)
+            return [new_photos, all_paths]
+        if cmd == 'resolve_playlist':
+            paths = main.resolve_playlist({}, self.download_queue, request['playlist'])
+            return None if paths is None else list(paths)
+        if cmd == 'reprioritize':
+            if self.download_queue is not None:
+                self.download_queue.reprioritize(request['paths'])
+            if request.get('spec'):
+                self.frames.prefetch(request['paths'][:RENDER_AHEAD], request['spec'])
+            return None
+        if cmd == 'is_pending':
+            return self.download_queue is not None and self.download_queue.is_pending(request['path'])
+        if cmd == 'wait_for':
+            if self.download_queue is None:
+                return False
+            return self.download_queue.wait_for(request['path'], request['wait'])
+        if cmd == 'render':
+            return self.frames.render(request['path'], request['spec'])
+        raise ValueError(f"Unknown command: {cmd}")
+
+class SyncRequestHandler(socketserver.StreamRequestHandler):
+    sync_daemon = None
+
+    def handle(self):
+        while True:
+            try:
+                request = read_message(self.rfile)
+            except (ConnectionError, OSError, ValueError):
+                return
+            try:
+                response = {'ok': True, 'result': self.sync_daemon.handle(request)}
+            except Exception as e:
+                logger.error(f"Sync request '{request.get('cmd')}' failed: {str(e)}")
+                response = {'ok': False, 'error': str(e)}
+            try:
+                send_message(self.wfile, response)
+            except OSError:
+                return
+
+def run_sync_daemon(config, local_folder, socket_path):
+    """Entry point of the sync process"""
+    # Exit through the finally below on terminate(), so shared memory gets unlinked
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    # Started by the display process when it gets SIGUSR1 itself
+    profiler.install(config.get('PROFILE_DIR', 'profiles'),
+                     config.get('PROFILE_SECS', profiler.DEFAULT_SECONDS), name='photo_frame-sync')
+    import frame_logging
+    # Logs to a file of its own next to the display process's, never both to one file
+    log_file = config.get('LOG_FILE')
+    if log_file:
+        base, extension = os.path.splitext(log_file)
+        log_file = f"{base}-sync{extension}"
+    frame_logging.configure(config.get('LOG_LEVEL', 'INFO'), log_file,
+                            config.get('LOG_MAX_KB', frame_logging.DEFAULT_MAX_BYTES // 1024) * 1024,
+                            config.get('LOG_BACKUPS', frame_logging.DEFAULT_BACKUPS),
+                            config.get('LOG_RATE_LIMIT', frame_logging.DEFAULT_RATE_LIMIT))
+    import memory_budget
+    memory_budget.configure(config.get('MEMORY_BUDGET_MB', 0))
+    import storage
+    storage.configure(config.get('STORAGE_MODE'), config.get('TEMP_DIR', storage.DEFAULT_TEMP_DIR),
+                      config.get('TEMP_LIMIT_MB', storage.DEFAULT_TEMP_LIMIT // (1024 * 1024)) * 1024 * 1024,
+                      config.get('STATE_FLUSH_MINS', storage.DEFAULT_FLUSH_INTERVAL // 60) * 60)
+    import drive_requests
+    import hub
+    from drive_auth import authenticate_google_drive, start_token_refresher
+    from drive_manager import create_drive_service, configure_photo_types
+    from download_queue import DownloadQueue
+    from ingest import IngestPipeline, HEIC_SUPPORTED
+
+    service = None
+    download_queue = None
+    hub_server = None
+    ingest = None
+    if config['MODE'] != 'client':
+        drive_requests.executor.configure(config['DRIVE_REQUESTS_PER_SECOND'])
+        configure_photo_types(config['INGEST'], HEIC_SUPPORTED)
+        creds = authenticate_google_drive()
+        if not creds:
+            return
+        start_token_refresher(creds)
+        service = create_drive_service(creds)
+        if not service:
+            return
+        if config['INGEST']:
+            ingest = IngestPipeline(local_folder, config['RENDITION_SIZE'], config['INGEST_WORKERS'],
+                                    config['DEDUPE_SIMILAR'], config.get('KEN_BURNS_SOURCE_SIZE'))
+            ingest.start()
+        download_queue = DownloadQueue(creds, local_folder, ingest=ingest)
+        download_queue.start()
+        if config['MODE'] == 'hub':
+            hub_server = hub.HubServer(local_folder, config['HUB_PORT'])
+            hub_server.start()
+    else:
+        download_queue = DownloadQueue(None, local_folder,
+                                       fetch=hub.HubDownloader(config['HUB_URL'], local_folder))
+        download_queue.start()
+
+    daemon = SyncDaemon(config['FOLDER_ID'], local_folder, service, download_queue, hub_server)
+
+    class Handler(SyncRequestHandler):
+        sync_daemon = daemon
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+    server.daemon_threads = True
+    logger.info(f"Sync process {os.getpid()} listening on {socket_path}")
+
+    def watch_display_process(parent_pid):
+        # Not a daemon process, so stop on our own if the display process dies
+        checks = 0
+        while os.getppid() == parent_pid:
+            time.sleep(5)
+            checks += 1
+            if checks % 720 == 0:  # Hourly, downloads and ingest write from this process
+                logger.info(f"Storage writes by the sync process: {storage.meter.report()}")
+                logger.info(f"Memory in the sync process: {memory_budget.report()}")
+        logger.warning("Display process is gone, stopping the sync process")
+        server.shutdown()
+    threading.Thread(target=watch_display_process, args=(os.getppid(),), daemon=True).start()
+
+    try:
+        server.serve_forever()
+    finally:
+        daemon.frames.close()
+        server.server_close()
+        if ingest:
+            ingest.stop()
+        if hub_server:
+            hub_server.stop()
+        logger.info(f"Storage writes by the sync process: {storage.meter.report()}")
+
+# Display process side
+
+class SyncClient:
+    """Display side of the socket. Also stands in for the DownloadQueue in the display loop."""
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.frame_spec = None  # Set by the display so upcoming photos get rendered ahead
+        self._lock = threading.Lock()
+        self._sock = None
+        self._file = None
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(CONNECT_TIMEOUT)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        self._file = sock.makefile('rwb')
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._sock:
+            try:
+                self._file.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._file = None
+
+    def request(self, cmd, timeout=REQUEST_TIMEOUT, **fields):
+        """Send one request and return its result. Raises SyncDaemonUnavailable if the sync process is down."""
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._sock.settimeout(timeout)
+                send_message(self._file, dict(fields, cmd=cmd))
+                response = read_message(self._file)
+            except (OSError, ValueError) as e:
+                self._close()
+                raise SyncDaemonUnavailable(f"Sync process unavailable: {str(e)}")
+        if not response['ok']:
+            raise RuntimeError(response['error'])
+        return response['result']
+
+    def wait_until_ready(self, timeout=STARTUP_TIMEOUT):
+        """Wait for the sync process to start answering"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self.request('ping', timeout=HEARTBEAT_TIMEOUT) == 'pong'
+            except SyncDaemonUnavailable:
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.5)
+
+    # Drive work
+
+    @staticmethod
+    def _remote_settings(settings):
+        # Without the socket, so the sync process does the work itself
+        return {k: v for k, v in settings.items() if k != 'sync_socket'}
+
+    def check_connection(self, settings):
+        try:
+            return self.request('check_connection', timeout=60, settings=self._remote_settings(settings))
+        except SyncDaemonUnavailable:
+            return False
+
+    def fetch_settings(self, settings):
+        new_settings = self.request('fetch_settings', settings=self._remote_settings(settings))
+        new_settings['sync_socket'] = settings['sync_socket']
+        return new_settings
+
+    def sync(self, local_folder, settings):
+        """Same return value as sync_drive_images. Falls back to local photos while the sync process is down."""
+        try:
+            new_photos, all_paths = self.request('sync', settings=self._remote_settings(settings))
+            return new_photos, all_paths
+        except SyncDaemonUnavailable as e:
+            from drive_manager import get_local_photos
+            logger.warning(f"{str(e)}. Using local photos.")
+            photos, _ = get_local_photos(local_folder)
+            if settings.get('shuffle'):
+                random.shuffle(photos)
+            return [], photos
+
+    def resolve_playlist(self, playlist):
+        """Paths in a date playlist, from the sync process's photo index. None while it is down."""
+        try:
+            return self.request('resolve_playlist', playlist=playlist)
+        except (SyncDaemonUnavailable, RuntimeError) as e:
+            logger.warning(f"Could not resolve playlist {playlist}: {str(e)}")
+            return None
+
+    # DownloadQueue interface used by the display loop
+
+    def reprioritize(self, upcoming):
+        try:
+            self.request('reprioritize', timeout=HEARTBEAT_TIMEOUT, paths=list(upcoming), spec=self.frame_spec)
+        except (SyncDaemonUnavailable, RuntimeError) as e:
+            logger.debug(f"Could not reprioritize downloads: {str(e)}")
+
+    def is_pending(self, path):
+        try:
+            return self.request('is_pending', timeout=HEARTBEAT_TIMEOUT, path=path)
+        except (SyncDaemonUnavailable, RuntimeError):
+            return False
+
+    def wait_for(self, path, timeout):
+        try:
+            return self.request('wait_for', timeout=timeout + HEARTBEAT_TIMEOUT, path=path, wait=timeout)
+        except (SyncDaemonUnavailable, RuntimeError):
+            return False
+
+    # Frames
+
+    def render(self, path, spec):
+        """Get a rendered frame from the sync process.
+
+        Returns (frame, shared_memory) or None. Close the shared memory once
+        the frame has been shown.
+        """
+        try:
+            result = self.request('render', timeout=60, path=path, spec=spec)
+        except (SyncDaemonUnavailable, RuntimeError) as e:
+            logger.warning(f"Could not get rendered frame for {path}: {str(e)}")
+            return None
+        if result is None:
+            return None
+        try:
+            # Both processes share the supervisor's resource tracker, which unlinks
+            # any blocks left behind by a crashed sync process when the frame exits
+            shm = shared_memory.SharedMemory(name=result['name'])
+        except FileNotFoundError:
+            return None  # Evicted before we got to it
+        frame = np.ndarray(tuple(result['shape']), dtype=np.uint8, buffer=shm.buf)
+        return frame, shm
+
+_clients = {}
+
+def get_client(socket_path):
+    if socket_path not in _clients:
+        _clients[socket_path] = SyncClient(socket_path)
+    return _clients[socket_path]
+
+def make_display_func(display, client, local_folder, settings, local_display_func):
+    """Display function that shows frames rendered by the sync process.
+
+    Falls back to decoding in the display process if the sync process can't
+    render the photo, or the backend can't present a prepared frame.
+    """
+    if not hasattr(display, 'present') or not hasattr(display, 'get_screen_size'):
+        return local_display_func
+
+    def show_photo(image_path, display_interval, rotation=0, scheduler=None):
+        width, height = display.get_screen_size()
+        spec = {'width': width, 'height': height, 'rotation': rotation,
+                'mode': settings.get('display_mode', 'original')}
+        client.frame_spec = spec
+        rel_path = os.path.relpath(image_path, local_folder)
+        rendered = client.render(rel_path, spec)
+        if rendered is None:
+            return local_display_func(image_path, display_interval, rotation, scheduler=scheduler)
+        frame, shm = rendered
+        try:
+            return display.present(frame, display_interval, scheduler)
+        finally:
+            del frame
+            try:
+                shm.close()
+            except BufferError:
+                pass  # Still referenced somewhere, unmapped when that goes away
+
+    return show_photo
+
+class SyncSupervisor:
+    """Runs the sync process and restarts it when it exits or stops answering"""
+
+    def __init__(self, config, local_folder, socket_path):
+        self.config = config
+        self.local_folder = local_folder
+        self.socket_path = socket_path
+        # Spawn rather than fork: the display process has threads and a window open
+        self._context = multiprocessing.get_context('spawn')
+        self._process = None
+        self._spawned_at = 0
+        self._stopping = threading.Event()
+        self.restarts = 0
+
+    def start(self):
+        self._spawn()
+        threading.Thread(target=self._watch, name="sync-supervisor", daemon=True).start()
+        threading.Thread(target=self._heartbeat, name="sync-heartbeat", daemon=True).start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._process and self._process.is_alive():
+            self._process.terminate()
+            self._process.join(5)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def profile(self):
+        """Start a profiling session in the sync process"""
+        process = self._process
+        if process is not None and process.is_alive():
+            os.kill(process.pid, signal.SIGUSR1)
+
+    def _spawn(self):
+        self._process = self._context.Process(
+            target=run_sync_daemon, args=(self.config, self.local_folder, self.socket_path),
+            name="photo-frame-sync")  # Not a daemon process: it runs the ingest process pool
+        self._spawned_at = time.monotonic()
+        self._process.start()
+        logger.info(f"Started sync process {self._process.pid}")
+
+    def _watch(self):
+        delay = 1
+        while not self._stopping.is_set():
+            started = time.monotonic()
+            self._process.join()
+            if self._stopping.is_set():
+                return
+            if time.monotonic() - started > 5 * 60:
+                delay = 1  # It ran fine for a while, restart right away
+            logger.warning(f"Sync process exited with code {self._process.exitcode}, "
+                           f"restarting in {delay} seconds")
+            if self._stopping.wait(delay):
+                return
+            delay = min(delay * 2, MAX_RESTART_DELAY)
+            self.restarts += 1
+            self._spawn()
+
+    def _heartbeat(self):
+        """Kill a sync process that is alive but stuck, so _watch restarts it"""
+        # A separate connection, so a long sync request doesn't look like a hang
+        client = SyncClient(self.socket_path)
+        failures = 0
+        while not self._stopping.wait(HEARTBEAT_INTERVAL):
+            try:
+                client.request('ping', timeout=HEARTBEAT_TIMEOUT)
+                failures = 0
+            except (SyncDaemonUnavailable, RuntimeError):
+                if time.monotonic() - self._spawned_at < STARTUP_TIMEOUT:
+                    continue  # Still authenticating and listing
+                failures += 1
+                if failures >= HEARTBEAT_FAILURES and self._process.is_alive():
+                    logger.error("Sync process not responding, restarting it")
+                    self._process.terminate()
+                    failures = 0
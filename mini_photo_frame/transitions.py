@@ -0,0 +1,151 @@
+# transitions.py
+# Transitions between consecutive photos. The engine paces frames against the
+# clock: each frame shows the transition as far along as the time says, so a
+# slow device (a Pi Zero) shows fewer frames but still finishes on time
+# instead of stalling. Blending writes into buffers reused between frames.
+import logging
+import time
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NONE = 'none'
+CROSSFADE = 'crossfade'
+SLIDE = 'slide'
+KINDS = (NONE, CROSSFADE, SLIDE)
+
+DEFAULT_DURATION = 1.0  # Seconds
+DEFAULT_FPS = 30
+
+_engine = None
+
+def configure(kind=CROSSFADE, duration=DEFAULT_DURATION, fps=DEFAULT_FPS):
+    """Set the transition used by all display backends, none to cut straight to the next photo"""
+    global _engine
+    kind = (kind or NONE).lower()
+    if kind not in KINDS:
+        raise ValueError(f"Unknown transition '{kind}', expected one of {', '.join(KINDS)}")
+    _engine = None if kind == NONE or duration <= 0 else TransitionEngine(kind, duration, fps)
+
+def get_engine():
+    return _engine
+
+def ease(progress):
+    """Smoothstep, so transitions start and end gently"""
+    return progress * progress * (3 - 2 * progress)
+
+class TransitionEngine:
+    """Runs a transition within a fixed frame-time budget and keeps fps statistics"""
+
+    def __init__(self, kind=CROSSFADE, duration=DEFAULT_DURATION, fps=DEFAULT_FPS):
+        self.kind = kind
+        self.duration = duration
+        self.fps = fps
+        self.transitions = 0
+        self.frames_shown = 0
+        self.frames_dropped = 0
+        self.seconds = 0.0
+        self.last_fps = None
+
+    def run(self, draw, wait_for_key):
+        """Call draw(progress) for each frame until the duration is up.
+
+        wait_for_key(timeout) sleeps out the rest of each frame's budget. If a
+        key is pressed the transition stops and its action is returned, None
+        otherwise. The caller draws the final frame.
+        """
+        frame_time = 1.0 / self.fps
+        start = time.monotonic()
+        next_frame = start
+        shown = 0
+        action = None
+        while True:
+            now = time.monotonic()
+            if now - start >= self.duration:
+                break
+            draw(ease((now - start) / self.duration))
+            shown += 1
+            next_frame += frame_time
+            now = time.monotonic()
+            if next_frame < now:
+                # Behind: drop the frames we missed rather than try to catch up
+                next_frame += (now - next_frame) // frame_time * frame_time
+            action = wait_for_key(max(0.0, next_frame - now))
+            if action:
+                break
+        elapsed = time.monotonic() - start
+        self.transitions += 1
+        self.frames_shown += shown
+        self.frames_dropped += max(0, int(elapsed * self.fps) - shown)
+        self.seconds += elapsed
+        self.last_fps = shown / max(elapsed, 0.001)
+        logger.debug(f"{self.kind} transition: {shown} frames in {elapsed:.2f}s ({self.last_fps:.1f} fps)")
+        return action
+
+    def stats(self):
+        """Average fps and dropped frames since the last call"""
+        fps = self.frames_shown / self.seconds if self.seconds else 0.0
+        summary = (f"{self.transitions} transitions at {fps:.1f} fps of {self.fps} "
+                   f"({self.frames_dropped} frames dropped)")
+        self.transitions = self.frames_shown = self.frames_dropped = 0
+        self.seconds = 0.0
+        return summary
+
+class FrameBlender:
+    """Transitions between screen-sized BGR frames for the OpenCV and framebuffer backends.
+
+    Keeps a copy of the frame on screen (the frame handed in may live in
+    shared memory that goes away) and one output buffer, both reused.
+    """
+
+    def __init__(self):
+        self._previous = None
+        self._buffer = None
+
+    def transition(self, engine, frame, show, wait_for_key):
+        """Transition from the remembered frame to frame. Returns the action of a key pressed meanwhile."""
+        if self._previous is None or self._previous.shape != frame.shape:
+            return None  # Nothing on screen yet, or a different size: cut
+        if self._buffer is None or self._buffer.shape != frame.shape:
+            self._buffer = np.empty_like(frame)
+        previous, buffer = self._previous, self._buffer
+
+        def draw(progress):
+            if engine.kind == SLIDE:
+                # The new photo pushes the old one out to the left
+                width = frame.shape[1]
+                offset = int(width * progress)
+                buffer[:, :width - offset] = previous[:, offset:]
+                buffer[:, width - offset:] = frame[:, :offset]
+            else:
+                cv2.addWeighted(previous, 1.0 - progress, frame, progress, 0.0, dst=buffer)
+            show(buffer)
+
+        return engine.run(draw, wait_for_key)
+
+    def forget(self):
+        """The screen was cleared behind our back, cut to the next frame"""
+        self._previous = None
+
+    def remember(self, frame):
+        """Keep a copy of the frame now on screen to transition from next time"""
+        if self._previous is None or self._previous.shape != frame.shape:
+            self._previous = np.empty_like(frame)
+        np.copyto(self._previous, frame)
+
+def benchmark(size=(1920, 1080), duration=2.0):
+    """Achieved fps of each transition with no display, i.e. the blending cost alone"""
+    rng = np.random.default_rng(0)
+    a = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    b = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    for kind in (CROSSFADE, SLIDE):
+        engine = TransitionEngine(kind, duration, fps=1000)
+        blender = FrameBlender()
+        blender.remember(a)
+        blender.transition(engine, b, lambda frame: None, lambda timeout: None)
+        print(f"{kind}: {engine.last_fps:.0f} fps at {size[0]}x{size[1]} "
+              f"({1000 / engine.last_fps:.1f} ms per frame)")
+
+if __name__ == "__main__":
+    benchmark()
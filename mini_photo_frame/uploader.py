@@ -0,0 +1,238 @@
+# uploader.py
+# The upload command: photo_frame upload <dir> copies a folder of photos, with
+# its subfolders, into the frame's Drive folder. Photos Drive already has (same
+# path and md5) are skipped, so running it again after an interruption only
+# sends what is missing, and uploads cut off mid-file continue from the last
+# chunk Drive received. Several photos upload at once, all within the shared
+# Drive request rate limit.
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from PIL import Image
+
+import drive_requests
+from drive_auth import authenticate_google_drive
+from drive_manager import (
+    create_drive_service, get_mime_type, get_or_create_folder, iter_photo_pages, upload_photo
+)
+from ingest import file_md5, is_native, RENDITION_QUALITY
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_UPLOAD_WORKERS = 4
+UPLOAD_STATE_FILE = '.photo_frame_upload.json'  # Unfinished upload sessions, in the uploaded folder
+SOURCE_MD5 = 'sourceMd5'  # Drive app property with the md5 of the original of a downscaled upload
+
+def find_photos(directory):
+    """Relative paths (with /) of the photos in a directory tree, skipping dotfiles and dot folders"""
+    photos = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for file in sorted(files):
+            if not file.startswith('.') and get_mime_type(file):
+                photos.append(os.path.relpath(os.path.join(root, file), directory).replace('\\', '/'))
+    return photos
+
+def downscale(file_path, out_path, max_size):
+    """Save a JPEG copy at most max_size on its longest edge, keeping the EXIF data.
+
+    Returns False, writing nothing, if the photo is small enough already.
+    """
+    with Image.open(file_path) as img:
+        if max(img.size) <= max_size:
+            return False
+        exif = img.info.get('exif')
+        scale = max_size / max(img.size)
+        img.draft('RGB', (int(img.size[0] * scale), int(img.size[1] * scale)))
+        img = img.convert('RGB')
+        img.thumbnail((max_size, max_size), Image.LANCZOS)
+        img.save(out_path, 'JPEG', quality=RENDITION_QUALITY, **({'exif': exif} if exif else {}))
+    return True
+
+class UploadJournal:
+    """Upload sessions not finished yet, kept in a file so the next run can continue them"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r') as f:
+                self._sessions = json.load(f)
+        except (OSError, ValueError):
+            self._sessions = {}
+
+    def get(self, rel_path, md5, size):
+        """Session URI of an unfinished upload of exactly this file, or None"""
+        with self._lock:
+            session = self._sessions.get(rel_path)
+        if session and session.get('md5') == md5 and session.get('size') == size:
+            return session['uri']
+        return None
+
+    def start(self, rel_path, md5, size, uri):
+        with self._lock:
+            self._sessions[rel_path] = {'uri': uri, 'md5': md5, 'size': size}
+            self._save()
+
+    def finish(self, rel_path):
+        with self._lock:
+            if self._sessions.pop(rel_path, None) is not None:
+                self._save()
+
+    def _save(self):
+        try:
+            if self._sessions:
+                with open(self.path + '.tmp', 'w') as f:
+                    json.dump(self._sessions, f)
+                os.replace(self.path + '.tmp', self.path)
+            elif os.path.exists(self.path):
+                os.remove(self.path)
+        except OSError as e:
+            logger.warning(f"Could not save upload progress to {self.path}: {str(e)}")
+
+class Uploader:
+    """Mirrors a local folder into a Drive folder with a pool of upload threads"""
+
+    def __init__(self, creds, folder_id, workers=DEFAULT_UPLOAD_WORKERS, max_size=None):
+        self.creds = creds
+        self.folder_id = folder_id
+        self.workers = max(1, workers)
+        self.max_size = max_size
+        self._folders = {'': folder_id}  # Relative Drive folder path -> folder ID
+        self._folders_lock = threading.Lock()
+        self.uploaded = self.skipped = self.failed = 0
+        self.bytes_sent = 0
+
+    def remote_photos(self, service):
+        """Photos already in the Drive folder, by path.
+
+        Raises if any folder fails to list: uploading against a partial
+        listing would make duplicate copies of the photos it missed.
+        """
+        photos = {}
+        for page in iter_photo_pages(service, self.folder_id, strict=True):
+            for photo in page:
+                photos[photo['path'].replace('\\', '/')] = photo
+        return photos
+
+    def folder_for(self, service, rel_dir):
+        """Drive folder ID for a relative folder path, creating missing folders on the way"""
+        # Held while creating, so two threads never make the same folder twice
+        with self._folders_lock:
+            path = ''
+            for name in rel_dir.split('/'):
+                parent_id = self._folders[path]
+                path = f"{path}/{name}" if path else name
+                if path not in self._folders:
+                    self._folders[path] = get_or_create_folder(service, name, parent_id)
+            return self._folders[rel_dir]
+
+    def upload_one(self, file_path, drive_path, remote, journal, scratch):
+        """Upload one photo unless Drive has it already. Returns 'uploaded' or 'skipped' and the bytes sent."""
+        service = create_drive_service(self.creds)  # One per thread
+        md5 = file_md5(file_path)
+        if remote and md5 in (remote.get('md5Checksum'), remote.get('appProperties', {}).get(SOURCE_MD5)):
+            return 'skipped', 0
+
+        upload_path = file_path
+        if self.max_size and is_native(file_path):
+            scaled = os.path.join(scratch, f"{md5}-{threading.get_ident()}.jpg")
+            if downscale(file_path, scaled, self.max_size):
+                upload_path = scaled
+        size = os.path.getsize(upload_path)
+        session_key = f"{self.folder_id}/{drive_path}"
+        rel_dir, _, name = drive_path.rpartition('/')
+        try:
+            upload_photo(service, upload_path,
+                         folder_id=None if remote else self.folder_for(service, rel_dir),
+                         name=name,
+                         file_id=remote['id'] if remote else None,
+                         app_properties={SOURCE_MD5: md5},
+                         resumable_uri=journal.get(session_key, md5, size),
+                         on_session=lambda uri: journal.start(session_key, md5, size, uri))
+        finally:
+            if upload_path != file_path:
+                os.remove(upload_path)
+        journal.finish(session_key)
+        return 'uploaded', size
+
+    def run(self, directory):
+        """Upload every photo under directory into a Drive folder of the same name. Returns the failure count."""
+        directory = os.path.abspath(directory)
+        top = os.path.basename(directory)
+        photos = find_photos(directory)
+        print(f"Found {len(photos)} photos in {directory}")
+        service = create_drive_service(self.creds)
+        print("Listing photos already in Google Drive...")
+        try:
+            remote = self.remote_photos(service)
+        except Exception as e:
+            print(f"\nCould not list the photos already in Google Drive ({str(e)}), nothing uploaded. "
+                  f"Run the command again to retry.")
+            return len(photos) or 1
+        journal = UploadJournal(os.path.join(directory, UPLOAD_STATE_FILE))
+
+        start = time.monotonic()
+        done = 0
+        with tempfile.TemporaryDirectory() as scratch, ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="upload") as pool:
+            futures = {}
+            for rel_path in photos:
+                drive_path = f"{top}/{rel_path}"
+                futures[pool.submit(self.upload_one, os.path.join(directory, rel_path), drive_path,
+                                    remote.get(drive_path), journal, scratch)] = drive_path
+            for future in as_completed(futures):
+                drive_path = futures[future]
+                done += 1
+                try:
+                    result, size = future.result()
+                except Exception as e:
+                    self.failed += 1
+                    print(f"[{done}/{len(photos)}] Failed {drive_path}: {str(e)}")
+                    continue
+                if result == 'skipped':
+                    self.skipped += 1
+                    continue
+                self.uploaded += 1
+                self.bytes_sent += size
+                elapsed = max(time.monotonic() - start, 0.001)
+                print(f"[{done}/{len(photos)}] Uploaded {drive_path} ({size / 1e6:.1f} MB, "
+                      f"{self.bytes_sent / 1e6 / elapsed:.1f} MB/s overall)")
+
+        elapsed = max(time.monotonic() - start, 0.001)
+        print(f"\nUploaded {self.uploaded}, skipped {self.skipped} already in Drive, failed {self.failed}. "
+              f"{self.bytes_sent / 1e6:.1f} MB in {elapsed:.0f}s ({self.bytes_sent / 1e6 / elapsed:.1f} MB/s, "
+              f"{self.uploaded / elapsed * 60:.1f} photos per minute)")
+        return self.failed
+
+def main(argv, config):
+    """photo_frame upload <dir> [--workers N] [--max-size PIXELS]"""
+    parser = argparse.ArgumentParser(
+        prog='photo_frame upload',
+        description="Upload a folder of photos, with its subfolders, to the frame's Google Drive folder. "
+                    "Photos already there are skipped, so it can be run again to resume.")
+    parser.add_argument('directory', help="Folder to upload. It becomes a folder of the same name in Drive.")
+    parser.add_argument('--workers', type=int, default=DEFAULT_UPLOAD_WORKERS,
+                        help=f"Photos uploaded at once (default: {DEFAULT_UPLOAD_WORKERS})")
+    parser.add_argument('--max-size', type=int, default=None, metavar='PIXELS',
+                        help="Scale JPEGs down to this longest edge before uploading, e.g. 1920")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        print(f"\nNot a folder: {args.directory}")
+        return 1
+    if not config['FOLDER_ID'] or config['FOLDER_ID'] == 'your_google_drive_folder_id_here':
+        print("\nPlease set your Google Drive folder ID in config.txt")
+        return 1
+    drive_requests.executor.configure(config['DRIVE_REQUESTS_PER_SECOND'])
+    creds = authenticate_google_drive()
+    if not creds:
+        return 1
+    uploader = Uploader(creds, config['FOLDER_ID'], args.workers, args.max_size)
+    return 1 if uploader.run(args.directory) else 0
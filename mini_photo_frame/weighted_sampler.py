@@ -0,0 +1,252 @@
+# weighted_sampler.py
+import random
+
+# Photos near the top of the listing (newest first) are drawn more often, fading
+# linearly to normal weight over this many photos
+RECENT_COUNT = 200
+DEFAULT_RECENT_WEIGHT = 3.0
+DEFAULT_FAVORITE_WEIGHT = 2.0
+SEARCH_WEIGHT = 3.0
+FAVORITE_FOLDERS = ('favorites', 'favourites')
+
+class WeightedSampler:
+    """Weighted random draws without replacement, O(log n) per draw and update.
+
+    Weights live in a Fenwick (binary indexed) tree, so the prefix sums used
+    to find the photo a random number lands on, and the updates when a photo
+    is drawn, added or removed, each touch only log n nodes. A drawn photo
+    sits out until reset() starts a new cycle.
+    """
+
+    def __init__(self, rng=None):
+        self._rng = rng or random.Random()
+        self._tree = [0.0]    # 1-based Fenwick tree of active weights
+        self._weights = []    # Full weight per slot, kept while a photo sits out
+        self._active = []     # Whether a slot can still be drawn this cycle
+        self._items = []      # Item per slot, None for free slots
+        self._slots = {}      # item -> slot
+        self._free = []
+        self._remaining = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, item):
+        return item in self._slots
+
+    def remaining(self):
+        """Items that can still be drawn this cycle"""
+        return self._remaining
+
+    def total(self):
+        """Sum of the weights of the items that can still be drawn"""
+        return self._prefix_sum(len(self._items))
+
+    def set_weight(self, item, weight):
+        """Add an item or change its weight. New items can be drawn in the current cycle."""
+        weight = max(0.0, float(weight))
+        slot = self._slots.get(item)
+        if slot is None:
+            slot = self._allocate(item)
+            self._active[slot] = True
+            self._remaining += 1
+        if self._active[slot]:
+            self._add(slot, weight - self._weights[slot])
+        self._weights[slot] = weight
+
+    def remove(self, item):
+        slot = self._slots.pop(item, None)
+        if slot is None:
+            return
+        if self._active[slot]:
+            self._add(slot, -self._weights[slot])
+            self._remaining -= 1
+        self._items[slot] = None
+        self._weights[slot] = 0.0
+        self._active[slot] = False
+        self._free.append(slot)
+
+    def draw(self):
+        """Draw an item with probability proportional to its weight and take it out of this cycle.
+
+        Returns None when nothing is left to draw. Items with zero weight are
+        only drawn once every weighted item has been.
+        """
+        if self._remaining == 0:
+            return None
+        total = self.total()
+        if total <= 0:
+            # Only zero weight items left, draw them uniformly
+            slot = self._rng.choice([s for s, active in enumerate(self._active) if active])
+        else:
+            slot = self._find(self._rng.random() * total)
+        self._active[slot] = False
+        self._remaining -= 1
+        self._add(slot, -self._weights[slot])
+        return self._items[slot]
+
+    def draw_many(self, count):
+        """Draw up to count items, fewer if the cycle runs out"""
+        drawn = []
+        while len(drawn) < count and self._remaining:
+            drawn.append(self.draw())
+        return drawn
+
+    def take(self, item):
+        """Take an item out of this cycle without drawing it, e.g. after showing it out of turn"""
+        slot = self._slots.get(item)
+        if slot is not None and self._active[slot]:
+            self._active[slot] = False
+            self._remaining -= 1
+            self._add(slot, -self._weights[slot])
+
+    def reset(self):
+        """Start a new cycle where every item can be drawn again. O(n)."""
+        for slot, item in enumerate(self._items):
+            self._active[slot] = item is not None
+        self._remaining = len(self._slots)
+        self._rebuild()
+
+    def _allocate(self, item):
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self._items)
+            self._items.append(None)
+            self._weights.append(0.0)
+            self._active.append(False)
+            if len(self._items) >= len(self._tree):
+                # Grow the tree to the next power of two
+                self._rebuild(capacity=2 * len(self._tree))
+        self._items[slot] = item
+        self._slots[item] = slot
+        return slot
+
+    def _rebuild(self, capacity=None):
+        """Rebuild the tree from the weights in O(n), also clearing float rounding drift"""
+        size = max(capacity or len(self._tree), len(self._items) + 1)
+        tree = [0.0] * size
+        for slot, weight in enumerate(self._weights):
+            if self._active[slot]:
+                tree[slot + 1] += weight
+        for i in range(1, size):
+            parent = i + (i & -i)
+            if parent < size:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _add(self, slot, delta):
+        i = slot + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix_sum(self, count):
+        total = 0.0
+        i = min(count, len(self._tree) - 1)
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return max(total, 0.0)
+
+    def _find(self, target):
+        """Slot whose weight range contains target, by walking down the tree"""
+        position = 0
+        step = 1 << (len(self._tree).bit_length() - 1)
+        while step:
+            nxt = position + step
+            if nxt < len(self._tree) and self._tree[nxt] <= target:
+                position = nxt
+                target -= self._tree[nxt]
+            step >>= 1
+        # Rounding can land past the last active slot; step back to one with weight
+        slot = min(position, len(self._items) - 1)
+        while slot > 0 and not (self._active[slot] and self._weights[slot] > 0):
+            slot -= 1
+        if not (self._active[slot] and self._weights[slot] > 0):
+            slot = next(s for s, active in enumerate(self._active) if active and self._weights[s] > 0)
+        return slot
+
+def parse_folder_weights(value):
+    """Parse FOLDER_WEIGHTS such as 'Holidays:2, Screenshots:0.2' into {folder: weight}"""
+    weights = {}
+    for entry in (value or '').split(','):
+        if entry.strip():
+            folder, _, weight = entry.rpartition(':')
+            weights[folder.strip().lower()] = float(weight)
+    return weights
+
+def photo_weight(path, rank, settings):
+    """How often a photo should come up, relative to a normal photo's 1.0.
+
+    rank is the photo's position in the sync order, newest first.
+    """
+    weight = 1.0
+    if rank < RECENT_COUNT:
+        recent_weight = settings.get('recent_weight', DEFAULT_RECENT_WEIGHT)
+        weight *= 1 + (recent_weight - 1) * (1 - rank / RECENT_COUNT)
+    folders = [folder.lower() for folder in path.replace('\\', '/').split('/')[:-1]]
+    if any(folder in FAVORITE_FOLDERS for folder in folders):
+        weight *= settings.get('favorite_weight', DEFAULT_FAVORITE_WEIGHT)
+    folder_weights = settings.get('folder_weights') or {}
+    for folder in folders:
+        weight *= folder_weights.get(folder, 1.0)
+    if settings.get('search') and settings['search'].lower() in path.lower():
+        weight *= SEARCH_WEIGHT
+    return weight
+
+def update_weights(sampler, paths, settings, previous_paths=()):
+    """Bring the sampler in line with a new sync result.
+
+    Only photos that were added or removed, or whose recency boost can have
+    changed (the top of the old and new order), are touched.
+    """
+    current = set(paths)
+    for path in previous_paths:
+        if path not in current:
+            sampler.remove(path)
+    previous_top = set(list(previous_paths)[:RECENT_COUNT])
+    for rank, path in enumerate(paths):
+        if rank < RECENT_COUNT or path in previous_top or path not in sampler:
+            sampler.set_weight(path, photo_weight(path, rank, settings))
+
+def benchmark(count=100_000, draws=10_000):
+    """Time building, drawing from and updating a sampler of count photos"""
+    import time
+    settings = {'folder_weights': {'screenshots': 0.2}}
+    paths = [f"{'favorites' if i % 50 == 0 else 'album%d' % (i % 40)}/photo_{i:06d}.jpg" for i in range(count)]
+
+    sampler = WeightedSampler(random.Random(1))
+    start = time.perf_counter()
+    update_weights(sampler, paths, settings)
+    built = time.perf_counter() - start
+
+    start = time.perf_counter()
+    drawn = [sampler.draw() for _ in range(draws)]
+    per_draw = (time.perf_counter() - start) / draws
+
+    # A sync that adds 100 new photos at the top and removes 100 old ones
+    new_paths = [f'new/photo_{i}.jpg' for i in range(100)] + paths[:-100]
+    start = time.perf_counter()
+    update_weights(sampler, new_paths, settings, paths)
+    updated = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sampler.reset()
+    reset = time.perf_counter() - start
+
+    # The old way: filter already-shown photos and shuffle the rest
+    shown = set(drawn)
+    start = time.perf_counter()
+    unshown = [p for p in paths if p not in shown]
+    random.shuffle(unshown)
+    shuffled = time.perf_counter() - start
+
+    favorites = sum(1 for p in drawn if p.startswith('favorites/')) / len(drawn)
+    print(f"{count} photos: build {built * 1000:.0f} ms, draw {per_draw * 1e6:.1f} us, "
+          f"sync update {updated * 1000:.1f} ms, new cycle {reset * 1000:.0f} ms")
+    print(f"filter and shuffle for comparison: {shuffled * 1000:.0f} ms")
+    print(f"favorites are 2.0% of photos and {favorites * 100:.1f}% of the first {draws} draws")
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,5 @@
+# The frame's modules import each other by plain name, as when main.py runs from its folder
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mini_photo_frame'))
@@ -0,0 +1,45 @@
+from adaptive_sync import AdaptiveSyncInterval
+
+def test_starts_at_minimum():
+    assert AdaptiveSyncInterval(60, 300, 3600).interval() == 60
+
+def test_idle_syncs_double_up_to_maximum():
+    sync = AdaptiveSyncInterval(60, 300, 3600)
+    intervals = []
+    for _ in range(6):
+        sync.record(False)
+        intervals.append(sync.interval())
+    assert intervals == [300, 600, 1200, 2400, 3600, 3600]
+
+def test_change_drops_to_minimum():
+    sync = AdaptiveSyncInterval(60, 300, 3600)
+    for _ in range(4):
+        sync.record(False)
+    sync.record(True)
+    assert sync.interval() == 60
+    sync.record(False)
+    assert sync.interval() == 300
+    assert (sync.syncs, sync.changed_syncs) == (6, 1)
+
+def test_base_interval_follows_settings():
+    settings = {'sync_interval': 300}
+    sync = AdaptiveSyncInterval(60, lambda: settings['sync_interval'], 3600)
+    sync.record(False)
+    settings['sync_interval'] = 900
+    assert sync.interval() == 900
+
+def test_base_interval_above_maximum_raises_it():
+    sync = AdaptiveSyncInterval(60, 7200, 3600)
+    sync.record(False)
+    assert sync.interval() == 7200
+    sync.record(False)
+    assert sync.interval() == 7200
+
+def test_minimum_above_base_interval():
+    assert AdaptiveSyncInterval(600, 300, 3600).interval() == 300
+
+def test_long_idle_streak():
+    sync = AdaptiveSyncInterval(60, 300, 3600)
+    for _ in range(5000):
+        sync.record(False)
+    assert sync.interval() == 3600
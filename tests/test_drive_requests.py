@@ -0,0 +1,104 @@
+import json
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+import drive_requests
+from drive_requests import DriveRequestExecutor, TokenBucket, get_retry_after, is_retryable
+
+def http_error(status, reason=None, retry_after=None):
+    headers = {'status': status}
+    if retry_after is not None:
+        headers['retry-after'] = str(retry_after)
+    errors = [{'reason': reason}] if reason else []
+    content = json.dumps({'error': {'code': status, 'errors': errors}}).encode('utf-8')
+    return HttpError(httplib2.Response(headers), content)
+
+class FailingCall:
+    """Raises the given errors in turn, then returns 'ok'"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Seconds the executor slept between retries, without sleeping"""
+    slept = []
+    monkeypatch.setattr(drive_requests.time, 'sleep', slept.append)
+    return slept
+
+@pytest.fixture
+def executor():
+    return DriveRequestExecutor(requests_per_second=0, max_retries=3)
+
+def test_retryable_errors():
+    assert is_retryable(http_error(403, 'userRateLimitExceeded'))
+    assert is_retryable(http_error(429))
+    assert is_retryable(http_error(503))
+    assert is_retryable(ConnectionResetError())
+    assert not is_retryable(http_error(403, 'insufficientFilePermissions'))
+    assert not is_retryable(http_error(400, 'badRequest'))
+    assert not is_retryable(ValueError())
+
+def test_retry_after():
+    assert get_retry_after(http_error(429, retry_after=7)) == 7
+    assert get_retry_after(http_error(429)) is None
+
+def test_rate_limit_is_retried_with_backoff(executor, sleeps):
+    call = FailingCall(http_error(403, 'userRateLimitExceeded'), http_error(403, 'userRateLimitExceeded'))
+    assert executor.call(call) == 'ok'
+    assert call.calls == 3
+    # Full jitter, within the doubling ceiling of each attempt
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= drive_requests.BASE_RETRY_DELAY
+    assert 0 <= sleeps[1] <= drive_requests.BASE_RETRY_DELAY * 2
+    totals = executor.get_metrics()['totals']
+    assert (totals['requests'], totals['retries'], totals['rate_limited'], totals['failures']) == (3, 2, 2, 0)
+
+def test_retry_after_is_honored(executor, sleeps):
+    call = FailingCall(http_error(429, retry_after=12))
+    assert executor.call(call) == 'ok'
+    assert sleeps == [12]
+
+def test_bad_request_is_not_retried(executor, sleeps):
+    call = FailingCall(http_error(400, 'badRequest'))
+    with pytest.raises(HttpError):
+        executor.call(call)
+    assert call.calls == 1
+    assert sleeps == []
+    assert executor.get_metrics()['totals']['failures'] == 1
+
+def test_gives_up_after_max_retries(executor, sleeps):
+    call = FailingCall(*[http_error(503)] * 10)
+    with pytest.raises(HttpError):
+        executor.call(call)
+    assert call.calls == executor.max_retries + 1
+    assert len(sleeps) == executor.max_retries
+
+def test_token_bucket_waits_for_a_token(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(drive_requests.time, 'monotonic', lambda: now[0])
+
+    def sleep(seconds):
+        now[0] += seconds
+    monkeypatch.setattr(drive_requests.time, 'sleep', sleep)
+
+    bucket = TokenBucket(rate=2, capacity=2)
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    # The burst is used up, the next token comes after 1 / rate seconds
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert now[0] == pytest.approx(100.5)
+
+def test_token_bucket_without_limit(monkeypatch):
+    monkeypatch.setattr(drive_requests.time, 'sleep', lambda seconds: pytest.fail("slept without a limit"))
+    bucket = TokenBucket(rate=0, capacity=1)
+    assert all(bucket.acquire() == 0 for _ in range(100))
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from display_manager_fb import Framebuffer, bgr_to_rgb565
+
+WIDTH, HEIGHT = 4, 3
+
+def corner_frame():
+    """A BGR frame with a different colour in each corner"""
+    frame = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    frame[0, 0] = (255, 0, 0)          # Blue
+    frame[0, WIDTH - 1] = (0, 255, 0)  # Green
+    frame[HEIGHT - 1, 0] = (0, 0, 255)  # Red
+    frame[HEIGHT - 1, WIDTH - 1] = (255, 255, 255)
+    return frame
+
+@pytest.fixture
+def framebuffers():
+    opened = []
+    yield opened
+    for fb in opened:
+        fb.close()
+
+def open_framebuffer(path, bpp, opened):
+    fb = Framebuffer(str(path), (WIDTH, HEIGHT), bpp)
+    opened.append(fb)
+    return fb
+
+def test_rgb565_packing():
+    pixels = bgr_to_rgb565(corner_frame())
+    assert pixels[0, 0] == 0x001F
+    assert pixels[0, WIDTH - 1] == 0x07E0
+    assert pixels[HEIGHT - 1, 0] == 0xF800
+    assert pixels[HEIGHT - 1, WIDTH - 1] == 0xFFFF
+    assert pixels[1, 1] == 0
+
+def test_rgb565_file(tmp_path, framebuffers):
+    path = tmp_path / 'frame.raw'
+    fb = open_framebuffer(path, 16, framebuffers)
+    assert (fb.width, fb.height, fb.stride) == (WIDTH, HEIGHT, WIDTH * 2)
+    fb.show(corner_frame())
+    pixels = np.frombuffer(path.read_bytes(), dtype='<u2').reshape(HEIGHT, WIDTH)
+    assert np.array_equal(pixels, bgr_to_rgb565(corner_frame()))
+
+def test_xrgb8888_file(tmp_path, framebuffers):
+    path = tmp_path / 'frame.raw'
+    fb = open_framebuffer(path, 32, framebuffers)
+    assert (fb.width, fb.height, fb.stride) == (WIDTH, HEIGHT, WIDTH * 4)
+    fb.show(corner_frame())
+    pixels = np.frombuffer(path.read_bytes(), dtype=np.uint8).reshape(HEIGHT, WIDTH, 4)
+    # Stored as B, G, R, X bytes
+    assert np.array_equal(pixels[..., :3], corner_frame())
+    assert (pixels[..., 3] == 255).all()
+
+def test_clear(tmp_path, framebuffers):
+    path = tmp_path / 'frame.raw'
+    fb = open_framebuffer(path, 32, framebuffers)
+    fb.show(corner_frame())
+    fb.clear()
+    assert path.read_bytes() == bytes(WIDTH * HEIGHT * 4)
+
+def test_existing_file_is_grown_to_a_frame(tmp_path, framebuffers):
+    path = tmp_path / 'frame.raw'
+    path.write_bytes(b'\x01' * 5)
+    open_framebuffer(path, 16, framebuffers)
+    assert path.stat().st_size == WIDTH * HEIGHT * 2
+
+def test_wrong_frame_size(tmp_path, framebuffers):
+    fb = open_framebuffer(tmp_path / 'frame.raw', 16, framebuffers)
+    with pytest.raises(ValueError):
+        fb.show(np.zeros((HEIGHT + 1, WIDTH, 3), dtype=np.uint8))
+
+def test_unsupported_bpp(tmp_path):
+    with pytest.raises(ValueError):
+        Framebuffer(str(tmp_path / 'frame.raw'), (WIDTH, HEIGHT), 24)
@@ -0,0 +1,191 @@
+import json
+import os
+import urllib.error
+import urllib.request
+
+import pytest
+
+import hub
+from download_queue import DownloadQueue
+from hub import HubDownloader, HubServer, download_from_hub, parse_range, sync_from_hub
+
+PHOTO = bytes(range(256)) * 40  # 10240 bytes
+
+@pytest.fixture
+def hub_folder(tmp_path):
+    folder = tmp_path / 'hub'
+    (folder / 'album').mkdir(parents=True)
+    (folder / 'a.jpg').write_bytes(PHOTO)
+    (folder / 'album' / 'b.jpg').write_bytes(PHOTO[::-1])
+    (tmp_path / 'secret.txt').write_text('not a photo')
+    return folder
+
+@pytest.fixture
+def server(hub_folder):
+    server = HubServer(str(hub_folder), port=0, host='127.0.0.1')
+    server.update(['a.jpg', 'album/b.jpg'], {'display_interval': 60, 'shuffle': True, 'rotation': 90})
+    server.start()
+    yield server
+    server.stop()
+
+def hub_url(server):
+    return f'http://127.0.0.1:{server.port}'
+
+def get(url, headers=None):
+    """Return (status, headers, body), for error statuses too"""
+    request = urllib.request.Request(url, headers=headers or {})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+def test_parse_range():
+    assert parse_range('bytes=0-99', 1000) == (0, 99)
+    assert parse_range('bytes=500-', 1000) == (500, 999)
+    assert parse_range('bytes=0-5000', 1000) == (0, 999)
+
+def test_parse_range_suffix():
+    assert parse_range('bytes=-100', 1000) == (900, 999)
+    assert parse_range('bytes=-5000', 1000) == (0, 999)
+
+def test_parse_range_unsatisfiable():
+    assert parse_range('bytes=1000-', 1000) is None
+    assert parse_range('bytes=5-2', 1000) is None
+    assert parse_range('bytes=0-1,5-6', 1000) is None
+    assert parse_range('items=0-1', 1000) is None
+    assert parse_range('bytes=abc-', 1000) is None
+
+def test_manifest_etag(server):
+    status, headers, body = get(hub_url(server) + '/manifest')
+    assert status == 200
+    manifest = json.loads(body)
+    assert [photo['path'] for photo in manifest['photos']] == ['a.jpg', 'album/b.jpg']
+    assert manifest['photos'][0]['size'] == len(PHOTO)
+    # Display settings that are per frame are not shared
+    assert manifest['settings'] == {'display_interval': 60, 'shuffle': True}
+
+    status, _, body = get(hub_url(server) + '/manifest', {'If-None-Match': headers['ETag']})
+    assert status == 304
+    assert body == b''
+
+def test_image_etag(server):
+    status, headers, body = get(hub_url(server) + '/images/a.jpg')
+    assert status == 200
+    assert body == PHOTO
+    status, _, _ = get(hub_url(server) + '/images/a.jpg', {'If-None-Match': headers['ETag']})
+    assert status == 304
+
+def test_image_range(server):
+    url = hub_url(server) + '/images/album/b.jpg'
+    etag = get(url)[1]['ETag']
+    status, headers, body = get(url, {'Range': 'bytes=100-', 'If-Range': etag})
+    assert status == 206
+    assert headers['Content-Range'] == f'bytes 100-{len(PHOTO) - 1}/{len(PHOTO)}'
+    assert body == PHOTO[::-1][100:]
+
+def test_image_range_for_other_version(server):
+    # A range of an older version of the file gets the whole current file
+    status, _, body = get(hub_url(server) + '/images/a.jpg', {'Range': 'bytes=100-', 'If-Range': '"old"'})
+    assert status == 200
+    assert body == PHOTO
+
+def test_image_range_unsatisfiable(server):
+    status, headers, _ = get(hub_url(server) + '/images/a.jpg', {'Range': f'bytes={len(PHOTO)}-'})
+    assert status == 416
+    assert headers['Content-Range'] == f'bytes */{len(PHOTO)}'
+
+def test_image_outside_folder(server):
+    assert get(hub_url(server) + '/images/../secret.txt')[0] == 404
+    assert get(hub_url(server) + '/images/missing.jpg')[0] == 404
+
+def test_sync_from_hub(server, tmp_path):
+    client_folder = tmp_path / 'client'
+    client_folder.mkdir()
+    new_photos, all_paths = sync_from_hub(hub_url(server), str(client_folder))
+    assert sorted(new_photos) == ['a.jpg', 'album/b.jpg']
+    assert all_paths == ['a.jpg', 'album/b.jpg']
+    assert (client_folder / 'a.jpg').read_bytes() == PHOTO
+    assert (client_folder / 'album' / 'b.jpg').read_bytes() == PHOTO[::-1]
+
+    # Nothing changed, so nothing is downloaded again
+    new_photos, all_paths = sync_from_hub(hub_url(server), str(client_folder))
+    assert new_photos == []
+    assert all_paths == ['a.jpg', 'album/b.jpg']
+
+def test_sync_from_hub_removes_deleted(server, tmp_path):
+    client_folder = tmp_path / 'client'
+    client_folder.mkdir()
+    sync_from_hub(hub_url(server), str(client_folder))
+    server.update(['a.jpg'], {})
+    _, all_paths = sync_from_hub(hub_url(server), str(client_folder))
+    assert all_paths == ['a.jpg']
+    assert not (client_folder / 'album' / 'b.jpg').exists()
+
+def manifest_entry(server, path):
+    manifest = json.loads(get(hub_url(server) + '/manifest')[2])
+    return next(photo for photo in manifest['photos'] if photo['path'] == path)
+
+def write_partial(folder, name, data):
+    (folder / f'.{name}{hub.PARTIAL_SUFFIX}').write_bytes(data)
+
+def test_download_resumes_partial(server, tmp_path):
+    photo = manifest_entry(server, 'a.jpg')
+    write_partial(tmp_path, 'a.jpg', PHOTO[:1000])
+    partials = {'a.jpg': photo['etag']}
+    download_from_hub(hub_url(server), photo, str(tmp_path), partials)
+    assert (tmp_path / 'a.jpg').read_bytes() == PHOTO
+    assert partials == {}
+
+def test_download_restarts_partial_of_other_version(server, tmp_path):
+    photo = manifest_entry(server, 'a.jpg')
+    write_partial(tmp_path, 'a.jpg', b'x' * 1000)
+    download_from_hub(hub_url(server), photo, str(tmp_path), {'a.jpg': '"old"'})
+    assert (tmp_path / 'a.jpg').read_bytes() == PHOTO
+
+def test_download_restarts_partial_without_etag(server, tmp_path):
+    photo = manifest_entry(server, 'a.jpg')
+    write_partial(tmp_path, 'a.jpg', b'x' * 1000)
+    download_from_hub(hub_url(server), photo, str(tmp_path), {})
+    assert (tmp_path / 'a.jpg').read_bytes() == PHOTO
+
+def test_download_restarts_partial_on_416(server, tmp_path):
+    photo = manifest_entry(server, 'a.jpg')
+    write_partial(tmp_path, 'a.jpg', b'x' * (len(PHOTO) + 10))
+    download_from_hub(hub_url(server), photo, str(tmp_path), {'a.jpg': photo['etag']})
+    assert (tmp_path / 'a.jpg').read_bytes() == PHOTO
+    assert not os.path.exists(tmp_path / f'.a.jpg{hub.PARTIAL_SUFFIX}')
+
+def test_sync_from_hub_queues_downloads(server, tmp_path):
+    client_folder = tmp_path / 'client'
+    client_folder.mkdir()
+    queue = DownloadQueue(None, str(client_folder), fetch=HubDownloader(hub_url(server), str(client_folder)))
+    # Returns the hub's order before anything is downloaded
+    new_photos, all_paths = sync_from_hub(hub_url(server), str(client_folder), download_queue=queue)
+    assert new_photos == ['a.jpg', 'album/b.jpg']
+    assert all_paths == ['a.jpg', 'album/b.jpg']
+    assert not (client_folder / 'a.jpg').exists()
+
+    queue.start()
+    assert queue.wait_for('album/b.jpg', 5)
+    assert queue.wait_for('a.jpg', 5)
+    assert (client_folder / 'a.jpg').read_bytes() == PHOTO
+    assert sync_from_hub(hub_url(server), str(client_folder), download_queue=queue)[0] == []
+
+def test_downloads_are_saved_as_they_finish(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(hub, 'STATE_SAVE_EVERY', 1)
+    HubDownloader(hub_url(server), str(tmp_path))(manifest_entry(server, 'a.jpg'), str(tmp_path / 'a.jpg'))
+    assert 'a.jpg' in hub.load_hub_state(str(tmp_path))['etags']
+
+    # As if the frame restarted before the sync finished: a.jpg is not fetched again
+    monkeypatch.setattr(hub, '_hub_states', {})
+    new_photos, _ = sync_from_hub(hub_url(server), str(tmp_path))
+    assert new_photos == ['album/b.jpg']
+
+def test_playlist_on_client(server, tmp_path):
+    server.update(['a.jpg', 'album/b.jpg'], {'playlist': 'this_month'}, {'a.jpg': '20240714'})
+    state = hub.get_hub_state(str(tmp_path))
+    manifest = state.fetch_manifest(hub_url(server))
+    assert manifest['settings'] == {'playlist': 'this_month'}
+    assert [photo.get('taken') for photo in manifest['photos']] == ['20240714', None]
+    assert state.date_index().between('20240101', '20241231') == ['a.jpg']
@@ -0,0 +1,77 @@
+import random
+
+from weighted_sampler import WeightedSampler
+
+ITEMS = [f'photo_{i}.jpg' for i in range(50)]
+
+def make_sampler(items=ITEMS, weight=1.0):
+    sampler = WeightedSampler(random.Random(1))
+    for i, item in enumerate(items):
+        sampler.set_weight(item, weight if weight is not None else i % 5)
+    return sampler
+
+def test_draws_each_item_once_per_cycle():
+    sampler = make_sampler(weight=None)  # Weights 0 to 4, zero weight items included
+    drawn = [sampler.draw() for _ in range(len(ITEMS))]
+    assert sorted(drawn) == sorted(ITEMS)
+    assert sampler.remaining() == 0
+    assert sampler.draw() is None
+    assert sampler.total() == 0
+
+def test_zero_weights_come_last():
+    sampler = make_sampler(weight=None)
+    drawn = sampler.draw_many(len(ITEMS))
+    zero = {item for i, item in enumerate(ITEMS) if i % 5 == 0}
+    assert set(drawn[-len(zero):]) == zero
+
+def test_reset_starts_a_new_cycle():
+    sampler = make_sampler()
+    sampler.draw_many(30)
+    sampler.reset()
+    assert sampler.remaining() == len(ITEMS)
+    assert sorted(sampler.draw_many(100)) == sorted(ITEMS)
+
+def test_take_skips_an_item_this_cycle():
+    sampler = make_sampler()
+    sampler.take('photo_3.jpg')
+    sampler.take('photo_3.jpg')  # Taking twice counts once
+    assert sampler.remaining() == len(ITEMS) - 1
+    assert 'photo_3.jpg' not in sampler.draw_many(100)
+    sampler.reset()
+    assert 'photo_3.jpg' in sampler.draw_many(100)
+
+def test_remove():
+    sampler = make_sampler()
+    drawn = sampler.draw()
+    sampler.remove(drawn)
+    sampler.remove('photo_7.jpg' if drawn != 'photo_7.jpg' else 'photo_8.jpg')
+    sampler.remove('not_there.jpg')
+    assert len(sampler) == len(ITEMS) - 2
+    assert sampler.remaining() == len(ITEMS) - 2
+    sampler.reset()
+    assert len(sampler.draw_many(100)) == len(ITEMS) - 2
+    assert drawn not in sampler
+
+def test_new_item_joins_current_cycle():
+    sampler = make_sampler(ITEMS[:3])
+    sampler.draw_many(3)
+    sampler.set_weight('new.jpg', 1)
+    assert sampler.draw() == 'new.jpg'
+
+def test_freed_slots_are_reused():
+    sampler = make_sampler(ITEMS[:10])
+    for item in ITEMS[:5]:
+        sampler.remove(item)
+    for item in ITEMS[10:15]:
+        sampler.set_weight(item, 1)
+    assert sorted(sampler.draw_many(100)) == sorted(ITEMS[5:15])
+
+def test_weights_bias_draws():
+    counts = {'heavy.jpg': 0, 'light.jpg': 0}
+    rng = random.Random(2)
+    for _ in range(2000):
+        sampler = WeightedSampler(rng)
+        sampler.set_weight('heavy.jpg', 9)
+        sampler.set_weight('light.jpg', 1)
+        counts[sampler.draw()] += 1
+    assert 1650 < counts['heavy.jpg'] < 1950